@@ -0,0 +1,95 @@
+# Synthetic ZiGate byte streams for the replay benchmarks
+# each corpus is a list of (msg_type, encoded frame), msg_type being None for garbage
+import random
+from pyzigate.conversions import zgt_encode_frame, zgt_escape, zgt_unescape
+
+
+def frame(msg_type, payload, rssi=0xcf):
+    """encoded frame as sent by the ZiGate (rssi is the last payload byte)"""
+    return zgt_encode_frame(msg_type, payload + bytes([rssi]))
+
+
+def attribute_report(addr, endpoint, cluster, attribute, data_type, data, msg_type=0x8102, sequence=0x01):
+    header = bytes([sequence]) + addr.to_bytes(2, 'big') + bytes([endpoint])
+    header += cluster.to_bytes(2, 'big') + attribute.to_bytes(2, 'big')
+    return frame(msg_type, header + bytes([0x00, data_type]) + len(data).to_bytes(2, 'big') + data)
+
+
+XIAOMI_HEARTBEAT = bytes.fromhex('0121a90b0421a8010521090006240100000000642911086521b019662b178301000a210000')
+
+
+def attributes(rng, count=10000, devices=50):
+    """mixed sensor reports (temperature, humidity, pressure, buttons, xiaomi heartbeat)"""
+    addrs = [rng.randrange(0x1000, 0xfff0) for _ in range(devices)]
+    corpus = []
+    for _ in range(count):
+        addr = rng.choice(addrs)
+        kind = rng.randrange(6)
+        if kind == 0:
+            data = rng.randrange(-1000, 4000).to_bytes(2, 'big', signed=True)
+            corpus.append((0x8102, attribute_report(addr, 1, 0x0402, 0x0000, 0x29, data)))
+        elif kind == 1:
+            data = rng.randrange(0, 10000).to_bytes(2, 'big')
+            corpus.append((0x8102, attribute_report(addr, 1, 0x0405, 0x0000, 0x21, data)))
+        elif kind == 2:
+            data = rng.randrange(900, 1100).to_bytes(2, 'big')
+            corpus.append((0x8102, attribute_report(addr, 1, 0x0403, 0x0000, 0x29, data)))
+        elif kind == 3:
+            corpus.append((0x8102, attribute_report(addr, 1, 0x0006, 0x0000, 0x10, bytes([rng.randrange(2)]))))
+        elif kind == 4:
+            corpus.append((0x8102, attribute_report(addr, 1, 0x0000, 0xff01, 0x42, XIAOMI_HEARTBEAT)))
+        else:
+            payload = bytes([rng.randrange(256), 0x00]) + addr.to_bytes(2, 'big')
+            corpus.append((0x8000, frame(0x8000, payload, 0)))
+    return corpus
+
+
+def escaped(rng, count=10000):
+    """reports where almost every byte is < 0x10, i.e. escaped on the line"""
+    corpus = []
+    for _ in range(count):
+        addr = rng.randrange(0x0000, 0x1000) & 0x0f0f
+        data = bytes(rng.randrange(0x10) for _ in range(2))
+        corpus.append((0x8102, attribute_report(addr, 1, 0x0402, 0x0000, 0x29, data, sequence=rng.randrange(0x10))))
+    return corpus
+
+
+def corrupt(rng, count=10000, ratio=0.2):
+    """attribute reports mixed with bad CRC, truncated frames and line noise"""
+    corpus = []
+    for msg_type, encoded in attributes(rng, count):
+        if rng.random() >= ratio:
+            corpus.append((msg_type, encoded))
+            continue
+        kind = rng.randrange(3)
+        if kind == 0:
+            # wrong checksum
+            raw = bytearray(zgt_unescape(encoded[1:-1]))
+            raw[4] ^= 0xff
+            corpus.append((None, b'\x01' + zgt_escape(raw) + b'\x03'))
+        elif kind == 1:
+            corpus.append((None, encoded[:rng.randrange(2, len(encoded) - 1)]))
+        else:
+            corpus.append((None, bytes(rng.randrange(0x10, 0x100) for _ in range(rng.randrange(1, 40)))))
+    return corpus
+
+
+def device_list(rng, count=1000, devices=60):
+    """large Device List (8015) responses (kept under the Framer max_frame_size)"""
+    corpus = []
+    for _ in range(count):
+        entries = b''.join(bytes([i]) + rng.randrange(0x0001, 0xfff0).to_bytes(2, 'big') +
+                           rng.getrandbits(64).to_bytes(8, 'big') + bytes([rng.randrange(2), rng.randrange(256)])
+                           for i in range(devices))
+        corpus.append((0x8015, frame(0x8015, entries, 0)))
+    return corpus
+
+
+CORPORA = {'attributes': attributes,
+           'escaped': escaped,
+           'corrupt': corrupt,
+           'devlist': device_list}
+
+
+def build(name, seed=0):
+    return CORPORA[name](random.Random(seed))
@@ -0,0 +1,187 @@
+"""
+Replay benchmarks of the receive pipeline
+(ZiGate.read_data -> interpret_response -> RESPONSES -> ATTRIBUTES), offline.
+
+    python3 -m benchmarks.replay                      # all synthetic corpora
+    python3 -m benchmarks.replay -c escaped -c devlist
+    python3 -m benchmarks.replay --trace capture.bin  # frames received in a BinaryTrace
+    python3 -m benchmarks.replay --trace capture/     # or a FrameCapture directory
+    python3 -m benchmarks.replay --save baseline.json
+    python3 -m benchmarks.replay --compare baseline.json --threshold 0.1
+
+For each corpus :
+- frames/s : whole stream fed by chunks of --chunk bytes (best of --repeat)
+- latency percentiles per msg_type : one read_data call per frame
+- memory : peak traced bytes per frame (tracemalloc) and memory blocks
+  still allocated per frame after the run (registry growth, leaks)
+With --compare, exits with status 1 if the frames/s of a corpus dropped
+by more than --threshold (relative) from the baseline.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tracemalloc
+from time import perf_counter, perf_counter_ns
+
+from pyzigate.interface import ZiGate
+from pyzigate.conversions import zgt_unescape
+from pyzigate.tracing import read_binary_trace, ZGT_TRACE_IN
+from pyzigate.capture import CaptureReader
+from benchmarks import corpora
+
+PERCENTILES = (50, 90, 99)
+
+
+def new_zigate(lazy):
+    zigate = ZiGate(lazy_responses=lazy)
+    zigate.send_to_transport = lambda data: None
+    return zigate
+
+
+def trace_corpus(path):
+    """frames received in a BinaryTrace file or a FrameCapture directory"""
+    corpus = []
+    if os.path.isdir(path):
+        with CaptureReader(path) as reader:
+            _add_trace_frames(corpus, reader)
+    else:
+        with open(path, 'rb') as f:
+            _add_trace_frames(corpus, read_binary_trace(f))
+    return corpus
+
+
+def _add_trace_frames(corpus, records):
+    for _timestamp, direction, frame in records:
+        if direction != ZGT_TRACE_IN:
+            continue
+        decoded = zgt_unescape(frame)
+        msg_type = int.from_bytes(decoded[:2], 'big') if len(decoded) >= 2 else None
+        corpus.append((msg_type, b'\x01' + frame + b'\x03'))
+
+
+def throughput(corpus, chunk, repeat, lazy):
+    stream = b''.join(frame for _msg_type, frame in corpus)
+    chunks = [stream[i:i + chunk] for i in range(0, len(stream), chunk)]
+    best = None
+    for _ in range(repeat):
+        zigate = new_zigate(lazy)
+        start = perf_counter()
+        for data in chunks:
+            zigate.read_data(data)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(corpus) / best, len(stream) / best, zigate._framer.dropped_frames
+
+
+def latencies(corpus, lazy):
+    zigate = new_zigate(lazy)
+    samples = {}
+    for msg_type, frame in corpus:
+        start = perf_counter_ns()
+        zigate.read_data(frame)
+        samples.setdefault(msg_type, []).append(perf_counter_ns() - start)
+    stats = {}
+    for msg_type, values in samples.items():
+        values.sort()
+        name = 'corrupt' if msg_type is None else '{:04x}'.format(msg_type)
+        stats[name] = {'count': len(values), 'max': values[-1] / 1000}
+        for p in PERCENTILES:
+            stats[name]['p{}'.format(p)] = values[min(len(values) - 1, len(values) * p // 100)] / 1000
+    return stats
+
+
+def memory(corpus, lazy):
+    stream = b''.join(frame for _msg_type, frame in corpus)
+    zigate = new_zigate(lazy)
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    zigate.read_data(stream)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    retained = sys.getallocatedblocks() - blocks
+    return peak / len(corpus), retained / len(corpus)
+
+
+def run(name, corpus, args):
+    frames_per_s, bytes_per_s, dropped = throughput(corpus, args.chunk, args.repeat, args.lazy)
+    peak, retained = memory(corpus, args.lazy)
+    return {'frames': len(corpus),
+            'frames_per_s': frames_per_s,
+            'bytes_per_s': bytes_per_s,
+            'dropped_frames': dropped,
+            'peak_bytes_per_frame': peak,
+            'blocks_per_frame': retained,
+            'latency_us': latencies(corpus, args.lazy)}
+
+
+def report(name, result):
+    print('{} : {} frames ({} dropped by the framer), {:.0f} frames/s, {:.2f} MB/s, '
+          'peak {:.0f} B/frame, {:.2f} blocks/frame'.format(
+        name, result['frames'], result['dropped_frames'], result['frames_per_s'], result['bytes_per_s'] / 1e6,
+        result['peak_bytes_per_frame'], result['blocks_per_frame']))
+    for msg_type, stats in sorted(result['latency_us'].items()):
+        print('  {:>8} : {:>7} frames, p50 {:8.1f} us, p90 {:8.1f} us, p99 {:8.1f} us, max {:8.1f} us'.format(
+            msg_type, stats['count'], stats['p50'], stats['p90'], stats['p99'], stats['max']))
+
+
+def compare(results, baseline, threshold):
+    """print the changes from the baseline, returns False on a throughput regression"""
+    ok = True
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = result['frames_per_s'] / previous['frames_per_s'] - 1
+        regression = change < -threshold
+        ok = ok and not regression
+        print('{} : frames/s {:+.1%}{}'.format(name, change, '  REGRESSION' if regression else ''))
+        for msg_type, stats in sorted(result['latency_us'].items()):
+            before = previous['latency_us'].get(msg_type)
+            if before:
+                print('  {:>8} : p99 {:+.1%}'.format(msg_type, stats['p99'] / before['p99'] - 1))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ZiGate receive pipeline benchmarks')
+    parser.add_argument('-c', '--corpus', action='append', choices=sorted(corpora.CORPORA),
+                        help='synthetic corpus (default all)')
+    parser.add_argument('--trace', action='append', default=[], help='BinaryTrace file to replay')
+    parser.add_argument('--chunk', type=int, default=256, help='bytes per read_data call')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lazy', action='store_true', help='lazy response decoding')
+    parser.add_argument('--save', help='write the results (json) to this file')
+    parser.add_argument('--compare', help='baseline (json) saved with --save')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    # corrupt corpora log errors on every bad frame
+    logging.getLogger('zigate').setLevel(logging.CRITICAL)
+
+    names = args.corpus or ([] if args.trace else sorted(corpora.CORPORA))
+    workloads = [(name, corpora.build(name, args.seed)) for name in names]
+    workloads += [(path, trace_corpus(path)) for path in args.trace]
+
+    results = {}
+    for name, corpus in workloads:
+        results[name] = run(name, corpus, args)
+        report(name, results[name])
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
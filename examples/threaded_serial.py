@@ -1,22 +1,11 @@
 # Functions when used with serial & threads
-class ThreadedConnection(object):
-    def __init__(self, device, port='/dev/ttyUSB0'):
-        import serial
-        import threading
-
-        self.device = device
-        self.cnx = serial.Serial(port, 115200, timeout=0)
-        self.thread = threading.Thread(target=self.read).start()
-        device.send_to_transport = self.send
+from pyzigate.transports.threaded import ThreadedSerialTransport
 
-    def read(self):
-        while True:
-            bytesavailable = self.cnx.inWaiting()
-            if bytesavailable > 0:
-                self.device.read_data(self.cnx.read(bytesavailable))
 
-    def send(self, data):
-        self.cnx.write(data)
+# see pyzigate.transports.threaded (blocking reads, write queue, close())
+class ThreadedConnection(ThreadedSerialTransport):
+    def __init__(self, device, port='/dev/ttyUSB0'):
+        super().__init__(device, port)
 
 
 if __name__ == "__main__":
@@ -32,3 +21,9 @@ if __name__ == "__main__":
     zigate = ZiGate()
     connection = ThreadedConnection(zigate)
     zigate.send_data('0010')
+
+    # reader / writer are daemon threads : wait for them (Ctrl-C to stop)
+    try:
+        connection.join()
+    except KeyboardInterrupt:
+        connection.close()
@@ -0,0 +1,136 @@
+#! /usr/bin/python3
+import asyncio
+import logging
+from collections import deque
+from .interface import ZiGate
+from .conversions import zgt_id
+
+ZGT_LOG = logging.getLogger('zigate')
+
+
+class Request(object):
+    """a command waiting for its status (8000) and optional data response"""
+    __slots__ = ('cmd', 'response_type', 'sequence', 'status', 'response')
+
+    def __init__(self, loop, cmd, response_type):
+        self.cmd = cmd
+        self.response_type = response_type
+        self.sequence = None
+        self.status = loop.create_future()
+        self.response = loop.create_future() if response_type is not None else None
+
+
+class AsyncZiGate(ZiGate):
+    """
+    ZiGate with an asyncio request API :
+
+        status, response = await zigate.request('0100', cmd, response_type=0x8100)
+
+    The 8000 status is matched with the command by its packet_type
+    (the ZiGate answers commands in order), with a scheduler by the
+    command it matched (retries change the order), then the data response by
+    the sequence number given in the status (or by type only for
+    responses without sequence, like 8010 or 8015).
+    At most max_in_flight requests wait for their answer at once,
+    the next ones wait before being sent.
+    read_data is expected to be called from the loop thread, it can
+    be called from another one but responses are then dispatched later.
+    """
+    def __init__(self, loop=None, max_in_flight=4, timeout=5, **kwargs):
+        super().__init__(**kwargs)
+        self.loop = loop or asyncio.get_event_loop()
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._slots = None
+        self._waiting_status = {}  # cmd: deque of requests, in sending order
+        self._waiting_response = {}  # msg_type: list of requests
+
+    async def request(self, cmd, data='', response_type=None, timeout=None):
+        """
+        send a command (int cmd and bytes data like send_command, or
+        hex strings like send_data) and wait for its status,
+        and for the data response of msg_type response_type if given.
+        Returns (status, response) : a Response_8000 and a Response (or None,
+        also when the status is not a success). Raises asyncio.TimeoutError.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        async with self._slots:
+            req = Request(self.loop, zgt_id(cmd), response_type)
+            self._waiting_status.setdefault(req.cmd, deque()).append(req)
+            if response_type is not None:
+                self._waiting_response.setdefault(response_type, []).append(req)
+            try:
+                self.send_command(req.cmd, bytes.fromhex(data) if type(data) == str else data, token=req)
+                return await asyncio.wait_for(self._wait(req), timeout or self.timeout)
+            finally:
+                self._forget(req)
+
+    @staticmethod
+    async def _wait(req):
+        status = await req.status
+        response = None
+        if req.response is not None and status.status == 0:
+            response = await req.response
+        return status, response
+
+    def _forget(self, req):
+        waiting = self._waiting_status.get(req.cmd)
+        if waiting and req in waiting:
+            waiting.remove(req)
+        waiting = self._waiting_response.get(req.response_type)
+        if waiting and req in waiting:
+            waiting.remove(req)
+
+    def call_later(self, delay, callback):
+        # timers on the loop rather than in threads (when called from it)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return self.loop.call_later(delay, callback)
+        return super().call_later(delay, callback)
+
+    def on_response(self, response):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._dispatch(response)
+        else:
+            self.loop.call_soon_threadsafe(self._dispatch, response)
+
+    def _dispatch(self, response):
+        if response.msg_type == 0x8000:
+            waiting = self._waiting_status.get(response.packet_type)
+            if not waiting:
+                return
+            if self.scheduler is None:
+                req = waiting.popleft()
+            else:
+                # the scheduler knows the transmission order
+                req = response.command.token if response.command is not None else None
+                if req is None or req not in waiting:
+                    return
+                waiting.remove(req)
+            req.sequence = response.sequence
+            if not req.status.done():
+                req.status.set_result(response)
+            return
+
+        waiting = self._waiting_response.get(response.msg_type)
+        if not waiting:
+            return
+        sequence = response.msg.get('sequence') if 'sequence' in response.struct else None
+        if sequence is not None:
+            sequence = int(sequence, 16)
+        for req in waiting:
+            if req.sequence is None:
+                continue  # status not received yet
+            if sequence is None or req.sequence == sequence:
+                waiting.remove(req)
+                if not req.response.done():
+                    req.response.set_result(response)
+                return
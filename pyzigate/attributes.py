@@ -1,68 +1,185 @@
 #! /usr/bin/python3
 import logging
+import os
 from .parameters import * 
 from collections import OrderedDict
-from struct import unpack
+from struct import unpack, Struct
 from binascii import hexlify, unhexlify
-from .conversions import zgt_decode_struct, zgt2int
+from .conversions import zgt_decode_struct, zgt2int, IdDict
+from .definitions import load_definitions
 
 ZGT_LOG = logging.getLogger('zigate')
-ATTRIBUTES = {}
+# decoders, indexed by (cluster_id, attribute_id) as ints
+# (cluster_id, None) is the fallback for the whole cluster
+ATTRIBUTES = IdDict()
 
-def register_attribute(cluster_id, attribute_id):
+def register_attribute(cluster_id, attribute_id=None):
+    """
+    register a decoder, as a decorator or at runtime :
+    register_attribute(0x0402, 0x0000)(my_decoder)
+    (hexadecimal ids like b'0402' are accepted too)
+    a decoder gets the raw attribute data and returns a dict
+    {'type': property stored in device info (ZGT_TBD if none),
+     'value': ..., 'info': human readable text,
+     'properties': optional [(property, value)] stored as well}
+    """
     def wrap(func):
         ATTRIBUTES[(cluster_id, attribute_id)] = func
+        return func
     return wrap
 
 
-#@register_attribute(b'0000', b'0005')
-#def 
-#
+def get_attribute_decoder(cluster_id, attribute_id):
+    """decoder for the attribute, or the cluster fallback, or None"""
+    decoder = ATTRIBUTES.get((cluster_id, attribute_id))
+    if decoder is None:
+        decoder = ATTRIBUTES.get((cluster_id, None))
+    return decoder
 
-# Battery info
-@register_attribute(b'0000', b'ff01')
+
+def register_definitions(path, cache_dir=None):
+    """
+    register the decoders of a declarative definitions file (see definitions),
+    the ones defined in python being kept, returns the number registered
+    """
+    count = 0
+    for cluster_id, attribute_id, decoder in load_definitions(path, cache_dir):
+        if (cluster_id, attribute_id) in ATTRIBUTES:
+            ZGT_LOG.warning('DEFINITIONS : %04x / %04x already registered, ignored', cluster_id, attribute_id)
+            continue
+        ATTRIBUTES[(cluster_id, attribute_id)] = decoder
+        count += 1
+    return count
+
+
+# Device type
+@register_attribute(0x0000, 0x0005)
+def device_type(data):
+    value = bytes(data).decode()
+    return {'type':ZGT_TYPE, 'value':value, 'info':'type : {}'.format(value)}
+
+# Xiaomi heartbeat : tag (1 byte), zigbee data type (1 byte), little endian value
+def _tlv_struct(fmt):
+    unpack_from = Struct(fmt).unpack_from
+    return lambda data, offset: unpack_from(data, offset)[0]
+
+def _tlv_int(size, signed=False):
+    return lambda data, offset: int.from_bytes(data[offset:offset + size], 'little', signed=signed)
+
+# data type : (size, unpacker(data, offset)), 0x42 (string) is length prefixed
+XIAOMI_TLV_TYPES = {0x10: (1, _tlv_struct('<?')),
+                    0x18: (1, _tlv_struct('<B')),
+                    0x19: (2, _tlv_struct('<H')),
+                    0x20: (1, _tlv_struct('<B')),
+                    0x21: (2, _tlv_struct('<H')),
+                    0x22: (3, _tlv_int(3)),
+                    0x23: (4, _tlv_struct('<I')),
+                    0x24: (5, _tlv_int(5)),
+                    0x25: (6, _tlv_int(6)),
+                    0x27: (8, _tlv_struct('<Q')),
+                    0x28: (1, _tlv_struct('<b')),
+                    0x29: (2, _tlv_struct('<h')),
+                    0x2a: (3, _tlv_int(3, signed=True)),
+                    0x2b: (4, _tlv_struct('<i')),
+                    0x30: (1, _tlv_struct('<B')),
+                    0x31: (2, _tlv_struct('<H')),
+                    0x39: (4, _tlv_struct('<f')),
+                    0x3a: (8, _tlv_struct('<d'))}
+
+# (tag, data type) : (property, conversion of the value)
+# 0x64 / 0x65 are on/off states on plugs and switches, measures on sensors
+# (states follow standard_button, the 0006 / 0000 report of the same device : 0 is ZGT_STATE_ON)
+XIAOMI_HEARTBEAT = {(0x01, 0x21): (ZGT_XIAOMI_BATTERY, lambda value: value / 1000),
+                    (0x05, 0x21): (ZGT_RSSI, None),
+                    (0x64, 0x10): (ZGT_STATE, lambda value: ZGT_STATE_OFF if value else ZGT_STATE_ON),
+                    (0x64, 0x29): (ZGT_TEMPERATURE, lambda value: value / 100),
+                    (0x65, 0x21): (ZGT_HUMIDITY, lambda value: value / 100),
+                    (0x66, 0x2b): (ZGT_PRESSURE, lambda value: value / 100)}
+
+def parse_xiaomi_tlv(data):
+    """(tag, data type, value) of a Xiaomi heartbeat, up to the first unknown data type"""
+    offset = 0
+    end = len(data)
+    while offset + 2 <= end:
+        tag = data[offset]
+        data_type = data[offset + 1]
+        offset += 2
+        if data_type == 0x42:
+            size = data[offset] if offset < end else 0
+            value = bytes(data[offset + 1:offset + 1 + size]).decode(errors='replace')
+            offset += 1 + size
+        else:
+            type_info = XIAOMI_TLV_TYPES.get(data_type)
+            if type_info is None:
+                ZGT_LOG.debug('XIAOMI HEARTBEAT : unknown data type %02x (tag %02x)', data_type, tag)
+                return
+            size, unpack_from = type_info
+            if offset + size > end:
+                return
+            value = unpack_from(data, offset)
+            offset += size
+        yield tag, data_type, value
+
+@register_attribute(0x0000, 0xff01)
 def decode_xiaomi_info(data):
+    """
+    battery as value, the other measures of the heartbeat as properties
+    (set on the device as well, see interpret_attributes)
+    """
     if data != b'':
-        struct = OrderedDict([('start', 16), ('battery', 16), ('end', 'rawend')])
-        raw_info = unhexlify(zgt_decode_struct(struct, data)['battery'])
-        battery_info = int(hexlify(raw_info[::-1]), 16)/1000
-        return {'type':ZGT_BATTERY, 'value':battery_info, 'info':'Value : {} V'.format(battery_info)}
+        battery = None
+        properties = []
+        for tag, data_type, value in parse_xiaomi_tlv(data):
+            known = XIAOMI_HEARTBEAT.get((tag, data_type))
+            if known is None:
+                continue
+            property_id, convert = known
+            if convert is not None:
+                value = convert(value)
+            if property_id == ZGT_XIAOMI_BATTERY:
+                battery = value
+            else:
+                properties.append((property_id, value))
+        info = ', '.join('{} : {}'.format(property_id, value) for property_id, value in properties)
+        return {'type':ZGT_XIAOMI_BATTERY if battery is not None else ZGT_TBD, 'value':battery,
+                'info':'Value : {} V{}'.format(battery, ' ({})'.format(info) if info else ''),
+                'properties':properties}
     else:
-        return {'type':ZGT_BATTERY, 'value':0, 'info':'error'}
+        return {'type':ZGT_XIAOMI_BATTERY, 'value':0, 'info':'error'}
 
 # simple button
-@register_attribute(b'0006', b'0000')
+@register_attribute(0x0006, 0x0000)
 def standard_button(data):
     if hexlify(data) == b'00':
-        return {'type':ZGT_STATE_ON, 'value':'closed', 'info':'Closed/Taken off/Press'}
+        return {'type':ZGT_STATE, 'value':ZGT_STATE_ON, 'info':'Closed/Taken off/Press'}
     else:
-        return {'type':ZGT_STATE_OFF, 'value':'open', 'info':'Open/Release button'}
+        return {'type':ZGT_STATE, 'value':ZGT_STATE_OFF, 'info':'Open/Release button'}
 
 # multi button
-@register_attribute(b'0006', '8000')
+@register_attribute(0x0006, 0x8000)
 def multi_button(data):
-    value = int(hexlify(attribute_data), 16)
-    return {'type':ZGT_STATE_MULTI, 'value':value, 'info':'Multi clicks, pressed {} times'.format(value)}
+    value = int(hexlify(data), 16)
+    return {'type':ZGT_STATE, 'value':ZGT_STATE_MULTI.format(value), 'info':'Multi clicks, pressed {} times'.format(value)}
 
 # cube
-@register_attribute(b'000c', b'0055')
+@register_attribute(0x000c, 0x0055)
 def cube_horizontal_rotation_value(data):
     value = unpack('!f', data)[0]
-    return {'type':'TBD', 'value':value, 'info':'Cube Horizontal Rotation Announce with value {}'.format(value)}
+    return {'type':ZGT_TBD, 'value':value, 'info':'Cube Horizontal Rotation Announce with value {}'.format(value)}
 
-@register_attribute(b'000c', b'ff05')
+@register_attribute(0x000c, 0xff05)
 def cube_horizontal_rotation_announce(data):
     value = hexlify(data)
-    return {'type':'TBD', 'value':value, 'info':'Cube Horizontal Rotation Announce with value {}'.format(value)}
+    return {'type':ZGT_TBD, 'value':value, 'info':'Cube Horizontal Rotation Announce with value {}'.format(value)}
 
-@register_attribute(b'0012', b'0055')
+@register_attribute(0x0012, 0x0055)
 def cube_sliding_shaking(data):
     if hexlify(data) == b'0000':
-        return {'type':'TBD', 'value':'shake', 'info':'Cube shaking'}
+        return {'type':ZGT_TBD, 'value':'shake', 'info':'Cube shaking'}
     elif data[0] == 2: # b'02xx'
-        return {'type':'TBD', 'value':'tap{}'.format(data[1]), 'info':'Cube taping on face {}'.format(data[1])}
+        return {'type':ZGT_TBD, 'value':'tap{}'.format(data[1]), 'info':'Cube taping on face {}'.format(data[1])}
     elif data[0] == 1: # b'01xx'
-        return {'type':'TBD', 'value':'slide{}'.format(data[1]), 'info':'sliding on face {}'.format(data[1])}
+        return {'type':ZGT_TBD, 'value':'slide{}'.format(data[1]), 'info':'sliding on face {}'.format(data[1])}
     elif data[0] == 0: # b'00xx' with xx != 00
         # binary format
         # aa : 01 = 90° 10 = 180°
@@ -74,40 +191,83 @@ def cube_sliding_shaking(data):
         rotation_from = int(rotation_info[2:5],2)
         rotation_to = int(rotation_info[5:8],2)
         if rotation_type == 2:
-            return {'type':'TBD', 'value':'rotation180', 'info':'180° Rotation to face {}'.format(rotation_to)}
+            return {'type':ZGT_TBD, 'value':'rotation180', 'info':'180° Rotation to face {}'.format(rotation_to)}
         else:
-            return {'type':'TBD', 'value':'rotation90_from{}_to{}'.format(rotation_from, rotation_to), 'info':'90° Rotation from face {} to face {}'.format(rotation_from, rotation_to)}
+            return {'type':ZGT_TBD, 'value':'rotation90_from{}_to{}'.format(rotation_from, rotation_to), 'info':'90° Rotation from face {} to face {}'.format(rotation_from, rotation_to)}
     else:
-        return {'type':'TBD', 'value':'error', 'info':'unknown'}
+        return {'type':ZGT_TBD, 'value':'error', 'info':'unknown'}
+
+# Illuminance
+@register_attribute(0x0400, 0x0000)
+def illuminance(data):
+    value = int.from_bytes(data, 'big', signed=True)
+    return {'type':ZGT_ILLUMINANCE_MEASUREMENT, 'value':value, 'info':'Illuminance is {}'.format(value)}
+
+@register_attribute(0x0400, 0x0001)
+def illuminance_min(data):
+    if hexlify(data) == b'ffff':
+        return {'type':ZGT_TBD, 'value':None, 'info':'Minimum illuminance is unused'}
+    value = int.from_bytes(data, 'big', signed=True)
+    return {'type':ZGT_TBD, 'value':value, 'info':'Minimum illuminance is {}'.format(value)}
+
+@register_attribute(0x0400, 0x0002)
+def illuminance_max(data):
+    if hexlify(data) == b'ffff':
+        return {'type':ZGT_TBD, 'value':None, 'info':'Maximum illuminance is unused'}
+    value = int.from_bytes(data, 'big', signed=True)
+    return {'type':ZGT_TBD, 'value':value, 'info':'Maximum illuminance is {}'.format(value)}
+
+@register_attribute(0x0400, 0x0003)
+def illuminance_tolerance(data):
+    value = int.from_bytes(data, 'big', signed=True)
+    return {'type':ZGT_TBD, 'value':value, 'info':'Illuminance tolerance is {}'.format(value)}
+
+@register_attribute(0x0400, 0x0004)
+def illuminance_sensor_type(data):
+    if data[0] == 0x00:
+        value = 'Photodiode'
+    elif data[0] == 0x01:
+        value = 'CMOS'
+    elif data[0] <= 0x3f:
+        value = 'Reserved'
+    elif data[0] <= 0xfe:
+        value = 'Reserved for manufacturer'
+    else:
+        value = 'Unknown'
+    return {'type':ZGT_TBD, 'value':value, 'info':'Sensor type is {}'.format(value)}
 
 # Sensor (temp, humidity, pressure)
-@register_attribute(b'0402', b'0000')
+# temperature, humidity and presence : any attribute of the cluster, as historically
+@register_attribute(0x0402)
 def genral_temperature(data):
     value = int.from_bytes(data, 'big', signed=True) / 100
     return {'type':ZGT_TEMPERATURE, 'value':value, 'info':'Temperature is {} °C'.format(value)}
 
-@register_attribute(b'0403', b'0000')
+@register_attribute(0x0403, 0x0000)
 def general_pressure(data):
     value = int(hexlify(data), 16)
     return {'type':ZGT_PRESSURE, 'value':value, 'info':'Pessure is {} mb'.format(value)}
 
-@register_attribute(b'0403', b'0010')
+@register_attribute(0x0403, 0x0010)
 def detailed_pressure(data):
     value = int(hexlify(data), 16)/10
     return {'type':ZGT_DETAILED_PRESSURE, 'value':value, 'info':'Pessure is {} mb'.format(value)}
 
-@register_attribute(b'0403', b'0014')
+@register_attribute(0x0403, 0x0014)
 def unknown_pressure(data):
-    return {'type':'TBD', 'value':'unknown', 'info':'Pessure is unknown'}
+    return {'type':ZGT_TBD, 'value':'unknown', 'info':'Pessure is unknown'}
 
-@register_attribute(b'0405', b'0000')
+@register_attribute(0x0405)
 def general_humidity(data):
     value = int(hexlify(data), 16) / 100
     return {'type':ZGT_HUMIDITY, 'value':value, 'info':'Humidity is {} %'.format(value)}
 
 # Presence detection
-@register_attribute(b'0406', b'0000')
+@register_attribute(0x0406)
 def detect_presence(data):
     if hexlify(data) == b'01':
         return {'type':ZGT_EVENT, 'value':ZGT_EVENT_PRESENCE, 'info':'Presence detected'}
-    
+    return {'type':ZGT_TBD, 'value':None, 'info':'No presence'}
+
+# Declarative definitions
+register_definitions(os.path.join(os.path.dirname(__file__), 'attributes_xiaomi.json'))
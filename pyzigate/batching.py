@@ -0,0 +1,112 @@
+#! /usr/bin/python3
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from time import monotonic
+
+ZGT_LOG = logging.getLogger('zigate')
+
+
+class ReadBatcher(object):
+    """
+    Read attribute requests waiting to be sent, grouped by
+    (addr, endpoint, cluster) so that the reads issued within window
+    seconds go in a single 0x0100 frame (up to max_attributes each).
+    Every read gets a concurrent.futures.Future resolved with its
+    Response_8100 (see attribute_status / attr_dict), or failed with
+    TimeoutError after timeout seconds without response.
+    (asyncio code can await asyncio.wrap_future(future))
+    Ids are ints, see conversions.zgt_id
+    """
+    def __init__(self, window=0.05, max_attributes=8, timeout=5, clock=monotonic):
+        self.window = window
+        self.max_attributes = max_attributes
+        self.timeout = timeout
+        self.clock = clock
+        self._batches = OrderedDict()  # (addr, endpoint, cluster): [attribute, ...]
+        self._waiting = {}  # (addr, endpoint, cluster, attribute): [deadline, [future, ...]]
+        self._wakeup = None  # (due, timer handle) of the single planned flush
+        self._lock = threading.Lock()
+
+    def add(self, addr, endpoint, cluster, attribute):
+        """
+        queue a read, returns its future and the size of its batch
+        (1 : a flush must be planned, max_attributes : flush now)
+        """
+        future = Future()
+        key = (addr, endpoint, cluster)
+        with self._lock:
+            waiting = self._waiting.get(key + (attribute,))
+            if waiting is None:
+                waiting = self._waiting[key + (attribute,)] = [None, []]
+            waiting[1].append(future)
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = []
+            if attribute not in batch:
+                batch.append(attribute)
+            return future, len(batch)
+
+    def __len__(self):
+        """reads waiting for their response"""
+        return len(self._waiting)
+
+    def take(self):
+        """the batches to send now, as ((addr, endpoint, cluster), attributes) tuples"""
+        with self._lock:
+            batches, self._batches = self._batches, OrderedDict()
+            deadline = self.clock() + self.timeout
+            for key, attributes in batches.items():
+                for attribute in attributes:
+                    waiting = self._waiting.get(key + (attribute,))
+                    if waiting is not None and waiting[0] is None:
+                        waiting[0] = deadline
+        return list(batches.items())
+
+    def plan(self, delay, call_later, callback):
+        """
+        have callback called in delay seconds with call_later, a single
+        timer being kept : nothing is done if one is planned earlier
+        """
+        due = self.clock() + delay
+        with self._lock:
+            if self._wakeup is not None:
+                if self._wakeup[0] <= due:
+                    return
+                self._wakeup[1].cancel()
+            self._wakeup = (due, call_later(delay, callback))
+
+    def fired(self):
+        """the planned timer has fired"""
+        with self._lock:
+            self._wakeup = None
+
+    def next_deadline(self):
+        """clock time when the next sent read times out, None if none waits"""
+        with self._lock:
+            deadlines = [deadline for deadline, _futures in self._waiting.values() if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def resolve(self, addr, endpoint, cluster, attribute, response):
+        """a read attribute response (8100) was received"""
+        with self._lock:
+            waiting = self._waiting.pop((addr, endpoint, cluster, attribute), None)
+        if waiting is None:
+            return
+        for future in waiting[1]:
+            if not future.done():
+                future.set_result(response)
+
+    def expire(self):
+        """fail the sent reads without response after timeout"""
+        now = self.clock()
+        with self._lock:
+            expired = [key for key, (deadline, _futures) in self._waiting.items()
+                       if deadline is not None and deadline <= now]
+            expired = [(key, self._waiting.pop(key)[1]) for key in expired]
+        for key, futures in expired:
+            ZGT_LOG.warning('READ ATTRIBUTE %04x/%02x %04x/%04x : no response', *key)
+            for future in futures:
+                if not future.done():
+                    future.set_exception(TimeoutError('no response to read attribute'))
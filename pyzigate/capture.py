@@ -0,0 +1,295 @@
+#! /usr/bin/python3
+"""
+Always-on capture of the raw frames, received and sent, to rotating
+segment files of ZGT_TRACE_RECORDs (see tracing.BinaryTrace), and
+memory mapped reading / offline replay of these segments.
+Records are stamped with monotonic_ns(), each segment header holding
+the wall clock and monotonic times of its start : readers give wall
+clock (time_ns) timestamps, comparable across segments and runs.
+
+    zigate.trace.binary = FrameCapture('/var/lib/zigate/capture')
+    ...
+    reader = CaptureReader('/var/lib/zigate/capture')
+    for timestamp, direction, frame in reader.seek_time(time_ns() - 60 * 10 ** 9): ...
+    replay(ZiGate(), reader)
+"""
+import bisect
+import logging
+import mmap
+import os
+import threading
+from array import array
+from struct import Struct
+from time import monotonic_ns, time_ns, sleep
+from .tracing import ZGT_TRACE_RECORD, ZGT_TRACE_IN
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# first bytes of each segment, followed by the ZGT_CAPTURE_ANCHOR
+# (1 : monotonic timestamps without anchor, not readable,
+#  2 : wall clock timestamps without anchor,
+#  3 : monotonic timestamps, anchor)
+ZGT_CAPTURE_MAGIC = b'ZGTCAP3\n'
+ZGT_CAPTURE_MAGIC_V1 = b'ZGTCAP1\n'
+ZGT_CAPTURE_MAGIC_V2 = b'ZGTCAP2\n'
+# time_ns() and monotonic_ns() at the segment start
+ZGT_CAPTURE_ANCHOR = Struct('<QQ')
+ZGT_CAPTURE_SUFFIX = '.zgc'
+
+
+def _segment_index(filename, prefix):
+    if not (filename.startswith(prefix + '-') and filename.endswith(ZGT_CAPTURE_SUFFIX)):
+        return None
+    index = filename[len(prefix) + 1:-len(ZGT_CAPTURE_SUFFIX)]
+    return int(index) if index.isdigit() else None
+
+
+def list_segments(directory, prefix='zigate'):
+    """paths of the capture segments in directory, oldest first"""
+    segments = []
+    for filename in os.listdir(directory):
+        index = _segment_index(filename, prefix)
+        if index is not None:
+            segments.append((index, os.path.join(directory, filename)))
+    return [path for _index, path in sorted(segments)]
+
+
+class FrameCapture(object):
+    """
+    BinaryTrace writing to directory/prefix-NNNNNN.zgc segments, a new
+    segment being started once segment_size bytes are written, only the
+    max_segments last ones being kept (None : all of them).
+    Records are buffered (buffering bytes) : one pack and one buffered
+    write per frame, callable from the reading and the sending threads.
+    """
+    def __init__(self, directory, prefix='zigate', segment_size=16 * 1024 * 1024, max_segments=8,
+                 buffering=64 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.buffering = buffering
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        segments = list_segments(directory, prefix)
+        self._index = _segment_index(os.path.basename(segments[-1]), prefix) + 1 if segments else 0
+        self._rotate()
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, '{}-{:06d}{}'.format(self.prefix, self._index, ZGT_CAPTURE_SUFFIX))
+        self._index += 1
+        self._file = open(path, 'wb', buffering=self.buffering)
+        header = ZGT_CAPTURE_MAGIC + ZGT_CAPTURE_ANCHOR.pack(time_ns(), monotonic_ns())
+        self._file.write(header)
+        self._size = len(header)
+        if self.max_segments is not None:
+            for old in list_segments(self.directory, self.prefix)[:-self.max_segments]:
+                try:
+                    os.remove(old)
+                except OSError as e:
+                    ZGT_LOG.warning('CAPTURE : cannot remove %s (%s)', old, e)
+
+    def write(self, direction, frame):
+        record = ZGT_TRACE_RECORD.pack(monotonic_ns(), direction, len(frame)) + frame
+        with self._lock:
+            if self._file is None:
+                return
+            if self._size + len(record) > self.segment_size:
+                self._rotate()
+            self._file.write(record)
+            self._size += len(record)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CaptureSegment(object):
+    """
+    memory mapped segment, records located on first random access
+    (offsets array, 8 bytes per record), timestamps given as wall clock
+    ones (record monotonic timestamp + the segment anchor offset)
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        magic = self._map[:len(ZGT_CAPTURE_MAGIC)]
+        # time_ns() - monotonic_ns() when the segment was started
+        self.offset = 0
+        self._start = len(magic)
+        if magic == ZGT_CAPTURE_MAGIC:
+            if size >= self._start + ZGT_CAPTURE_ANCHOR.size:
+                wall, monotonic = ZGT_CAPTURE_ANCHOR.unpack_from(self._map, self._start)
+                self.offset = wall - monotonic
+                self._start += ZGT_CAPTURE_ANCHOR.size
+            else:
+                # anchor not written yet, no record
+                self._start = size
+        elif size and magic != ZGT_CAPTURE_MAGIC_V2:
+            self.close()
+            if magic == ZGT_CAPTURE_MAGIC_V1:
+                raise ValueError('{} : monotonic timestamps without wall clock anchor'.format(path))
+            raise ValueError('{} is not a capture segment'.format(path))
+        self._offsets = None
+        self._timestamps = None
+
+    def _scan(self):
+        """(offset, timestamp, direction, length) of the complete records"""
+        data = self._map
+        end = len(data)
+        header_size = ZGT_TRACE_RECORD.size
+        unpack_from = ZGT_TRACE_RECORD.unpack_from
+        offset = self._start
+        while offset + header_size <= end:
+            timestamp, direction, length = unpack_from(data, offset)
+            if offset + header_size + length > end:
+                # last record truncated (capture not closed)
+                return
+            yield offset, timestamp, direction, length
+            offset += header_size + length
+
+    def _index(self):
+        if self._offsets is None:
+            offsets, timestamps = array('Q'), array('Q')
+            for offset, timestamp, _direction, _length in self._scan():
+                offsets.append(offset)
+                timestamps.append(timestamp)
+            self._offsets, self._timestamps = offsets, timestamps
+        return self._offsets
+
+    def __len__(self):
+        return len(self._index())
+
+    def record(self, index):
+        """(timestamp, direction, frame) of the record index"""
+        offset = self._index()[index]
+        timestamp, direction, length = ZGT_TRACE_RECORD.unpack_from(self._map, offset)
+        start = offset + ZGT_TRACE_RECORD.size
+        return timestamp + self.offset, direction, self._map[start:start + length]
+
+    def __iter__(self):
+        header_size = ZGT_TRACE_RECORD.size
+        data = self._map
+        wall = self.offset
+        for offset, timestamp, direction, length in self._scan():
+            yield timestamp + wall, direction, data[offset + header_size:offset + header_size + length]
+
+    def iter_from(self, index):
+        for index in range(index, len(self)):
+            yield self.record(index)
+
+    def bisect_time(self, timestamp):
+        """index of the first record at or after (wall clock) timestamp"""
+        self._index()
+        return bisect.bisect_left(self._timestamps, timestamp - self.offset)
+
+    @property
+    def first_timestamp(self):
+        """without indexing the segment, None if empty"""
+        for _offset, timestamp, _direction, _length in self._scan():
+            return timestamp + self.offset
+        return None
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+class CaptureReader(object):
+    """
+    Records of capture segments (a FrameCapture directory, or a list of
+    segment paths), in order : iteration, len(), reader[index] and
+    seek_time(time_ns timestamp), records being in time order within a
+    segment and the segments in the order they were captured.
+    Segments are mapped, not read, sequential iteration does not index.
+    ZGTCAP1 segments (without wall clock anchor) raise ValueError.
+    """
+    def __init__(self, source, prefix='zigate'):
+        paths = list_segments(source, prefix) if isinstance(source, str) else list(source)
+        self.segments = [CaptureSegment(path) for path in paths]
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        for segment in self.segments:
+            count = len(segment)
+            if index < count:
+                return segment.record(index)
+            index -= count
+        raise IndexError('capture record index out of range')
+
+    def seek_time(self, timestamp):
+        """iterate over the records from the first one at or after timestamp"""
+        segments = [segment for segment in self.segments if segment.first_timestamp is not None]
+        # only the last segment starting at or before timestamp is indexed
+        position = 0
+        for position in range(len(segments) - 1, -1, -1):
+            if segments[position].first_timestamp <= timestamp:
+                break
+        for position, segment in enumerate(segments[position:], position):
+            start = segment.bisect_time(timestamp)
+            if start < len(segment):
+                yield from segment.iter_from(start)
+                for following in segments[position + 1:]:
+                    yield from following
+                return
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def replay(zigate, records, directions=(ZGT_TRACE_IN,), speed=None):
+    """
+    feed the received frames of records (CaptureReader, read_binary_trace ...)
+    to zigate.read_data, as fast as possible or at speed times the capture
+    pace, returns the number of frames replayed
+    """
+    count = 0
+    first = start = None
+    for timestamp, direction, frame in records:
+        if direction not in directions:
+            continue
+        if speed:
+            if first is None:
+                first, start = timestamp, monotonic_ns()
+            delay = (timestamp - first) / speed - (monotonic_ns() - start)
+            if delay > 0:
+                sleep(delay / 1e9)
+        zigate.read_data(b'\x01' + bytes(frame) + b'\x03')
+        count += 1
+    return count
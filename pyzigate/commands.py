@@ -0,0 +1,47 @@
+#! /usr/bin/python3
+from functools import lru_cache
+from struct import Struct
+
+# command types
+ZGT_GET_VERSION = 0x0010
+ZGT_GET_DEVICES_LIST = 0x0015
+ZGT_ACTIVE_ENDPOINTS = 0x0045
+ZGT_PERMIT_JOIN = 0x0049
+ZGT_READ_ATTRIBUTE = 0x0100
+
+# address modes
+ZGT_ADDR_MODE_GROUP = 0x01
+ZGT_ADDR_MODE_SHORT = 0x02
+
+# addr mode, addr, src endpoint, dst endpoint, cluster, direction,
+# manufacturer specific, manufacturer id, attribute count (then attribute ids)
+READ_ATTRIBUTE_REQUEST = Struct('!BHBBHBBHB')
+# target addr, duration (s), TC significance
+PERMIT_JOIN_REQUEST = Struct('!HBB')
+# target addr
+ACTIVE_ENDPOINTS_REQUEST = Struct('!H')
+
+
+@lru_cache(maxsize=32)
+def _id_list(count):
+    return Struct('!{}H'.format(count))
+
+
+# Payload builders : int arguments, bytes output, for ZiGate.send_command
+
+def read_attribute_request(addr, endpoint, cluster, attributes, src_endpoint=0x01,
+                           addr_mode=ZGT_ADDR_MODE_SHORT, manufacturer=None):
+    """read attribute(s) (any list of ids, max 255) of a cluster"""
+    return (READ_ATTRIBUTE_REQUEST.pack(addr_mode, addr, src_endpoint, endpoint, cluster, 0x00,
+                                        0x00 if manufacturer is None else 0x01, manufacturer or 0,
+                                        len(attributes)) +
+            _id_list(len(attributes)).pack(*attributes))
+
+
+def permit_join_request(duration=0x1e, addr=0xfffc, significance=0x00):
+    """permit join for duration seconds (0xfe : always, 0x00 : stop)"""
+    return PERMIT_JOIN_REQUEST.pack(addr, duration, significance)
+
+
+def active_endpoints_request(addr):
+    return ACTIVE_ENDPOINTS_REQUEST.pack(addr)
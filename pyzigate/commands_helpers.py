@@ -1,3 +1,7 @@
+from .conversions import zgt_id
+from .commands import ZGT_READ_ATTRIBUTE, ZGT_PERMIT_JOIN, read_attribute_request, permit_join_request
+
+
 class Mixin:
     """
     SubClass for the ZiGate class. Contains helper methods for command sending.
@@ -19,9 +23,58 @@ class Mixin:
         - Get device manufacturer name: read_attribute('AB01', '01', '0000', '0004')
         - Get device name: read_attribute('AB01', '01', '0000', '0005')
         - Get device battery voltage: read_attribute('AB01', '01', '0001', '0006')
+
+        With a read batcher (see batching.ReadBatcher), the reads of a same
+        device / endpoint / cluster are grouped in one command and a Future
+        of the Response_8100 is returned.
+        """
+        if self.read_batcher is not None:
+            future, size = self.read_batcher.add(zgt_id(device_address), zgt_id(device_endpoint),
+                                                 zgt_id(cluster_id), zgt_id(attribute_id))
+            if size >= self.read_batcher.max_attributes:
+                self.flush_reads()
+            elif size == 1:
+                self.read_batcher.plan(self.read_batcher.window, self.call_later, self._reads_timer)
+            return future
+        self.read_attributes(device_address, device_endpoint, cluster_id, [attribute_id])
+
+    def read_attributes(self, device_address, device_endpoint, cluster_id, attribute_ids):
         """
-        cmd = '02' + device_address + '01' + device_endpoint + cluster_id + '00 00 0000 01' + attribute_id
-        self.send_data('0100', cmd)
+        Sends a read attribute command for a list of attributes (any ids)
+
+        :type self: Zigate
+        :param str device_address: length 4 (or int).
+        :param str device_endpoint: length 2 (or int).
+        :param str cluster_id: length 4 (or int).
+        :param list attribute_ids: str of length 4 (or int). Max 255 attributes
+
+        Examples:
+        ========
+        - Get manufacturer and device names:
+          read_attributes('AB01', '01', '0000', ['0004', '0005'])
+        """
+        payload = read_attribute_request(zgt_id(device_address), zgt_id(device_endpoint), zgt_id(cluster_id),
+                                         [zgt_id(attribute_id) for attribute_id in attribute_ids])
+        self.send_command(ZGT_READ_ATTRIBUTE, payload)
+
+    def flush_reads(self):
+        """
+        send the reads queued in the read batcher
+
+        :type self: Zigate
+        """
+        batcher = self.read_batcher
+        for (addr, endpoint, cluster), attributes in batcher.take():
+            self.read_attributes(addr, endpoint, cluster, attributes)
+        # timeouts are checked on flush, the timer is kept until the last one
+        batcher.expire()
+        deadline = batcher.next_deadline()
+        if deadline is not None:
+            batcher.plan(max(0, deadline - batcher.clock()), self.call_later, self._reads_timer)
+
+    def _reads_timer(self):
+        self.read_batcher.fired()
+        self.flush_reads()
 
     def read_multiple_attributes(self, device_address, device_endpoint, cluster_id, first_attribute_id, attributes):
         """
@@ -42,10 +95,9 @@ class Mixin:
         - Get five first attributes from "General: Basic" cluster:
           read_multiple_attributes('AB01', '01', '0000', '0000', 5)
         """
-        cmd = '02' + device_address + '01' + device_endpoint + cluster_id + '00 00 0000' + '{:02x}'.format(attributes)
-        for i in range(attributes):
-            cmd += '{:04x}'.format(int(first_attribute_id, 16) + i)
-        self.send_data('0100', cmd)
+        first = zgt_id(first_attribute_id)
+        self.read_attributes(device_address, device_endpoint, cluster_id,
+                             [first + i for i in range(attributes)])
 
     def permit_join(self):
         """
@@ -53,4 +105,4 @@ class Mixin:
 
         :type self: Zigate
         """
-        self.send_data("0049", "FFFC1E00")
+        self.send_command(ZGT_PERMIT_JOIN, permit_join_request(0x1e))
@@ -3,60 +3,373 @@
 import logging
 from binascii import hexlify
 from collections import OrderedDict
+from collections.abc import Mapping
+from functools import reduce, lru_cache
+from itertools import islice
+from operator import xor
+from struct import Struct, error as struct_error
 
 ZGT_LOG = logging.getLogger('zigate')
 
 
+# precomputed escape sequences for every byte value
+_ESCAPE_TABLE = [bytes([x]) if x >= 0x10 else bytes([0x02, x ^ 0x10]) for x in range(256)]
+_UNESCAPE_TABLE = [bytes([x ^ 0x10]) for x in range(256)]
+
+
+def zgt_escape(data):
+    """encode all bytes < 0x10 as 0x02 followed by byte ^ 0x10, returns bytes"""
+    return b''.join(map(_ESCAPE_TABLE.__getitem__, data))
+
+
+def zgt_unescape(data):
+    """reverse of zgt_escape, works on whole spans between 0x02 markers"""
+    parts = bytes(data).split(b'\x02')
+    if len(parts) == 1:
+        return parts[0]
+    decoded = [parts[0]]
+    for part in islice(parts, 1, None):
+        if part:
+            decoded.append(_UNESCAPE_TABLE[part[0]])
+            decoded.append(part[1:])
+    return b''.join(decoded)
+
+
+def zgt_xor(data, value=0):
+    """xor of all bytes of data (starting from value)"""
+    return reduce(xor, data, value)
+
+
+# msg_type, msg_length of a frame
+_FRAME_HEADER = Struct('!HH')
+
+
+@lru_cache(maxsize=512)
+def zgt_frame_header(cmd, length):
+    """
+    template for the frames of a command type (int) and payload length :
+    start delimiter and escaped header, and the header part of the checksum
+    """
+    header = _FRAME_HEADER.pack(cmd, length)
+    return b'\x01' + zgt_escape(header), zgt_xor(header)
+
+
+def zgt_encode_frame(cmd, data=b''):
+    """
+    build the frame to send, delimiters included, for a command
+    (int, or 2 bytes) and its payload (bytes)
+    only the payload is escaped, the header comes from zgt_frame_header
+    """
+    if type(cmd) != int:
+        cmd = int.from_bytes(cmd, 'big')
+    start, checksum = zgt_frame_header(cmd, len(data))
+    return b''.join((start, _ESCAPE_TABLE[zgt_xor(data, checksum)], zgt_escape(data), b'\x03'))
+
+
 def zgt_encode(data):
-        """encode all characters < 0x02 to avoid """
-        encoded = []
-        for x in data:
-            if x < 0x10:
-                encoded.extend([0x02, x ^ 0x10])
-            else:
-                encoded.append(x)
-        return encoded
+    """encode all characters < 0x10 (list version of zgt_escape)"""
+    return list(zgt_escape(data))
+
 
 def zgt_decode(data):
     """reverse of zigate_encode to get back the real message"""
-    encoded = False
-    decoded_data = b''
-
-    def bxor_join(b1, b2):  # use xor for bytes
-        parts = []
-        for b1, b2 in zip(b1, b2):
-            parts.append(bytes([b1 ^ b2]))
-        return b''.join(parts)
-
-    for x in data:
-        if bytes([x]) == b'\x02':
-            encoded = True
-        elif encoded is True:
-            encoded = False
-            decoded_data += bxor_join(bytes([x]), b'\x10')
-        else:
-            decoded_data += bytes([x])
-
-    return decoded_data
+    return zgt_unescape(data)
 
 
 def zgt_checksum(cmd, length, data):
-    tmp = 0
-    tmp ^= cmd[0]
-    tmp ^= cmd[1]
-    tmp ^= length[0]
-    tmp ^= length[1]
-    if data:
-        for x in data:
-            tmp ^= x
-
-    return tmp
+    return zgt_xor(data or b'', cmd[0] ^ cmd[1] ^ length[0] ^ length[1])
 
 def zgt2int(data):
     return int.from_bytes(data, byteorder='big', signed=False)
 
 
+def zgt_id(value):
+    """
+    internal (int) form of an address / endpoint / cluster / attribute id,
+    also accepting the hexadecimal bytes or str forms (b'0402', '0402')
+    """
+    if value is None or type(value) == int:
+        return value
+    return int(value, 16)
+
+
+def zgt_key(key):
+    """zgt_id applied to a single id or to each element of a tuple of ids"""
+    if type(key) == tuple:
+        return tuple(zgt_id(x) for x in key)
+    return zgt_id(key)
+
+
+# IdDict.get miss marker
+_MISSING = object()
+# types of the ids of keys needing no conversion
+_INT_ID_TYPES = frozenset((int, type(None)))
+
+
+def _hex_key(key):
+    """int form of a key with hexadecimal ids, None if it has none (or is invalid)"""
+    if type(key) == tuple:
+        for value in key:
+            if type(value) not in _INT_ID_TYPES:
+                break
+        else:
+            return None
+    elif type(key) in _INT_ID_TYPES:
+        return None
+    try:
+        return zgt_key(key)
+    except (TypeError, ValueError):
+        return None
+
+
+class IdDict(dict):
+    """
+    dict keyed by int ids (or tuples of ids), hexadecimal keys
+    (b'0402', ('0402', '0000') ...) are converted when used,
+    int keys are plain dict lookups (misses included)
+    """
+    __slots__ = ()
+
+    def __missing__(self, key):
+        int_key = _hex_key(key)
+        if int_key is None:
+            raise KeyError(key)
+        return dict.__getitem__(self, int_key)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, zgt_key(key), value)
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        int_key = _hex_key(key)
+        return int_key is not None and dict.__contains__(self, int_key)
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, _MISSING)
+        if value is not _MISSING:
+            return value
+        # int keys : a miss is a miss
+        key_type = type(key)
+        if key_type == tuple:
+            for value in key:
+                if type(value) not in _INT_ID_TYPES:
+                    break
+            else:
+                return default
+        elif key_type in _INT_ID_TYPES:
+            return default
+        try:
+            return dict.get(self, zgt_key(key), default)
+        except (TypeError, ValueError):
+            return default
+
+
 def zgt_decode_struct(struct, msg, elt_id=0):
+    return zgt_compile_struct(struct).decode(msg, elt_id)
+
+
+def zgt_compile_struct(struct):
+    """get the (cached) decode plan of a struct definition"""
+    key = tuple(struct.items())
+    plan = _PLANS.get(key)
+    if plan is None:
+        plan = _PLANS[key] = StructPlan(struct)
+    return plan
+
+
+_PLANS = {}
+_INT_WIDTHS = {'int': 1, 'int8': 1, 'int16': 2}
+_INT_FORMATS = {1: 'B', 2: 'H'}
+
+
+class StructPlan(object):
+    """
+    Struct definition compiled once into a list of decoding steps :
+    consecutive fixed width elements are merged in a single step
+    (one struct.Struct unpack for the ints, one hexlify for the others),
+    len8 / len16 / count / end / rawend have their own step.
+    Output is the same as the historical interpreter (zgt_interpret_struct)
+    which is still used for messages too short for the plan.
+    Elements located before any variable length part also get their
+    offset cached in self.fields, to be decoded alone (see LazyStruct).
+    """
+    def __init__(self, struct):
+        self.struct = struct
+        self.recursive = bool(struct) and list(struct.values())[-1] == 'recursive'
+        self.steps = []
+        self.fields = {}
+        static = not self.recursive
+        offset = 0
+        fixed = []
+        items = list(struct.items())
+        while items:
+            key, elt_type = items.pop(0)
+            if type(elt_type) == int or elt_type in _INT_WIDTHS:
+                fixed.append((key, elt_type))
+                if static:
+                    if type(elt_type) == int:
+                        width = int(elt_type / 8)
+                        self.fields[key] = (offset, width, None)
+                    else:
+                        width = _INT_WIDTHS[elt_type]
+                        self.fields[key] = (offset, width, Struct('!' + _INT_FORMATS[width]))
+                    offset += width
+                continue
+            if fixed:
+                self.steps.append(_fixed_step(fixed))
+                fixed = []
+            if static and elt_type in ('len8', 'len16'):
+                width = 2 if elt_type == 'len16' else 1
+                self.fields[key] = (offset, width, Struct('!' + _INT_FORMATS[width]))
+            static = False
+            if elt_type in ('len8', 'len16'):
+                next_key, next_type = items.pop(0)
+                self.steps.append(_len_step(key, 2 if elt_type == 'len16' else 1,
+                                            next_key, next_type == 'raw'))
+            elif elt_type == 'count':
+                next_key, next_type = items.pop(0)
+                self.steps.append(_count_step(key, next_key, int(next_type / 8)))
+            elif elt_type == 'end':
+                self.steps.append(_end_step(key, hexlify))
+            elif elt_type == 'rawend':
+                self.steps.append(_end_step(key, bytes))
+        if fixed:
+            self.steps.append(_fixed_step(fixed))
+
+    def decode(self, msg, elt_id=0):
+        output = OrderedDict()
+        offset = 0
+        current_id = elt_id
+        try:
+            while True:
+                tag = '[{:02x}]'.format(current_id) if self.recursive else ''
+                for step in self.steps:
+                    offset = step(msg, offset, output, tag)
+                if not self.recursive or len(msg) - offset <= 2:
+                    return output
+                current_id += 1
+        except (IndexError, struct_error):
+            # whole message again, keys numbered from the original elt_id
+            return zgt_interpret_struct(self.struct, msg, elt_id)
+
+    def decode_field(self, key, msg):
+        """decode a single element with a cached offset (KeyError if none)"""
+        offset, width, unpacker = self.fields[key]
+        end = offset + width
+        if end > len(msg):
+            raise IndexError('message too short')
+        if unpacker is not None:
+            return unpacker.unpack_from(msg, offset)[0]
+        return hexlify(msg[offset:end])
+
+
+class LazyStruct(Mapping):
+    """
+    Read-only dict-like result of a StructPlan, decoding on first access :
+    elements with a cached offset are decoded alone, anything else
+    triggers the decoding of the whole message.
+    """
+    __slots__ = ('_plan', '_msg', '_output', '_complete')
+
+    def __init__(self, plan, msg):
+        self._plan = plan
+        self._msg = msg
+        self._output = {}
+        self._complete = False
+
+    def __getitem__(self, key):
+        try:
+            return self._output[key]
+        except KeyError:
+            if self._complete:
+                raise
+        try:
+            value = self._output[key] = self._plan.decode_field(key, self._msg)
+            return value
+        except (KeyError, IndexError):
+            return self._decode()[key]
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __len__(self):
+        return len(self._decode())
+
+    def _decode(self):
+        if not self._complete:
+            self._output = self._plan.decode(self._msg)
+            self._complete = True
+        return self._output
+
+
+def _fixed_step(elements):
+    fields = []
+    int_format = '!'
+    start = 0
+    count = 0
+    for key, elt_type in elements:
+        if type(elt_type) == int:
+            width = int(elt_type / 8)
+            fields.append((key, -1, 2 * start, 2 * (start + width)))
+            int_format += '{}x'.format(width)
+        else:
+            width = _INT_WIDTHS[elt_type]
+            fields.append((key, count, 0, 0))
+            int_format += _INT_FORMATS[width]
+            count += 1
+        start += width
+    size = start
+    unpacker = Struct(int_format)
+    with_hex = count < len(fields)
+
+    def step(msg, offset, output, tag):
+        end = offset + size
+        if end > len(msg):
+            raise IndexError('message too short')
+        ints = unpacker.unpack_from(msg, offset)
+        hex_data = hexlify(msg[offset:end]) if with_hex else b''
+        for key, index, hex_start, hex_end in fields:
+            output[key + tag] = ints[index] if index >= 0 else hex_data[hex_start:hex_end]
+        return end
+    return step
+
+
+def _len_step(key, width, next_key, raw):
+    unpacker = Struct('!H' if width == 2 else '!B')
+
+    def step(msg, offset, output, tag):
+        length = unpacker.unpack_from(msg, offset)[0]
+        offset += width
+        output[key + tag] = length
+        value = msg[offset:offset + length]
+        output[next_key + tag] = bytes(value) if raw else hexlify(value)
+        return offset + length
+    return step
+
+
+def _count_step(key, next_key, width):
+    def step(msg, offset, output, tag):
+        count = msg[offset]
+        offset += 1
+        output[key + tag] = count
+        end = offset + count * width
+        hex_data = hexlify(msg[offset:end])
+        hex_width = 2 * width
+        output[next_key + tag] = [hex_data[i:i + hex_width]
+                                  for i in range(0, count * hex_width, hex_width)]
+        return end
+    return step
+
+
+def _end_step(key, convert):
+    def step(msg, offset, output, tag):
+        output[key + tag] = convert(msg[offset:])
+        return len(msg)
+    return step
+
+
+def zgt_interpret_struct(struct, msg, elt_id=0):
     output = OrderedDict()
     iter_struct = struct.copy()
     # recursive if the last element says so
@@ -119,7 +432,7 @@ def zgt_decode_struct(struct, msg, elt_id=0):
         elif elt_type == 'rawend':
             output[key] = msg
         elif elt_type == 'recursive' and len(msg) > 2:
-            next_output = zgt_decode_struct(struct, msg, elt_id + 1)
+            next_output = zgt_interpret_struct(struct, msg, elt_id + 1)
             output.update(next_output)
 
     return output
@@ -0,0 +1,212 @@
+#! /usr/bin/python3
+"""
+Declarative attribute definitions (i.e. attributes_xiaomi.json) :
+
+    {"format": 1,
+     "attributes": [
+        {"cluster": "0101", "attribute": "0055", "data_type": "uint16",
+         "property": "ZGT_EVENT",
+         "enum": {"1": "vibration", "2": "tilt", "3": "drop"},
+         "info": "Vibration sensor : {value}"},
+        ...]}
+
+- cluster, attribute : hexadecimal strings (or ints)
+- data_type : one of DATA_TYPES (big endian, as sent by the ZiGate)
+- property : device property the value is stored as, a ZGT_ constant
+  name of parameters or any string, null : not stored (ZGT_TBD)
+- scale, offset (optional) : value = raw * scale + offset
+- enum (optional) : {"raw value": value}, raw value kept if not listed
+- info (optional) : format of the human readable text ({value})
+
+Files are validated and normalized, then compiled to one decoder per
+attribute, specialized for its data type and transformation. The
+normalized table can be cached on disk (keyed by the file hash) for
+large files : load_definitions(path, cache_dir=default_cache_dir()).
+"""
+import hashlib
+import json
+import logging
+import os
+from struct import Struct
+from . import parameters
+from .parameters import ZGT_TBD
+from .files import write_atomic
+
+ZGT_LOG = logging.getLogger('zigate')
+
+DEFINITIONS_FORMAT = 1
+# bumped when the normalized (cached) table changes
+COMPILED_VERSION = 1
+# data type : struct format, None for the ones decoded otherwise
+DATA_TYPES = {'bool': '!?',
+              'uint8': '!B', 'uint16': '!H', 'uint24': None, 'uint32': '!I',
+              'int8': '!b', 'int16': '!h', 'int24': None, 'int32': '!i',
+              'enum8': '!B', 'enum16': '!H',
+              'float': '!f', 'double': '!d',
+              'string': None}
+INTEGER_TYPES = ('bool', 'uint8', 'uint16', 'uint24', 'uint32', 'int8', 'int16', 'int24', 'int32',
+                 'enum8', 'enum16')
+ENTRY_KEYS = ('cluster', 'attribute', 'data_type', 'property', 'scale', 'offset', 'enum', 'info')
+
+
+def default_cache_dir():
+    """ZIGATE_CACHE_DIR, or pyzigate in the user cache directory"""
+    path = os.environ.get('ZIGATE_CACHE_DIR')
+    if path:
+        return path
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'pyzigate')
+
+
+def _id(value, what, where):
+    if type(value) == str:
+        try:
+            value = int(value, 16)
+        except ValueError:
+            raise ValueError('{} : {} {!r} is not hexadecimal'.format(where, what, value))
+    if type(value) != int or not 0 <= value <= 0xffff:
+        raise ValueError('{} : bad {} {!r}'.format(where, what, value))
+    return value
+
+
+def _number(value, what, where):
+    if type(value) not in (int, float):
+        raise ValueError('{} : {} must be a number'.format(where, what))
+    return value
+
+
+def normalize_entry(entry, where):
+    """validated entry as a list (cluster, attribute, data_type, property, scale, offset, enum, info)"""
+    if type(entry) != dict:
+        raise ValueError('{} : an object is expected'.format(where))
+    unknown = set(entry) - set(ENTRY_KEYS)
+    if unknown:
+        raise ValueError('{} : unknown key(s) {}'.format(where, ', '.join(sorted(unknown))))
+    for key in ('cluster', 'attribute', 'data_type', 'property'):
+        if key not in entry:
+            raise ValueError('{} : {} is missing'.format(where, key))
+    cluster = _id(entry['cluster'], 'cluster', where)
+    attribute = _id(entry['attribute'], 'attribute', where)
+    where = '{} ({:04x}/{:04x})'.format(where, cluster, attribute)
+
+    data_type = entry['data_type']
+    if data_type not in DATA_TYPES:
+        raise ValueError('{} : unknown data_type {!r}'.format(where, data_type))
+
+    property_id = entry['property']
+    if property_id is None:
+        property_id = ZGT_TBD
+    elif type(property_id) != str or not property_id:
+        raise ValueError('{} : property must be a string or null'.format(where))
+    elif property_id.startswith('ZGT_'):
+        value = getattr(parameters, property_id, None)
+        if type(value) != str:
+            raise ValueError('{} : unknown property {}'.format(where, property_id))
+        property_id = value
+
+    scale = _number(entry.get('scale', 1), 'scale', where)
+    offset = _number(entry.get('offset', 0), 'offset', where)
+    enum = entry.get('enum')
+    if enum is not None:
+        if data_type not in INTEGER_TYPES:
+            raise ValueError('{} : enum needs an integer data_type'.format(where))
+        if (scale, offset) != (1, 0):
+            raise ValueError('{} : enum and scale / offset are exclusive'.format(where))
+        if type(enum) != dict:
+            raise ValueError('{} : enum must be an object'.format(where))
+        try:
+            enum = sorted([int(raw), value] for raw, value in enum.items())
+        except ValueError:
+            raise ValueError('{} : enum keys must be integers'.format(where))
+    elif (scale, offset) != (1, 0) and data_type == 'string':
+        raise ValueError('{} : scale / offset need a numeric data_type'.format(where))
+
+    info = entry.get('info', '{} : {{value}}'.format(property_id))
+    try:
+        info.format(value=0)
+    except (AttributeError, IndexError, KeyError, ValueError):
+        raise ValueError('{} : bad info format {!r}'.format(where, info))
+    return [cluster, attribute, data_type, property_id, scale, offset, enum, info]
+
+
+def normalize(definitions, source='definitions'):
+    """validated table (list of normalized entries) of parsed definitions"""
+    if type(definitions) != dict or definitions.get('format') != DEFINITIONS_FORMAT:
+        raise ValueError('{} : format {} expected'.format(source, DEFINITIONS_FORMAT))
+    entries = definitions.get('attributes')
+    if type(entries) != list:
+        raise ValueError('{} : attributes list is missing'.format(source))
+    table = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        normalized = normalize_entry(entry, '{} attribute #{}'.format(source, index))
+        key = tuple(normalized[:2])
+        if key in seen:
+            raise ValueError('{} : {:04x}/{:04x} defined twice'.format(source, *key))
+        seen.add(key)
+        table.append(normalized)
+    return table
+
+
+def _unpacker(data_type):
+    fmt = DATA_TYPES[data_type]
+    if fmt is not None:
+        unpack_from = Struct(fmt).unpack_from
+        return lambda data: unpack_from(data)[0]
+    if data_type == 'string':
+        return lambda data: bytes(data).decode(errors='replace')
+    signed = data_type == 'int24'
+    return lambda data: int.from_bytes(data[:3], 'big', signed=signed)
+
+
+def compile_entry(data_type, property_id, scale, offset, enum, info):
+    """decoder (see attributes.register_attribute) of a normalized entry"""
+    unpack = _unpacker(data_type)
+    info = info.format
+    if enum is not None:
+        enum = {raw: value for raw, value in enum}
+
+        def decoder(data):
+            raw = unpack(data)
+            value = enum.get(raw, raw)
+            return {'type': property_id, 'value': value, 'info': info(value=value)}
+    elif (scale, offset) != (1, 0):
+        def decoder(data):
+            value = unpack(data) * scale + offset
+            return {'type': property_id, 'value': value, 'info': info(value=value)}
+    else:
+        def decoder(data):
+            value = unpack(data)
+            return {'type': property_id, 'value': value, 'info': info(value=value)}
+    return decoder
+
+
+def _cached_table(path, content, cache_dir):
+    if cache_dir is None:
+        return normalize(json.loads(content.decode('utf-8')), path)
+    digest = hashlib.sha256(content + str(COMPILED_VERSION).encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, 'definitions-{}.json'.format(digest[:32]))
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    table = normalize(json.loads(content.decode('utf-8')), path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_atomic(cache_path, json.dumps(table).encode('utf-8'))
+    except OSError as e:
+        ZGT_LOG.debug('DEFINITIONS : %s not cached (%s)', path, e)
+    return table
+
+
+def load_definitions(path, cache_dir=None):
+    """
+    [(cluster, attribute, decoder)] of a definitions file, ValueError if
+    invalid. The normalized table is cached in cache_dir if given
+    (see default_cache_dir), nothing is written otherwise
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    table = _cached_table(path, content, cache_dir)
+    return [(cluster, attribute, compile_entry(*entry))
+            for cluster, attribute, *entry in table]
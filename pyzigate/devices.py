@@ -0,0 +1,251 @@
+#! /usr/bin/python3
+import logging
+import threading
+from struct import Struct
+from time import time
+from .parameters import *
+from .history import History
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# properties with a dedicated value slot in every endpoint,
+# any other property goes to the (lazily created) extra dict
+PROPERTIES = (ZGT_LAST_SEEN, ZGT_TYPE, ZGT_BATTERY, ZGT_TEMPERATURE,
+              ZGT_HUMIDITY, ZGT_PRESSURE, ZGT_DETAILED_PRESSURE,
+              ZGT_ILLUMINANCE_MEASUREMENT, ZGT_STATE, ZGT_EVENT, ZGT_RSSI,
+              ZGT_XIAOMI_BATTERY)
+PROPERTY_SLOTS = {property_id: slot for slot, property_id in enumerate(PROPERTIES)}
+
+# short_addr, IEEE (then mac_capability)
+DEVICE_ANNOUNCE = Struct('!HQ')
+# ID, addr, IEEE, power_source, link_quality (repeated)
+DEVICE_LIST_ENTRY = Struct('!BHQBB')
+# sequence, status, addr, endpoint count (then endpoint list)
+ACTIVE_ENDPOINTS = Struct('!BBHB')
+
+
+class Endpoint(object):
+    __slots__ = ('endpoint', 'values', 'extra', 'history')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.values = [None] * len(PROPERTIES)
+        self.extra = None
+        self.history = None  # {property: History} when enabled
+
+    def set(self, property_id, value):
+        slot = PROPERTY_SLOTS.get(property_id)
+        if slot is not None:
+            self.values[slot] = value
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[property_id] = value
+
+    def get(self, property_id, default=None):
+        slot = PROPERTY_SLOTS.get(property_id)
+        if slot is not None:
+            value = self.values[slot]
+            return default if value is None else value
+        if self.extra is None:
+            return default
+        return self.extra.get(property_id, default)
+
+    def record(self, property_id, value, capacity, timestamp):
+        """append value to the history of the property (created if needed)"""
+        if self.history is None:
+            self.history = {}
+        history = self.history.get(property_id)
+        if history is None:
+            history = self.history[property_id] = History(capacity)
+        history.append(timestamp, value)
+
+    def properties(self):
+        """dict of the properties set on this endpoint"""
+        props = {property_id: value for property_id, value in zip(PROPERTIES, self.values)
+                 if value is not None}
+        if self.extra:
+            props.update(self.extra)
+        return props
+
+
+class Device(object):
+    """
+    a device, identified by its IEEE address (None until known)
+    endpoints are keyed by their int id (None for device wide properties)
+    """
+    __slots__ = ('ieee', 'addr', 'endpoints')
+
+    def __init__(self, ieee=None, addr=None):
+        self.ieee = ieee
+        self.addr = addr
+        self.endpoints = {}
+
+    def endpoint(self, endpoint):
+        ep = self.endpoints.get(endpoint)
+        if ep is None:
+            ep = self.endpoints[endpoint] = Endpoint(endpoint)
+        return ep
+
+    def merge(self, other):
+        """take the endpoints / properties known by another instance"""
+        for endpoint, other_ep in other.endpoints.items():
+            ep = self.endpoint(endpoint)
+            for property_id, value in other_ep.properties().items():
+                if ep.get(property_id) is None:
+                    ep.set(property_id, value)
+            if other_ep.history and ep.history is None:
+                ep.history = other_ep.history
+
+
+class DeviceRegistry(object):
+    """
+    Devices keyed by IEEE address, with a short address index.
+    Short addresses change when a device rejoins, the index is updated
+    when a Device Announce (004d) or a Device List (8015) is received.
+    A device only seen by its short address so far is kept with
+    ieee = None and adopted by the first announce of that address.
+    Devices that are new, or got a new short address, are listed by
+    interview_needed() until their endpoints are received (8045).
+    Updates hold a lock, so state() can be taken from another thread.
+    """
+    def __init__(self):
+        self._by_ieee = {}
+        self._by_addr = {}
+        self._history_capacity = {}
+        self._to_interview = set()
+        self._lock = threading.RLock()
+
+    def __iter__(self):
+        return iter(list(self._by_addr.values()) +
+                    [d for d in self._by_ieee.values() if d.addr is None])
+
+    def __len__(self):
+        return len(self._by_addr) + sum(1 for d in self._by_ieee.values() if d.addr is None)
+
+    def get(self, addr):
+        """device by short address (or None)"""
+        return self._by_addr.get(addr)
+
+    def get_by_ieee(self, ieee):
+        return self._by_ieee.get(ieee)
+
+    def device(self, addr):
+        """device by short address, created if unknown"""
+        device = self._by_addr.get(addr)
+        if device is None:
+            with self._lock:
+                device = self._by_addr.get(addr)
+                if device is None:
+                    device = self._by_addr[addr] = Device(addr=addr)
+                    self._to_interview.add(device)
+        return device
+
+    def restore(self, device):
+        """add a device known from a previous run (see snapshot)"""
+        with self._lock:
+            if device.ieee is not None:
+                self._by_ieee[device.ieee] = device
+            if device.addr is not None:
+                self._by_addr[device.addr] = device
+
+    def state(self):
+        """copy of the devices : [(ieee, addr, [(endpoint, {property: value})])]"""
+        with self._lock:
+            return [(device.ieee, device.addr,
+                     [(endpoint, ep.properties()) for endpoint, ep in device.endpoints.items()])
+                    for device in self]
+
+    def interview_needed(self):
+        """devices, with a short address, whose endpoints must be (re)queried"""
+        return [device for device in self._to_interview
+                if device.addr is not None and self._by_addr.get(device.addr) is device]
+
+    def set_property(self, addr, endpoint, property_id, value):
+        with self._lock:
+            ep = self.device(addr).endpoint(endpoint)
+            ep.set(property_id, value)
+            if self._history_capacity:
+                capacity = self._history_capacity.get(property_id)
+                if capacity is not None and type(value) in (int, float):
+                    ep.record(property_id, value, capacity, time())
+
+    def enable_history(self, property_id, capacity=1024):
+        """
+        keep the last capacity (numeric) values of a property,
+        for every device / endpoint, see history()
+        """
+        self._history_capacity[property_id] = capacity
+
+    def history(self, addr, endpoint, property_id):
+        """History of a property of a device (by short address) or None"""
+        device = self._by_addr.get(addr)
+        if device is None:
+            return None
+        ep = device.endpoints.get(endpoint)
+        if ep is None or ep.history is None:
+            return None
+        return ep.history.get(property_id)
+
+    def announce(self, addr, ieee):
+        """bind a short address to an IEEE address"""
+        with self._lock:
+            return self._announce(addr, ieee)
+
+    def _announce(self, addr, ieee):
+        device = self._by_ieee.get(ieee)
+        current = self._by_addr.get(addr)
+        if device is None:
+            if current is not None and current.ieee is None:
+                # first announce of a device only known by its short address
+                current.ieee = ieee
+                self._by_ieee[ieee] = current
+                return current
+            device = self._by_ieee[ieee] = Device(ieee, addr)
+            self._to_interview.add(device)
+        elif device.addr != addr:
+            self._to_interview.add(device)
+            ZGT_LOG.info('DEVICE %016x : short address %s -> %04x',
+                         ieee, 'none' if device.addr is None else '%04x' % device.addr, addr)
+            if device.addr is not None and self._by_addr.get(device.addr) is device:
+                del self._by_addr[device.addr]
+            device.addr = addr
+
+        if current is not None and current is not device:
+            if current.ieee is None:
+                # data received under the new address before the announce
+                device.merge(current)
+                self._to_interview.discard(current)
+            else:
+                # address reused by another device
+                current.addr = None
+        self._by_addr[addr] = device
+        return device
+
+    def announce_message(self, msg_data):
+        """update from a Device Announce (004d) message data"""
+        return self.announce(*DEVICE_ANNOUNCE.unpack_from(msg_data))
+
+    def device_list_message(self, msg_data):
+        """update from a Device List (8015) message data"""
+        size = DEVICE_LIST_ENTRY.size
+        end = len(msg_data) - len(msg_data) % size
+        for _id, addr, ieee, _power, _link in DEVICE_LIST_ENTRY.iter_unpack(msg_data[:end]):
+            self.announce(addr, ieee)
+
+    def endpoints_message(self, msg_data):
+        """update from an Active Endpoints List (8045) message data"""
+        _sequence, status, addr, count = ACTIVE_ENDPOINTS.unpack_from(msg_data)
+        if status != 0:
+            return
+        with self._lock:
+            device = self.device(addr)
+            start = ACTIVE_ENDPOINTS.size
+            for endpoint in msg_data[start:start + count]:
+                device.endpoint(endpoint)
+            self._to_interview.discard(device)
+
+    def properties(self):
+        """legacy view : {(addr, endpoint): {property: value}}"""
+        return {(addr, endpoint): properties
+                for _ieee, addr, endpoints in self.state() for endpoint, properties in endpoints}
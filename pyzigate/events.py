@@ -0,0 +1,106 @@
+#! /usr/bin/python3
+import logging
+import threading
+from itertools import count
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# fields a subscription can filter on, in Event order
+EVENT_FIELDS = ('msg_type', 'source', 'ieee', 'addr', 'endpoint', 'cluster', 'attribute')
+
+
+class Event(object):
+    """
+    a received message : msg_type and response for all of them,
+    ids (ints) and decoded value for attribute reports / responses
+    (property_id / value being None if the attribute is not stored)
+    source is the name of the ZiGate it comes from (see manager)
+    """
+    __slots__ = EVENT_FIELDS + ('property_id', 'value', 'response')
+
+    def __init__(self, msg_type, response, ieee=None, addr=None, endpoint=None,
+                 cluster=None, attribute=None, property_id=None, value=None, source=None):
+        self.msg_type = msg_type
+        self.source = source
+        self.response = response
+        self.ieee = ieee
+        self.addr = addr
+        self.endpoint = endpoint
+        self.cluster = cluster
+        self.attribute = attribute
+        self.property_id = property_id
+        self.value = value
+
+    def __repr__(self):
+        return 'Event({})'.format(', '.join('{}={}'.format(name, getattr(self, name))
+                                            for name in self.__slots__ if name != 'response'))
+
+
+class EventBus(object):
+    """
+    Publish / subscribe of Events with filters on EVENT_FIELDS.
+    Subscriptions are indexed by the set of fields they filter on
+    (their mask) then by the values of these fields, so publishing
+    costs one dict lookup per mask in use, whatever the number of
+    subscribers : only the matching callbacks are called.
+    """
+    def __init__(self):
+        self._index = {}  # mask: {values: {token: callback}}
+        self._subscriptions = {}  # token: (mask, values)
+        self._tokens = count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, callback, msg_type=None, source=None, ieee=None, addr=None, endpoint=None,
+                  cluster=None, attribute=None):
+        """
+        call callback(event) for the events matching all the given
+        filters (None : any value), returns a token for unsubscribe
+        """
+        filters = (msg_type, source, ieee, addr, endpoint, cluster, attribute)
+        mask = tuple(i for i, value in enumerate(filters) if value is not None)
+        values = tuple(filters[i] for i in mask)
+        with self._lock:
+            token = next(self._tokens)
+            # copy on write, publish works on the current dicts without lock
+            index = dict(self._index)
+            by_values = index[mask] = dict(index.get(mask, {}))
+            callbacks = by_values[values] = dict(by_values.get(values, {}))
+            callbacks[token] = callback
+            self._index = index
+            self._subscriptions[token] = (mask, values)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            mask, values = self._subscriptions.pop(token)
+            index = dict(self._index)
+            by_values = index[mask] = dict(index[mask])
+            callbacks = dict(by_values[values])
+            del callbacks[token]
+            if callbacks:
+                by_values[values] = callbacks
+            else:
+                del by_values[values]
+                if not by_values:
+                    del index[mask]
+            self._index = index
+
+    def publish(self, event):
+        """call the matching subscribers, returns their count"""
+        called = 0
+        fields = (event.msg_type, event.source, event.ieee, event.addr, event.endpoint,
+                  event.cluster, event.attribute)
+        for mask, by_values in self._index.items():
+            callbacks = by_values.get(tuple(fields[i] for i in mask))
+            if callbacks is None:
+                continue
+            for callback in callbacks.values():
+                called += 1
+                try:
+                    callback(event)
+                except Exception:
+                    ZGT_LOG.exception('EVENT : error in subscriber %r', callback)
+        return called
@@ -0,0 +1,25 @@
+#! /usr/bin/python3
+import os
+import tempfile
+
+
+def write_atomic(path, data):
+    """
+    write data to path through a temporary file (unique, so concurrent
+    writes of the same path do not mix), so path is always complete
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=name + '.', suffix='.tmp', delete=False) as f:
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    try:
+        os.replace(f.name, path)
+    except BaseException:
+        os.remove(f.name)
+        raise
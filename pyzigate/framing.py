@@ -0,0 +1,99 @@
+#! /usr/bin/python3
+import logging
+
+ZGT_LOG = logging.getLogger('zigate')
+
+ZGT_FRAME_START = 0x01
+ZGT_FRAME_END = 0x03
+# longest frame kept, delimiters included
+ZGT_MAX_FRAME_SIZE = 1024
+
+
+class Framer(object):
+    """
+    Streaming splitter for the ZiGate serial line
+    Frames are delimited by 0x01 ... 0x03, and as every byte < 0x10 is
+    escaped inside a frame, a 0x01 or 0x03 can only be a delimiter.
+    The scan position is kept between calls so every received byte
+    is only looked at once, whatever the size of the backlog.
+    """
+    def __init__(self, max_frame_size=ZGT_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.dropped_bytes = 0
+        self.dropped_frames = 0
+        self.reset()
+
+    def reset(self):
+        """forget any partial frame (i.e. after a reconnection)"""
+        self._buffer = bytearray()
+        self._start = -1  # position of the pending 0x01, -1 if none
+        self._pos = 0  # where to resume the scan
+
+    def feed(self, data):
+        """
+        Append data and yield complete frames, without delimiters,
+        as memoryviews on the internal buffer.
+        A frame is only valid until the next iteration, copy it if needed.
+        """
+        self._buffer += data
+        buffer = self._buffer
+        view = memoryview(buffer)
+        try:
+            size = len(buffer)
+            while self._pos < size:
+                if self._start < 0:
+                    start = buffer.find(ZGT_FRAME_START, self._pos)
+                    if start < 0:
+                        # only garbage, nothing to keep
+                        self._drop(size - self._pos)
+                        self._pos = size
+                        break
+                    self._drop(start - self._pos)
+                    self._start = start
+                    self._pos = start + 1
+
+                end = buffer.find(ZGT_FRAME_END, self._pos)
+                limit = size if end < 0 else end
+                restart = buffer.find(ZGT_FRAME_START, self._pos, limit)
+                if restart >= 0:
+                    # new start before the end : previous frame truncated
+                    self._drop(restart - self._start, frame=True)
+                    self._start = restart
+                    self._pos = restart + 1
+                    continue
+                if end < 0:
+                    self._pos = size
+                    if size - self._start > self.max_frame_size:
+                        # no end in sight, resync on next start byte
+                        self._drop(size - self._start, frame=True)
+                        self._start = -1
+                    break
+
+                start = self._start
+                self._start = -1
+                self._pos = end + 1
+                yield view[start + 1:end]
+        finally:
+            view.release()
+            self._compact()
+
+    def _drop(self, count, frame=False):
+        if count <= 0:
+            return
+        self.dropped_bytes += count
+        if frame:
+            self.dropped_frames += 1
+        ZGT_LOG.warning('FRAMING ERROR : {} byte(s) dropped'.format(count))
+
+    def _compact(self):
+        cut = self._start if self._start >= 0 else self._pos
+        if not cut:
+            return
+        try:
+            del self._buffer[:cut]
+        except BufferError:
+            # a frame is still referenced somewhere, let it keep the old buffer
+            self._buffer = bytearray(self._buffer[cut:])
+        self._pos -= cut
+        if self._start >= 0:
+            self._start -= cut
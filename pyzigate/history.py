@@ -0,0 +1,77 @@
+#! /usr/bin/python3
+from array import array
+
+
+class History(object):
+    """
+    Fixed capacity history of (timestamp, value) samples.
+    Both are stored as doubles in arrays allocated once, appending
+    a sample allocates nothing and overwrites the oldest one when full.
+    Queries return (timestamps, values) arrays, oldest first.
+    """
+    __slots__ = ('capacity', 'timestamps', 'values', 'head', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0  # next slot written
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        head = self.head
+        self.timestamps[head] = timestamp
+        self.values[head] = value
+        self.head = (head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _start(self):
+        return (self.head - self.count) % self.capacity
+
+    def _slice(self, data, first, n):
+        """n elements of data starting at the first-th oldest sample"""
+        start = (self._start() + first) % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return data[start:end]
+        return data[start:] + data[:end - self.capacity]
+
+    def last(self, n=None):
+        """the n (default all) last samples"""
+        n = self.count if n is None else min(n, self.count)
+        first = self.count - n
+        return self._slice(self.timestamps, first, n), self._slice(self.values, first, n)
+
+    def since(self, timestamp):
+        """samples with a timestamp >= timestamp"""
+        # binary search on the chronological order
+        low, high = 0, self.count
+        start = self._start()
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[(start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return self.last(self.count - low)
+
+    def _window(self, n, since):
+        if since is not None:
+            return self.since(since)[1]
+        return self.last(n)[1]
+
+    def min(self, n=None, since=None):
+        values = self._window(n, since)
+        return min(values) if values else None
+
+    def max(self, n=None, since=None):
+        values = self._window(n, since)
+        return max(values) if values else None
+
+    def mean(self, n=None, since=None):
+        values = self._window(n, since)
+        return sum(values) / len(values) if values else None
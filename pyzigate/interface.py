@@ -1,105 +1,230 @@
 #! /usr/bin/python3
 import logging
-from binascii import hexlify
-from struct import unpack
-from time import strftime
+from struct import Struct
 from collections import OrderedDict
-from . import commands_helpers, attributes_helpers
+from . import commands_helpers, attributes_helpers, snapshot
+from .commands import ZGT_ACTIVE_ENDPOINTS, active_endpoints_request
 from .parameters import *
-from .conversions import zgt_encode, zgt_decode, zgt_checksum, zgt_decode_struct
+from .conversions import zgt_decode, zgt_unescape, zgt_xor, zgt_encode_frame, zgt_decode_struct, zgt_id
+from .devices import DeviceRegistry
+from .events import Event, EventBus
+from .framing import Framer
+from .metrics import Metrics
+from .attributes_helpers import ATTRIBUTE_HEADER
+from .timers import TimerThread
+from .tracing import Tracer, Hex, SpacedHex, TIMESTAMP, ZGT_TRACE_IN, ZGT_TRACE_OUT
 from .responses import RESPONSES
 
 
 ZGT_LOG = logging.getLogger('zigate')
-
-
-class ZiGate():
-
-    def __init__(self):
-        self._buffer = b''
-        self._devices_info = {}
+# msg_type, msg_length, checksum (then data, rssi)
+MSG_HEADER = Struct('!HHB')
+
+
+class ZiGate(commands_helpers.Mixin, attributes_helpers.Mixin):
+    # set when several ZiGates are used (see manager), Event.source
+    name = None
+
+    def __init__(self, lazy_responses=False, scheduler=None, read_batcher=None, metrics=False):
+        self._framer = Framer()
+        self.trace = Tracer()
+        self.devices = DeviceRegistry()
+        # subscriptions to received messages / attributes (see events.EventBus)
+        self.events = EventBus()
+        # decode response fields only when they are read
+        self.lazy_responses = lazy_responses
+        # outbound queue (see scheduler.Scheduler), frames are sent right away if None
+        self.scheduler = scheduler
+        self._wakeup = None
+        # default call_later timers, one thread for all of them
+        self._timers = TimerThread()
+        # groups read_attribute calls (see batching.ReadBatcher)
+        self.read_batcher = read_batcher
+        # counters and latency histograms (see metrics), None if disabled :
+        # two clock reads and a few dict updates per frame
+        self.metrics = Metrics() if metrics else None
 
     # Store intersting (i.e. non technical properties) for futur use
     def set_device_property(self, addr, endpoint, property_id, property_data):
         """
-        log property / attribute value in a device based dictionnary
-        please note that short addr is not stable if device is reset
-        (still have to find the unique ID)
+        log property / attribute value in the device registry (self.devices)
+        addr / endpoint are ints, endpoint being None if unknown
+        (hexadecimal addr / endpoint like b'9824' are accepted too)
+        devices are tracked by IEEE address, the short addr being
+        remapped on Device Announce
         all data stored must be directly usable (i.e no bytes)
         """
-        if endpoint:
-            str_addr = '{}_{}'.format(addr.decode(), endpoint.decode())
-        else:
-            str_addr = '{}_x'.format(addr.decode())
-        if str_addr not in self._devices_info:
-            self._devices_info[str_addr] = {}
+        self.devices.set_property(zgt_id(addr), zgt_id(endpoint), property_id, property_data)
+
+    def save_snapshot(self, path, background=True):
+        """save devices and properties to path (atomic, in a thread by default)"""
+        return snapshot.save_snapshot(self.devices, path, background)
 
-        self._devices_info[str_addr][property_id] = property_data
+    def load_snapshot(self, path):
+        """
+        restore devices and properties saved by save_snapshot
+        (to be done before connecting), returns the devices count
+        """
+        return snapshot.load_snapshot(self.devices, path)
+
+    def interview_devices(self):
+        """ask the endpoints of new devices / devices with a new short address"""
+        for device in self.devices.interview_needed():
+            self.send_command(ZGT_ACTIVE_ENDPOINTS, active_endpoints_request(device.addr))
+
+    @property
+    def _devices_info(self):
+        """
+        legacy view of the registry {'addr_endpoint': {property: value}},
+        keys formatted as historically ('9824_01', '9824_x' without endpoint)
+        see self.devices for the int keyed registry
+        """
+        info = {}
+        for (addr, endpoint), properties in self.devices.properties().items():
+            if addr is None:
+                continue
+            key = '{:04x}_{}'.format(addr, 'x' if endpoint is None else '{:02x}'.format(endpoint))
+            info[key] = properties
+        return info
 
     # Must be overridden by external program
+    # (or subscribe to self.events to only get the messages needed)
     def set_external_command(self, command_type, **kwargs):
         pass
 
+    # Can be overridden by external program to drop responses
+    # (before any log, external command, event or on_response, i.e. routing /
+    # deduplication ; the scheduler, read batcher and registry still see them)
+    def filter_response(self, response):
+        return True
+
+    # Can be overridden, called for every response once handled
+    def on_response(self, response):
+        pass
+
     # Must be defined and assigned in the transport object
     @staticmethod
     def send_to_transport(data):
         pass
 
+    # Can be overridden by the transport to use its own timers
+    # (must return an object with a cancel() method)
+    def call_later(self, delay, callback):
+        return self._timers.call_later(delay, callback)
+
+    def schedule_wakeup(self, delay):
+        """call send_pending after delay seconds"""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = self.call_later(delay, self.send_pending)
+
+    def send_pending(self):
+        """send the queued commands allowed by the scheduler"""
+        delay = self.scheduler.pump(self._transmit)
+        if delay is not None:
+            self.schedule_wakeup(delay)
+
+    def reset_input(self):
+        """drop any partial frame received (i.e. after a reconnection)"""
+        self._framer.reset()
+
     def read_data(self, data):
         """Read ZiGate output and split messages
         Must be called from a thread loop or asyncio event loop"""
-        self._buffer += data
-        endpos = self._buffer.find(b'\x03')
-        while endpos != -1:
-            startpos = self._buffer.find(b'\x01')
-            # stripping starting 0x01 & ending 0x03
-            data_to_decode = zgt_decode(self._buffer[startpos + 1:endpos])
-            
-            self.interpret_response(data_to_decode)
+        trace = self.trace.refresh()
+        for frame in self._framer.feed(data):
+            if trace.binary is not None:
+                trace.binary.write(ZGT_TRACE_IN, frame)
+            # starting 0x01 & ending 0x03 already stripped
+            data_to_decode = zgt_decode(frame)
 
-            ZGT_LOG.debug('--------------------------------------')
-            ZGT_LOG.debug('  # encoded : {}'.format(hexlify(self._buffer[startpos:endpos + 1])))
-            ZGT_LOG.debug('  # decoded : 01{}03'.format( ' '.join([format(x, '02x') for x in data_to_decode]).upper()))
-            ZGT_LOG.debug('  (@timestamp : {})'.format(strftime("%H:%M:%S")))
+            self.interpret_response(data_to_decode)
 
-            self._buffer = self._buffer[endpos + 1:]
-            endpos = self._buffer.find(b'\x03')
+            if trace.debug:
+                ZGT_LOG.debug('--------------------------------------')
+                ZGT_LOG.debug('  # encoded : 01%s03', Hex(frame))
+                ZGT_LOG.debug('  # decoded : 01 %s 03', SpacedHex(data_to_decode))
+                ZGT_LOG.debug('  (@timestamp : %s)', TIMESTAMP)
 
 
     def interpret_response(self, data):
-        """Interpret responses attributes"""
-        ZGT_LOG.info('RESPONSE DATA {}'.format(data))
-        #msg_type = int.from_bytes(data[0:2], byteorder='big', signed=False)
-        #msg_length = int.from_bytes(data[2:4], byteorder='big', signed=False)
-        #msg_crc = int.from_bytes(data[4:5], byteorder='big', signed=False)
-        #msg_data = data[5:]
-        #msg_rssi = int.from_bytes(data[-1:], byteorder='big', signed=False)
-        msg_data_length = len(data)-6
-        msg_type, msg_length, msg_crc, msg_data, msg_rssi = unpack('!HHB{}sB'.format(msg_data_length), data)
-	
+        """Interpret responses attributes
+        (log levels are the ones seen by the last read_data / send_data,
+        call self.trace.refresh() first if used alone)"""
+        trace = self.trace
+        metrics = self.metrics
+        if metrics is not None:
+            start = metrics.clock()
+        if trace.debug:
+            ZGT_LOG.debug('RESPONSE DATA %s', Hex(data))
+        if len(data) < 6:
+            ZGT_LOG.error('BAD LENGTH %s < 6', len(data))
+            if metrics is not None:
+                metrics.length_errors += 1
+            return
+        msg_type, msg_length, msg_crc = MSG_HEADER.unpack_from(data)
+        msg_data = data[5:-1]
+        msg_rssi = data[-1]
+
         if msg_length-1 != len(msg_data):
-            ZGT_LOG.error('BAD LENGTH {0} != {1}'.format(msg_length,len(msg_data)))
+            ZGT_LOG.error('BAD LENGTH %s != %s', msg_length, len(msg_data))
+            if metrics is not None:
+                metrics.length_errors += 1
             return
 
-        computed_crc = zgt_checksum(data[0:2], data[2:4], data[5:])
+        # xor of the whole frame cancels the checksum out
+        computed_crc = zgt_xor(data) ^ msg_crc
         if msg_crc != computed_crc:
-            ZGT_LOG.error('BAD CRC {0} != {1}'.format(msg_crc,computed_crc))
+            ZGT_LOG.error('BAD CRC %s != %s', msg_crc, computed_crc)
+            if metrics is not None:
+                metrics.crc_errors += 1
             return
+        if metrics is not None:
+            metrics.frame_received(msg_type)
 
         # Do different things based on MsgType
-        ZGT_LOG.debug('--------------------------------------')
-
-        if RESPONSES.get(msg_type):
-            #ZGT_LOG.debug('RESPONSE {:04x}'.format(msg_type))
-
+        response_class = RESPONSES.get(msg_type)
+        if response_class is not None:
             # Analyze response data and show logs
-            resp = RESPONSES[msg_type](data)
-            resp.show_log()
-            ZGT_LOG.debug('  - MsgType         : {:04x}'.format(msg_type))
-            ZGT_LOG.debug('  - MsgLength       : {}'.format(msg_length))
-            ZGT_LOG.debug('  - ChkSum          : {}'.format(msg_crc))
-            ZGT_LOG.debug('  - Data            : {}'.format(hexlify(msg_data)))
-            ZGT_LOG.debug('  - RSSI            : {}'.format(msg_rssi))
+            resp = response_class(data, self.lazy_responses)
+            if metrics is not None:
+                decoded = metrics.clock()
+                metrics.decoded(msg_type, decoded - start)
+
+            # Status : frees a scheduler slot, or the command is sent again
+            if msg_type == 0x8000 and self.scheduler is not None:
+                resp.command, retried = self.scheduler.status_received(resp.status, resp.packet_type)
+                self.send_pending()
+                if retried:
+                    return
+
+            # internal bookkeeping is done whatever the filter says
+            accepted = self.filter_response(resp)
+            # Attribute report / response : update device properties
+            if msg_type in ZGT_ATTRIBUTE_MESSAGES:
+                self.interpret_attributes(resp.msg_data, resp, accepted)
+                if msg_type == 0x8100 and self.read_batcher is not None:
+                    addr, endpoint, cluster, attribute = ATTRIBUTE_HEADER.unpack_from(resp.msg_data)[1:5]
+                    self.read_batcher.resolve(addr, endpoint, cluster, attribute, resp)
+            # short address <-> IEEE address
+            elif msg_type == 0x004d:
+                self.devices.announce_message(resp.msg_data)
+            elif msg_type == 0x8015:
+                self.devices.device_list_message(resp.msg_data)
+            elif msg_type == 0x8045:
+                self.devices.endpoints_message(resp.msg_data)
+            if not accepted:
+                return
+
+            if trace.info:
+                ZGT_LOG.debug('--------------------------------------')
+                resp.show_log()
+            if trace.debug:
+                ZGT_LOG.debug('  - MsgType         : %04x', msg_type)
+                ZGT_LOG.debug('  - MsgLength       : %s', msg_length)
+                ZGT_LOG.debug('  - ChkSum          : %s', msg_crc)
+                ZGT_LOG.debug('  - Data            : %s', Hex(msg_data))
+                ZGT_LOG.debug('  - RSSI            : %s', msg_rssi)
 
             # If any command related to the response needs to be triggered, the do it
             commands = resp.get_external_commands()
@@ -107,108 +232,69 @@ class ZiGate():
                 cmd, params = commands.popitem(last=False)
                 self.set_external_command(cmd, **params)
 
-        else:
-            ZGT_LOG.debug('RESPONSE {:04x} : Unknown Message'.format(msg_type))
-            ZGT_LOG.debug('  - After decoding  : {}'.format(hexlify(data)))
-            ZGT_LOG.debug('  - MsgType         : {:04x}'.format(msg_type))
-            ZGT_LOG.debug('  - MsgLength       : {}'.format(msg_type))
-            ZGT_LOG.debug('  - ChkSum          : {}'.format(msg_crc))
-            ZGT_LOG.debug('  - Data            : {}'.format(hexlify(msg_data)))
-            ZGT_LOG.debug('  - RSSI            : {}'.format(msg_rssi))
-
-
-
-    def send_data(self, cmd, data=""):
-        """send data through ZiGate
-        Calls "transport_write" which must be defined
-        in a serial connection or pyserial_asyncio transport"""
-        byte_cmd = bytes.fromhex(cmd)
-        byte_data = bytes.fromhex(data)
-        length = int(len(data)/2)
-        byte_length = length.to_bytes(2, 'big')
-
-        # --- non encoded version ---
-        std_msg = [0x01]
-        std_msg.extend(byte_cmd)
-        std_msg.extend(byte_length)
-        std_msg.append(zgt_checksum(byte_cmd, byte_length, byte_data))
-        if data != "":
-            std_msg.extend(byte_data)
-        std_msg.append(0x03)
-
-        # --- encoded version ---
-        enc_msg = [0x01]
-        enc_msg.extend(zgt_encode(byte_cmd))
-        enc_msg.extend(zgt_encode(byte_length))
-        enc_msg.append(zgt_checksum(byte_cmd, byte_length, byte_data))
-        if data != "":
-            enc_msg.extend(zgt_encode(byte_data))
-        enc_msg.append(0x03)
-
-        std_output = b''.join([bytes([x]) for x in std_msg])
-        encoded_output = b''.join([bytes([x]) for x in enc_msg])
-        ZGT_LOG.debug('--------------------------------------')
-        ZGT_LOG.debug('REQUEST      : {} {}'.format(cmd, data))
-        ZGT_LOG.debug('  # standard : {}'.format(' '.join([format(x, '02x') for x in std_output]).upper()))
-        ZGT_LOG.debug('  # encoded  : {}'.format(hexlify(encoded_output)))
-        ZGT_LOG.debug('(timestamp : {})'.format(strftime("%H:%M:%S")))
-        ZGT_LOG.debug('--------------------------------------')
-
-        self.send_to_transport(encoded_output)
+            # attribute messages are published by interpret_attributes
+            if self.events and msg_type not in ZGT_ATTRIBUTE_MESSAGES:
+                self.events.publish(Event(msg_type, resp, source=self.name))
 
+            self.on_response(resp)
+            if metrics is not None:
+                metrics.dispatched(msg_type, metrics.clock() - decoded)
+            return
 
-    def read_attribute(self, device_address, device_endpoint, cluster_id, attribute_id):
-        """
-        Sends read attribute command to device
-
-        :type self: Zigate
-        :param str device_address: length 4. Example "AB01"
-        :param str device_endpoint: length 2. Example "01"
-        :param str cluster_id: length 4. Example "0000"
-        :param str attribute_id: length 4. Example "0005"
-
-        Examples:
-        ========
-        Replace device_address AB01 with your devices address.
-        All clusters and parameters are not available on every device.
-        - Get device manufacturer name: read_attribute('AB01', '01', '0000', '0004')
-        - Get device name: read_attribute('AB01', '01', '0000', '0005')
-        - Get device battery voltage: read_attribute('AB01', '01', '0001', '0006')
-        """
-        cmd = '02' + device_address + '01' + device_endpoint + cluster_id + '00 00 0000 01' + attribute_id
-        self.send_data('0100', cmd)
+        if metrics is not None:
+            metrics.unknown_message(msg_type)
+        if trace.debug:
+            ZGT_LOG.debug('--------------------------------------')
+            ZGT_LOG.debug('RESPONSE %04x : Unknown Message', msg_type)
+            ZGT_LOG.debug('  - After decoding  : %s', Hex(data))
+            ZGT_LOG.debug('  - MsgType         : %04x', msg_type)
+            ZGT_LOG.debug('  - MsgLength       : %s', msg_length)
+            ZGT_LOG.debug('  - ChkSum          : %s', msg_crc)
+            ZGT_LOG.debug('  - Data            : %s', Hex(msg_data))
+            ZGT_LOG.debug('  - RSSI            : %s', msg_rssi)
+
+
+
+    def send_data(self, cmd, data="", priority=ZGT_PRIORITY_NORMAL):
+        """send data through ZiGate, cmd and data being hex strings
+        (see send_command)"""
+        self.send_command(int(cmd, 16), bytes.fromhex(data), priority)
+
+    def send_command(self, cmd, payload=b'', priority=ZGT_PRIORITY_NORMAL, token=None):
+        """send a command (int) and its payload (bytes, see commands) through ZiGate
+        Calls "send_to_transport" which must be defined
+        in a serial connection or pyserial_asyncio transport
+        With a scheduler, the frame is queued by priority (ZGT_PRIORITY_*)
+        and token is given back as the status Response_8000.command.token"""
+        encoded_output = zgt_encode_frame(cmd, payload)
+
+        trace = self.trace.refresh()
+        if trace.debug:
+            ZGT_LOG.debug('--------------------------------------')
+            ZGT_LOG.debug('REQUEST      : %04x %s', cmd, Hex(payload))
 
-    def read_multiple_attributes(self, device_address, device_endpoint, cluster_id, first_attribute_id, attributes):
-        """
-        Constructs read_attribute command with multiple attributes and sends it
-
-        :type self: Zigate
-        :param str device_address: length 4. E
-        :param str device_endpoint: length 2.
-        :param str cluster_id: length 4.
-        :param str first_attribute_id: length 4
-        :param int attributes: How many attributes are requested. Max value 255
-
-        Examples:
-        ========
-        Replace device_address AB01 with your devices address.
-        All clusters and parameters are not available on every device.
-
-        - Get five first attributes from "General: Basic" cluster:
-          read_multiple_attributes('AB01', '01', '0000', '0000', 5)
-        """
-        cmd = '02' + device_address + '01' + device_endpoint + cluster_id + '00 00 0000' + '{:02x}'.format(attributes)
-        for i in range(attributes):
-            cmd += '{:04x}'.format(int(first_attribute_id, 16) + i)
-        self.send_data('0100', cmd)
+        if self.scheduler is None:
+            self._transmit(encoded_output)
+        else:
+            self.scheduler.submit(cmd, encoded_output, priority, token)
+            self.send_pending()
+
+    def _transmit(self, encoded_output):
+        if self.metrics is not None:
+            # on transmission, retries included (the escaped command type is at most 4 bytes)
+            self.metrics.frame_sent(int.from_bytes(zgt_unescape(encoded_output[1:5])[:2], 'big'))
+        trace = self.trace
+        if trace.binary is not None:
+            trace.binary.write(ZGT_TRACE_OUT, encoded_output[1:-1])
+        if trace.debug:
+            # non encoded version
+            ZGT_LOG.debug('  # standard : %s', SpacedHex(zgt_decode(encoded_output)))
+            ZGT_LOG.debug('  # encoded  : %s', Hex(encoded_output))
+            ZGT_LOG.debug('(timestamp : %s)', TIMESTAMP)
+            ZGT_LOG.debug('--------------------------------------')
 
-    def permit_join(self):
-        """
-        permit join for 30 secs (1E)
+        self.send_to_transport(encoded_output)
 
-        :type self: Zigate
-        """
-        self.send_data("0049", "FFFC1E00")
 
         # Device Announce
 #        if msg_type == 0x004d :
@@ -0,0 +1,129 @@
+#! /usr/bin/python3
+import asyncio
+import logging
+from time import monotonic
+from .aio import AsyncZiGate
+from .events import EventBus
+from .metrics import prometheus_text
+from .transports.aio import AsyncTransport
+
+ZGT_LOG = logging.getLogger('zigate')
+
+
+class ManagedZiGate(AsyncZiGate):
+    """
+    AsyncZiGate counting its received bytes for CoordinatorManager.metrics
+    (frames being counted by zigate.metrics)
+    """
+    def __init__(self, name, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.received_bytes = 0
+        self.last_received = None
+
+    def read_data(self, data):
+        self.received_bytes += len(data)
+        self.last_received = monotonic()
+        super().read_data(data)
+
+
+class CoordinatorManager(object):
+    """
+    Several ZiGates (one per stick / network) on a single asyncio loop.
+    All of them publish on one EventBus (events, Event.source being the
+    coordinator name). As short addresses are only unique within a
+    network, each coordinator keeps its own DeviceRegistry, the manager
+    finds the coordinator owning a device (by IEEE address) to route
+    the commands sent to it.
+    """
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.events = EventBus()
+        self.coordinators = {}  # name: ManagedZiGate
+        self.transports = {}  # name: AsyncTransport
+
+    def __iter__(self):
+        return iter(self.coordinators.values())
+
+    def add(self, name, **kwargs):
+        """
+        create the coordinator name (kwargs for AsyncZiGate, metrics being
+        enabled unless metrics=False), its transport being set up with
+        open_tcp / open_serial (or as for a single ZiGate)
+        """
+        if name in self.coordinators:
+            raise ValueError('coordinator {} already exists'.format(name))
+        kwargs.setdefault('metrics', True)
+        zigate = ManagedZiGate(name, loop=self.loop, **kwargs)
+        zigate.events = self.events
+        self.coordinators[name] = zigate
+        return zigate
+
+    async def open_tcp(self, name, host, port=9999, **kwargs):
+        """connect a coordinator to a WiFi ZiGate (kwargs for AsyncTransport)"""
+        return await self._open(name, host=host, port=port, **kwargs)
+
+    async def open_serial(self, name, serial_port='/dev/ttyUSB0', **kwargs):
+        """connect a coordinator to a serial ZiGate (kwargs for AsyncTransport)"""
+        return await self._open(name, serial_port=serial_port, **kwargs)
+
+    async def _open(self, name, **kwargs):
+        zigate = self.coordinators[name]
+        transport = self.transports[name] = AsyncTransport(zigate, self.loop, **kwargs)
+        await transport.connect()
+        return zigate
+
+    def close(self):
+        for transport in self.transports.values():
+            transport.close()
+        self.transports.clear()
+
+    def device(self, ieee):
+        """(coordinator, Device) for an IEEE address, (None, None) if unknown"""
+        for zigate in self.coordinators.values():
+            device = zigate.devices.get_by_ieee(ieee)
+            if device is not None and device.addr is not None:
+                return zigate, device
+        return None, None
+
+    def devices(self):
+        """(coordinator name, Device) of all the known devices"""
+        return [(zigate.name, device) for zigate in self.coordinators.values() for device in zigate.devices]
+
+    def call(self, ieee, method, *args, **kwargs):
+        """
+        call a ZiGate method taking a short address as first argument
+        (read_attribute, read_attributes ...) on the coordinator of a device
+
+            manager.call(0x00158d0001d6db5a, 'read_attributes', 0x01, 0x0402, [0x0000])
+        """
+        zigate, device = self.device(ieee)
+        if zigate is None:
+            raise KeyError('unknown device {:016x}'.format(ieee))
+        return getattr(zigate, method)(device.addr, *args, **kwargs)
+
+    def metrics(self):
+        """{coordinator name: {metric: value}}, frames counts being None without zigate.metrics"""
+        metrics = {}
+        for name, zigate in self.coordinators.items():
+            counters = zigate.metrics
+            metrics[name] = {'devices': len(zigate.devices),
+                             'received_bytes': zigate.received_bytes,
+                             'received_frames': sum(counters.received.values()) if counters is not None else None,
+                             'sent_frames': sum(counters.sent.values()) if counters is not None else None,
+                             'dropped_frames': zigate._framer.dropped_frames,
+                             'dropped_bytes': zigate._framer.dropped_bytes,
+                             'queued': len(zigate.scheduler) if zigate.scheduler is not None else 0,
+                             'in_flight': sum(len(waiting) for waiting in zigate._waiting_status.values()),
+                             'last_received': zigate.last_received}
+            transport = self.transports.get(name)
+            if transport is not None:
+                metrics[name].update({'connected': transport.connected,
+                                      'connections': transport.connections,
+                                      'send_queue': len(transport._queue),
+                                      'send_dropped': transport.dropped})
+        return metrics
+
+    def prometheus_text(self):
+        """metrics.prometheus_text of all the coordinators"""
+        return prometheus_text(self)
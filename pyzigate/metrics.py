@@ -0,0 +1,211 @@
+#! /usr/bin/python3
+"""
+Runtime metrics of a ZiGate (zigate.metrics, ZiGate(metrics=True)) :
+counters per message type, error counters and latency histograms (two
+clock reads and a few dict updates per frame), read with collect() or
+exposed to Prometheus with prometheus_text().
+"""
+import bisect
+from time import perf_counter_ns
+
+# upper bounds (s) of the latency histograms buckets (+Inf implied)
+LATENCY_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2, 1e-1)
+
+
+class Histogram(object):
+    """fixed buckets histogram of durations in ns"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = [int(bound * 1e9) for bound in buckets]
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, duration):
+        self.counts[bisect.bisect_left(self.bounds, duration)] += 1
+        self.sum += duration
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper bound in s, count of observations <= bound)], last bound being inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds + [None], self.counts):
+            total += count
+            result.append((float('inf') if bound is None else bound / 1e9, total))
+        return result
+
+    def percentile(self, percent):
+        """upper bound (s) of the bucket holding the percentile, None if empty"""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+
+
+class Metrics(object):
+    """
+    counters and histograms updated by the ZiGate, framing errors being
+    the ones counted by its framer and queue depths read by collect()
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.received = {}  # msg_type: frames
+        self.sent = {}  # command: frames
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.unknown_messages = {}  # msg_type: frames
+        self.unknown_attributes = {}  # (cluster, attribute): count
+        self.decode_latency = {}  # msg_type: Histogram
+        self.dispatch_latency = {}  # msg_type: Histogram
+        self.clock = perf_counter_ns
+
+    def frame_received(self, msg_type):
+        self.received[msg_type] = self.received.get(msg_type, 0) + 1
+
+    def frame_sent(self, cmd):
+        self.sent[cmd] = self.sent.get(cmd, 0) + 1
+
+    def unknown_message(self, msg_type):
+        self.unknown_messages[msg_type] = self.unknown_messages.get(msg_type, 0) + 1
+
+    def unknown_attribute(self, cluster, attribute):
+        key = (cluster, attribute)
+        self.unknown_attributes[key] = self.unknown_attributes.get(key, 0) + 1
+
+    def _histogram(self, histograms, msg_type):
+        histogram = histograms.get(msg_type)
+        if histogram is None:
+            histogram = histograms[msg_type] = Histogram(self.buckets)
+        return histogram
+
+    def decoded(self, msg_type, duration):
+        self._histogram(self.decode_latency, msg_type).observe(duration)
+
+    def dispatched(self, msg_type, duration):
+        self._histogram(self.dispatch_latency, msg_type).observe(duration)
+
+
+def queue_depths(zigate):
+    """{queue: frames / requests waiting} of a ZiGate"""
+    depths = {}
+    if zigate.scheduler is not None:
+        depths['scheduler'] = len(zigate.scheduler)
+    if zigate.read_batcher is not None:
+        depths['read_batcher'] = len(zigate.read_batcher)
+    waiting_status = getattr(zigate, '_waiting_status', None)
+    if waiting_status is not None:
+        # AsyncZiGate requests waiting for their status
+        depths['in_flight'] = sum(len(waiting) for waiting in waiting_status.values())
+    return depths
+
+
+def collect(zigate):
+    """metrics of a ZiGate as a dict (ints, latency percentiles in s), None if disabled"""
+    metrics = zigate.metrics
+    if metrics is None:
+        return None
+    latency = {}
+    for kind, histograms in (('decode', metrics.decode_latency), ('dispatch', metrics.dispatch_latency)):
+        for msg_type, histogram in histograms.items():
+            latency.setdefault(msg_type, {})[kind] = {
+                'count': histogram.count,
+                'mean': histogram.sum / histogram.count / 1e9 if histogram.count else None,
+                'p50': histogram.percentile(50),
+                'p99': histogram.percentile(99)}
+    scheduler = zigate.scheduler
+    return {'received': dict(metrics.received),
+            'sent': dict(metrics.sent),
+            'crc_errors': metrics.crc_errors,
+            'length_errors': metrics.length_errors,
+            'framing_errors': zigate._framer.dropped_frames,
+            'framing_dropped_bytes': zigate._framer.dropped_bytes,
+            'unknown_messages': dict(metrics.unknown_messages),
+            'unknown_attributes': dict(metrics.unknown_attributes),
+            'retried': scheduler.retried if scheduler is not None else 0,
+            'failed': scheduler.failed if scheduler is not None else 0,
+            'queues': queue_depths(zigate),
+            'latency': latency}
+
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(name, value) for name, value in labels.items()
+                          if value is not None) + '}'
+
+
+def prometheus_text(zigates):
+    """
+    Prometheus text exposition of one ZiGate or several ones (labelled
+    by their name, i.e. a CoordinatorManager)
+    """
+    if not hasattr(zigates, '__iter__'):
+        zigates = [zigates]
+    zigates = list(zigates)
+    families = (
+        ('zigate_frames_received_total', 'counter', 'frames received by message type'),
+        ('zigate_frames_sent_total', 'counter', 'frames sent by command'),
+        ('zigate_crc_errors_total', 'counter', 'frames received with a bad checksum'),
+        ('zigate_length_errors_total', 'counter', 'frames received with a bad length'),
+        ('zigate_framing_errors_total', 'counter', 'partial frames dropped by the framer'),
+        ('zigate_framing_dropped_bytes_total', 'counter', 'bytes dropped by the framer'),
+        ('zigate_unknown_messages_total', 'counter', 'frames received of an unknown message type'),
+        ('zigate_unknown_attributes_total', 'counter', 'attributes received without decoder'),
+        ('zigate_retried_total', 'counter', 'commands sent again by the scheduler'),
+        ('zigate_failed_total', 'counter', 'commands given up by the scheduler'),
+        ('zigate_queue_depth', 'gauge', 'frames or requests waiting by queue'),
+        ('zigate_decode_latency_seconds', 'histogram', 'frame checks and response decoding by message type'),
+        ('zigate_dispatch_latency_seconds', 'histogram', 'attributes, registry and subscribers by message type'),
+    )
+    samples = {name: [] for name, _kind, _help in families}
+    for zigate in zigates:
+        metrics = zigate.metrics
+        if metrics is None:
+            continue
+        name = zigate.name
+        for msg_type, count in sorted(metrics.received.items()):
+            samples['zigate_frames_received_total'].append(
+                (_labels(coordinator=name, msg_type='{:04x}'.format(msg_type)), count))
+        for cmd, count in sorted(metrics.sent.items()):
+            samples['zigate_frames_sent_total'].append(
+                (_labels(coordinator=name, command='{:04x}'.format(cmd)), count))
+        for family, value in (('zigate_crc_errors_total', metrics.crc_errors),
+                              ('zigate_length_errors_total', metrics.length_errors),
+                              ('zigate_framing_errors_total', zigate._framer.dropped_frames),
+                              ('zigate_framing_dropped_bytes_total', zigate._framer.dropped_bytes)):
+            samples[family].append((_labels(coordinator=name), value))
+        for msg_type, count in sorted(metrics.unknown_messages.items()):
+            samples['zigate_unknown_messages_total'].append(
+                (_labels(coordinator=name, msg_type='{:04x}'.format(msg_type)), count))
+        for (cluster, attribute), count in sorted(metrics.unknown_attributes.items()):
+            samples['zigate_unknown_attributes_total'].append(
+                (_labels(coordinator=name, cluster='{:04x}'.format(cluster),
+                         attribute='{:04x}'.format(attribute)), count))
+        if zigate.scheduler is not None:
+            samples['zigate_retried_total'].append((_labels(coordinator=name), zigate.scheduler.retried))
+            samples['zigate_failed_total'].append((_labels(coordinator=name), zigate.scheduler.failed))
+        for queue, depth in sorted(queue_depths(zigate).items()):
+            samples['zigate_queue_depth'].append((_labels(coordinator=name, queue=queue), depth))
+        for family, histograms in (('zigate_decode_latency_seconds', metrics.decode_latency),
+                                   ('zigate_dispatch_latency_seconds', metrics.dispatch_latency)):
+            for msg_type, histogram in sorted(histograms.items()):
+                msg_type = '{:04x}'.format(msg_type)
+                for bound, count in histogram.cumulative():
+                    samples[family].append(('_bucket' + _labels(coordinator=name, msg_type=msg_type,
+                                                                le='{:g}'.format(bound).replace('inf', '+Inf')),
+                                            count))
+                samples[family].append(('_sum' + _labels(coordinator=name, msg_type=msg_type),
+                                        histogram.sum / 1e9))
+                samples[family].append(('_count' + _labels(coordinator=name, msg_type=msg_type),
+                                        histogram.count))
+    lines = []
+    for family, kind, description in families:
+        lines.append('# HELP {} {}'.format(family, description))
+        lines.append('# TYPE {} {}'.format(family, kind))
+        for suffix, value in samples[family]:
+            if kind != 'histogram':
+                suffix = '' if suffix == '{}' else suffix
+            lines.append('{}{} {}'.format(family, suffix, value))
+    return '\n'.join(lines) + '\n'
@@ -1,7 +1,10 @@
 #! /usr/bin/python3
+from .conversions import IdDict
 
 # states & properties
 ZGT_BATTERY = 'battery power'
+# battery of the Xiaomi heartbeat (0000/ff01), historical name
+ZGT_XIAOMI_BATTERY = 'battery'
 ZGT_TEMPERATURE = 'temperature'
 ZGT_PRESSURE = 'pressure'
 ZGT_DETAILED_PRESSURE = 'detailed pressure'
@@ -15,6 +18,17 @@ ZGT_STATE_ON = 'on-press'
 ZGT_STATE_MULTI = 'multi_{}'
 ZGT_STATE_OFF = 'off-release'
 ZGT_CLUSTER_UNKNOWN = 'cluster unknwon'
+ZGT_TYPE = 'type'
+ZGT_RSSI = 'rssi'
+ZGT_TBD = 'TBD'  # decoded but not stored as a device property
+
+# messages handled by attributes_helpers.interpret_attributes
+ZGT_ATTRIBUTE_MESSAGES = (0x8100, 0x8102, 0x8110)
+
+# outbound priorities (see scheduler), lowest first
+ZGT_PRIORITY_INTERACTIVE = 0
+ZGT_PRIORITY_NORMAL = 1
+ZGT_PRIORITY_POLLING = 2
 
 # commands for external use
 ZGT_CMD_NEW_DEVICE = 'new device'
@@ -22,34 +36,33 @@ ZGT_CMD_LIST_DEVICES = 'list devices'
 ZGT_CMD_LIST_ENDPOINTS = 'list endpoints'
 
 # clusters
-CLUSTERS = {b'0000': 'General : Basic',
-            b'0001': 'General : Power Config',
-            b'0002': 'General : Temperature Config',
-            b'0003': 'General : Identify',
-            b'0004': 'General : Groups',
-            b'0005': 'General : Scenes',
-            b'0006': 'General : On/Off',
-            b'0007': 'General : On/Off Config',
-            b'0008': 'General : Level Control',
-            b'0009': 'General : Alarms',
-            b'000A': 'General : Time',
-            b'000F': 'General : Binary Input Basic',
-            b'0020': 'General : Poll Control',
-            b'0019': 'General : OTA',
-            b'0101': 'General : Door Lock',
-            b'0201': 'HVAC : Thermostat',
-            b'0202': 'HVAC : Fan Control',
-            b'0300': 'Lighting : Color Control',
-            b'0400': 'Measurement : Illuminance',
-            b'0402': 'Measurement : Temperature',
-            b'0403': 'Measurement : Atmospheric Pressure',
-            b'0405': 'Measurement : Humidity',
-            b'0406': 'Measurement : Occupancy Sensing',
-            b'0500': 'Security & Safety : IAS Zone',
-            b'0702': 'Smart Energy : Metering',
-            b'0B05': 'Misc : Diagnostics',
-            b'1000': 'ZLL : Commissioning',
-            b'FF01': 'Xiaomi private',
-            b'FF02': 'Xiaomi private'
-            }
-
+CLUSTERS = IdDict({0x0000: 'General : Basic',
+                   0x0001: 'General : Power Config',
+                   0x0002: 'General : Temperature Config',
+                   0x0003: 'General : Identify',
+                   0x0004: 'General : Groups',
+                   0x0005: 'General : Scenes',
+                   0x0006: 'General : On/Off',
+                   0x0007: 'General : On/Off Config',
+                   0x0008: 'General : Level Control',
+                   0x0009: 'General : Alarms',
+                   0x000a: 'General : Time',
+                   0x000f: 'General : Binary Input Basic',
+                   0x0020: 'General : Poll Control',
+                   0x0019: 'General : OTA',
+                   0x0101: 'General : Door Lock',
+                   0x0201: 'HVAC : Thermostat',
+                   0x0202: 'HVAC : Fan Control',
+                   0x0300: 'Lighting : Color Control',
+                   0x0400: 'Measurement : Illuminance',
+                   0x0402: 'Measurement : Temperature',
+                   0x0403: 'Measurement : Atmospheric Pressure',
+                   0x0405: 'Measurement : Humidity',
+                   0x0406: 'Measurement : Occupancy Sensing',
+                   0x0500: 'Security & Safety : IAS Zone',
+                   0x0702: 'Smart Energy : Metering',
+                   0x0b05: 'Misc : Diagnostics',
+                   0x1000: 'ZLL : Commissioning',
+                   0xff01: 'Xiaomi private',
+                   0xff02: 'Xiaomi private'
+                   })
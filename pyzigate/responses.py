@@ -3,13 +3,18 @@ import logging
 from .parameters import * 
 from collections import OrderedDict
 from binascii import hexlify
-from .conversions import zgt_decode_struct, zgt2int
-from .attributes import ATTRIBUTES
+from struct import Struct
+from .conversions import zgt_compile_struct, zgt2int, LazyStruct
+from .attributes import get_attribute_decoder
 
 ZGT_LOG = logging.getLogger('zigate')
 RESPONSES = {}
+# status, sequence, packet_type of a 8000 message
+STATUS_HEADER = Struct('!BBH')
 
 def register_response(response):
+    # struct is compiled once here, not on every message
+    response.decode_plan = zgt_compile_struct(response.struct)
     RESPONSES[response.id] = response
     return response
 
@@ -18,27 +23,40 @@ class Response(object):
     id = None
     descr = 'Unknown Message'
     struct = OrderedDict()
-    
-    def __init__(self, data):
+    decode_plan = zgt_compile_struct(struct)
+
+    def __init__(self, data, lazy=False):
+        """
+        lazy : keep a memoryview on the message and decode fields
+               (and external commands) only when they are read
+        """
         self.msg_type = zgt2int(data[0:2])
         self.msg_length = zgt2int(data[2:4])
         self.msg_crc = zgt2int(data[4:5])
-        self.msg_data = data[5:]
         self.msg_rssi = zgt2int(data[-1:])
-        
-        self.msg = zgt_decode_struct(self.struct, self.msg_data)
-        self.external_commands = OrderedDict()
-        self.add_external_commands()
+
+        if lazy:
+            self.msg_data = memoryview(data)[5:]
+            self.msg = LazyStruct(self.decode_plan, self.msg_data)
+            self.external_commands = None
+        else:
+            self.msg_data = data[5:]
+            self.msg = self.decode_plan.decode(self.msg_data)
+            self.external_commands = OrderedDict()
+            self.add_external_commands()
 
     def show_log(self):
-        ZGT_LOG.debug('RESPONSE {:04x} : {}'.format(self.id, self.descr))
+        ZGT_LOG.debug('RESPONSE %04x : %s', self.id, self.descr)
         for key in self.msg:
-            ZGT_LOG.debug('  - {:<20} : {}'.format(key, self.msg[key]))
+            ZGT_LOG.debug('  - %-20s : %s', key, self.msg[key])
     
     def add_external_commands(self):
         pass
 
     def get_external_commands(self):
+        if self.external_commands is None:
+            self.external_commands = OrderedDict()
+            self.add_external_commands()
         return self.external_commands
 
 
@@ -56,22 +74,26 @@ class Response_004d(Response):
 class Response_8000(Response):
     id = 0x8000
     descr = 'Status'
+    # scheduler.OutboundCommand matched with the status (if scheduled)
+    command = None
     struct = OrderedDict([('status', 'int'), ('sequence', 8),('packet_type', 16), ('info', 'rawend')])
 
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, lazy=False):
+        super().__init__(data, lazy)
+        # int values, used to match the status with the command sent
+        self.status, self.sequence, self.packet_type = STATUS_HEADER.unpack_from(self.msg_data)
         status_codes = {0: 'Success', 1: 'Invalid parameters',
                         2: 'Unhandled command', 3: 'Command failed',
                         4: 'Busy', 5: 'Stack already started'}
-        self.status_text = status_codes.get(self.msg['status'], 'Failed with event code: %i' % self.msg['status'])
+        self.status_text = status_codes.get(self.status, 'Failed with event code: %i' % self.status)
 
     def show_log(self):
-        ZGT_LOG.debug('RESPONSE {:04x} : {}'.format(self.id, self.descr))
-        ZGT_LOG.debug('  * Status              : {}'.format(self.status_text))
-        ZGT_LOG.debug('  - Sequence            : {}'.format(self.msg['sequence']))
-        ZGT_LOG.debug('  - Response to command : {}'.format(self.msg['packet_type']))
+        ZGT_LOG.debug('RESPONSE %04x : %s', self.id, self.descr)
+        ZGT_LOG.debug('  * Status              : %s', self.status_text)
+        ZGT_LOG.debug('  - Sequence            : %s', self.msg['sequence'])
+        ZGT_LOG.debug('  - Response to command : %s', self.msg['packet_type'])
         if zgt2int(self.msg['info']) != 0x00:
-            ZGT_LOG.debug('  - Additional msg: ', zgt2int(self.msg['info']))
+            ZGT_LOG.debug('  - Additional msg      : %s', zgt2int(self.msg['info']))
 
 
 @register_response
@@ -81,12 +103,12 @@ class Response_8001(Response):
     struct = OrderedDict([('level', 'int'), ('info', 'rawend')])
 
     def show_log(self):
-        ZGT_LOG.debug('RESPONSE {:04x} : {}'.format(self.id, self.descr))
+        ZGT_LOG.debug('RESPONSE %04x : %s', self.id, self.descr)
         zgt_log_levels = ['Emergency', 'Alert', 'Critical', 'Error',
                               'Warning', 'Notice', 'Information', 'Debug']
 
-        ZGT_LOG.debug('  - Log Level : {}'.format(zgt_log_levels[msg['level']]))
-        ZGT_LOG.debug('  - Log Info  : {}'.format(msg['info']))
+        ZGT_LOG.debug('  - Log Level : %s', zgt_log_levels[self.msg['level']])
+        ZGT_LOG.debug('  - Log Info  : %s', self.msg['info'])
 
 
 @register_response
@@ -115,16 +137,17 @@ class Response_8024(Response):
     struct = OrderedDict([('status', 'int8'), ('addr', 16), ('IEEE', 64), 
                           ('channel', 'int8')])
 
-    def __init__(self, data):
-        super().__init__()
+    def __init__(self, data, lazy=False):
+        super().__init__(data, lazy)
         status_codes = {0: 'Joined existing network', 1: 'Formed new network'}
         self.status_text = status_codes.get(self.msg['status'], 'Failed with event code: %i' % self.msg['status'])
 
     def show_log(self):
-        ZGT_LOG.debug('  * Status       : {}'.format(self.status_text))
-        ZGT_LOG.debug('  - addr         : {}'.format(self.msg['addr']))
-        ZGT_LOG.debug('  - IEEE         : {}'.format(self.msg['IEEE']))
-        ZGT_LOG.debug('  - Channel      : {}'.format(self.msg['channel']))
+        ZGT_LOG.debug('RESPONSE %04x : %s', self.id, self.descr)
+        ZGT_LOG.debug('  * Status       : %s', self.status_text)
+        ZGT_LOG.debug('  - addr         : %s', self.msg['addr'])
+        ZGT_LOG.debug('  - IEEE         : %s', self.msg['IEEE'])
+        ZGT_LOG.debug('  - Channel      : %s', self.msg['channel'])
 
 
 @register_response
@@ -140,13 +163,13 @@ class Response_8045(Response):
         self.external_commands[ZGT_CMD_LIST_ENDPOINTS] = {'addr': msg['addr'].decode(), 'endpoints': ep}
 
     def show_log(self):
-        ZGT_LOG.debug('RESPONSE {:04x} : {}'.format(self.id, self.descr))
-        keys = [k for k in self.struct if key != 'endpoint_list']
+        ZGT_LOG.debug('RESPONSE %04x : %s', self.id, self.descr)
+        keys = [k for k in self.struct if k != 'endpoint_list']
         for key in keys:
-            ZGT_LOG.debug('  - {:<25} : {}'.format(key, self.msg[key]))
+            ZGT_LOG.debug('  - %-25s : %s', key, self.msg[key])
 
-        for i, ep in enumerate(msg['endpoint_list']):
-            ZGT_LOG.debug('    * EndPoint %s : %s' % (i, ep))
+        for i, ep in enumerate(self.msg['endpoint_list']):
+            ZGT_LOG.debug('    * EndPoint %s : %s', i, ep)
 
 
 @register_response
@@ -164,22 +187,32 @@ class Response_8100(Response):
                           ('attribute_data', 'raw'),
                           ('end', 'rawend')])
    
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, lazy=False):
+        super().__init__(data, lazy)
         self.attr_ref = (self.msg['cluster_id'],self.msg['attribute_id'])
-        self.attr_dict = {}
-        if ATTRIBUTES.get(self.attr_ref):
-            self.attr_dict.update(ATTRIBUTES[self.attr_ref](self.msg['attribute_data']))
-        else:
-            ZGT_LOG.error('ATTRIBUTE NOT FOUND : {} / {}'.format(self.msg['cluster_id'],self.msg['attribute_id']))
+        # only needed for logs, device properties are set by interpret_attributes
+        self._attr_dict = None
+
+    @property
+    def attr_dict(self):
+        if self._attr_dict is None:
+            self._attr_dict = self.decode_attribute()
+        return self._attr_dict
+
+    def decode_attribute(self):
+        attr_dict = {}
+        decoder = get_attribute_decoder(*self.attr_ref)
+        if decoder is not None and self.msg['attribute_data']:
+            attr_dict.update(decoder(self.msg['attribute_data']))
+        return attr_dict
          
     def show_log(self):
         super().show_log()
         ZGT_LOG.info('  - ATTTRIBUTES DETAILS')
         cluster_info = CLUSTERS.get(self.msg['cluster_id'], ZGT_CLUSTER_UNKNOWN)
-        ZGT_LOG.info('    * {:<18} : {}'.format('cluster', cluster_info))
+        ZGT_LOG.info('    * %-18s : %s', 'cluster', cluster_info)
         for k, v in self.attr_dict.items():
-            ZGT_LOG.info('    * {:<18} : {}'.format(k, v))
+            ZGT_LOG.info('    * %-18s : %s', k, v)
         ZGT_LOG.info('  - ATTTRIBUTES END')
             
 
@@ -0,0 +1,150 @@
+#! /usr/bin/python3
+import heapq
+import logging
+import threading
+from collections import deque
+from itertools import count
+from time import monotonic
+from .parameters import *
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# 8000 statuses worth sending the command again (Command failed, Busy),
+# Invalid parameters / Unhandled command would fail again
+ZGT_RETRY_STATUS = (3, 4)
+
+
+class OutboundCommand(object):
+    __slots__ = ('cmd', 'frame', 'priority', 'order', 'attempts', 'due', 'token')
+
+    def __init__(self, cmd, frame, priority, order, token=None):
+        self.cmd = cmd
+        self.frame = frame
+        self.priority = priority
+        self.order = order
+        self.token = token  # given by the sender, i.e. the aio Request
+        self.attempts = 0
+        self.due = 0  # when sent (pending) / when to retry (delayed)
+
+
+class Scheduler(object):
+    """
+    Outbound queue between send_data and the transport.
+    Commands are sent by priority (ZGT_PRIORITY_*, then in submission
+    order), at most rate frames/s (token bucket of burst frames, no
+    limit if rate is None) and with at most max_pending commands
+    waiting for their 8000 status, so the ZiGate queue is never flooded.
+    A command answered Busy / Command failed is sent again after
+    backoff, doubled on each attempt, up to max_retries times.
+    The scheduler does not keep time by itself : pump() is called on
+    submission and on every status, and returns the delay after which
+    it must be called again (see ZiGate.schedule_wakeup).
+    Methods can be called from the reader thread and the timer thread.
+    """
+    def __init__(self, rate=10, burst=5, max_pending=2, max_retries=3,
+                 backoff=0.2, status_timeout=2, clock=monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.status_timeout = status_timeout
+        self.clock = clock
+        self._tokens = burst
+        self._refilled = clock()
+        self._order = count()
+        self._ready = []  # heap of (priority, order, command)
+        self._delayed = []  # heap of (due, order, command), waiting for a retry
+        self._pending = {}  # cmd: deque of commands waiting for their status
+        self._pending_count = 0
+        self.retried = 0
+        self.failed = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """commands not sent yet (including the ones waiting for a retry)"""
+        return len(self._ready) + len(self._delayed)
+
+    def submit(self, cmd, frame, priority=ZGT_PRIORITY_NORMAL, token=None):
+        """
+        queue an encoded frame, cmd being the int command type,
+        token is kept with the command (see status_received)
+        """
+        with self._lock:
+            command = OutboundCommand(cmd, frame, priority, next(self._order), token)
+            heapq.heappush(self._ready, (priority, command.order, command))
+        return command
+
+    def status_received(self, status, packet_type):
+        """
+        match a 8000 status with the oldest command of that type sent
+        (the ZiGate answers in transmission order, retries included),
+        returns (command or None if none waits, True if it will be retried)
+        """
+        with self._lock:
+            pending = self._pending.get(packet_type)
+            if not pending:
+                return None, False
+            command = pending.popleft()
+            self._pending_count -= 1
+            if status not in ZGT_RETRY_STATUS:
+                return command, False
+            if command.attempts > self.max_retries:
+                self.failed += 1
+                ZGT_LOG.warning('COMMAND %04x : status %s after %s attempts, dropped',
+                                command.cmd, status, command.attempts)
+                return command, False
+            self.retried += 1
+            command.due = self.clock() + self.backoff * 2 ** (command.attempts - 1)
+            heapq.heappush(self._delayed, (command.due, command.order, command))
+            return command, True
+
+    def pump(self, transmit, now=None):
+        """
+        send what can be sent with transmit(frame), returns the delay
+        (seconds) before the next call is needed, None if nothing waits
+        """
+        with self._lock:
+            now = self.clock() if now is None else now
+            self._expire(now)
+            while self._delayed and self._delayed[0][0] <= now:
+                _due, order, command = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (command.priority, order, command))
+            if self.rate is not None:
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+
+            while self._ready and self._pending_count < self.max_pending:
+                if self.rate is not None:
+                    if self._tokens < 1:
+                        break
+                    self._tokens -= 1
+                _priority, _order, command = heapq.heappop(self._ready)
+                command.attempts += 1
+                command.due = now
+                self._pending.setdefault(command.cmd, deque()).append(command)
+                self._pending_count += 1
+                transmit(command.frame)
+
+            delays = []
+            if self._delayed:
+                delays.append(self._delayed[0][0] - now)
+            if self._ready:
+                if self._pending_count >= self.max_pending:
+                    # until the oldest pending command expires (unless a status comes first)
+                    delays.append(min(pending[0].due for pending in self._pending.values() if pending)
+                                  + self.status_timeout - now)
+                else:
+                    delays.append((1 - self._tokens) / self.rate)
+            return max(0, min(delays)) if delays else None
+
+    def _expire(self, now):
+        """forget the commands whose status never came (the ZiGate may have lost them)"""
+        if not self._pending_count:
+            return
+        limit = now - self.status_timeout
+        for pending in self._pending.values():
+            while pending and pending[0].due <= limit:
+                command = pending.popleft()
+                self._pending_count -= 1
+                ZGT_LOG.warning('COMMAND %04x : no status received', command.cmd)
@@ -0,0 +1,364 @@
+#! /usr/bin/python3
+"""
+ZiGate coordinator simulator, for tests and load tests without hardware.
+
+    python3 -m pyzigate.simulator --devices 1000 --tcp 9999 --pty --storm 500
+
+Serves a pseudo-terminal (its name is logged) and / or a TCP port,
+answers the commands of commands_helpers (0010, 0015, 0045, 0049, 0100)
+with 8000 statuses and 8010 / 8015 / 8045 / 8100 responses from a set of
+virtual Xiaomi-like sensors, and can send report storms (8102) at a
+given rate to every connected client.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tty
+from struct import Struct
+from .conversions import zgt_encode_frame, zgt_decode, zgt_xor
+from .framing import Framer, ZGT_MAX_FRAME_SIZE
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# msg_type, msg_length, checksum
+MSG_HEADER = Struct('!HHB')
+# status, sequence, packet_type
+STATUS = Struct('!BBH')
+# sequence, addr, endpoint, cluster, attribute, status, type, size
+ATTRIBUTE = Struct('!BHBHHBBH')
+# ID, addr, IEEE, power_source, link_quality
+DEVICE_LIST_ENTRY = Struct('!BHQBB')
+# addr mode, addr, src endpoint, dst endpoint, cluster, direction,
+# manufacturer specific, manufacturer id, attribute count
+READ_ATTRIBUTE_REQUEST = Struct('!BHBBHBBHB')
+
+STATUS_SUCCESS = 0
+STATUS_UNHANDLED = 2
+STATUS_BUSY = 4
+ATTRIBUTE_UNSUPPORTED = 0x86
+# entries per 8015 frame, to stay under the Framer max_frame_size with a
+# margin even if every byte is escaped (2 delimiters, header, entries, rssi)
+DEVICE_LIST_MARGIN = 64
+DEVICE_LIST_MAX = (((ZGT_MAX_FRAME_SIZE - DEVICE_LIST_MARGIN - 2) // 2 - MSG_HEADER.size - 1) //
+                   DEVICE_LIST_ENTRY.size)
+RSSI = 0xcf
+
+
+class VirtualDevice(object):
+    """temperature / humidity / pressure sensor with an on/off button"""
+    __slots__ = ('addr', 'ieee', 'temperature', 'humidity', 'pressure', 'state')
+
+    def __init__(self, addr, ieee, rng):
+        self.addr = addr
+        self.ieee = ieee
+        self.temperature = rng.randrange(1500, 2500)
+        self.humidity = rng.randrange(3000, 7000)
+        self.pressure = rng.randrange(980, 1030)
+        self.state = 0
+
+    def attribute(self, cluster, attribute):
+        """(type, data) of an attribute, None if unsupported"""
+        if cluster == 0x0000 and attribute == 0x0005:
+            return 0x42, b'lumi.weather'
+        if cluster == 0x0006 and attribute == 0x0000:
+            return 0x10, bytes([self.state])
+        if cluster == 0x0402 and attribute == 0x0000:
+            return 0x29, self.temperature.to_bytes(2, 'big', signed=True)
+        if cluster == 0x0403 and attribute == 0x0000:
+            return 0x29, self.pressure.to_bytes(2, 'big', signed=True)
+        if cluster == 0x0405 and attribute == 0x0000:
+            return 0x21, self.humidity.to_bytes(2, 'big')
+        return None
+
+    def drift(self, rng):
+        """change the values a bit, returns the (cluster, attribute) to report"""
+        choice = rng.randrange(4)
+        if choice == 0:
+            self.temperature += rng.randrange(-10, 11)
+            return 0x0402, 0x0000
+        if choice == 1:
+            self.humidity = min(10000, max(0, self.humidity + rng.randrange(-50, 51)))
+            return 0x0405, 0x0000
+        if choice == 2:
+            self.pressure += rng.randrange(-1, 2)
+            return 0x0403, 0x0000
+        self.state ^= 1
+        return 0x0006, 0x0000
+
+
+class Coordinator(object):
+    """
+    Protocol side of the simulator, independent of the transport :
+    receive() gets the bytes sent by a client and returns the
+    encoded frames to send back
+    """
+    def __init__(self, devices=10, busy_ratio=0, seed=0):
+        self.rng = random.Random(seed)
+        self.busy_ratio = busy_ratio
+        self.devices = {}
+        while len(self.devices) < devices:
+            addr = self.rng.randrange(0x0001, 0xfff0)
+            if addr not in self.devices:
+                self.devices[addr] = VirtualDevice(addr, 0x00158d0000000000 | self.rng.getrandbits(32), self.rng)
+        self._addrs = list(self.devices)
+        self._sequence = 0
+        self.received = 0
+        self.sent = 0
+
+    def framer(self):
+        """a Framer for the stream of one client"""
+        return Framer()
+
+    def _next_sequence(self):
+        self._sequence = (self._sequence + 1) & 0xff
+        return self._sequence
+
+    def _frame(self, msg_type, payload):
+        self.sent += 1
+        return zgt_encode_frame(msg_type, payload + bytes([RSSI]))
+
+    def receive(self, framer, data):
+        responses = []
+        for frame in framer.feed(data):
+            decoded = zgt_decode(frame)
+            if len(decoded) < 5:
+                continue
+            cmd, length, crc = MSG_HEADER.unpack_from(decoded)
+            payload = decoded[5:]
+            if len(payload) != length or zgt_xor(decoded) ^ crc != crc:
+                ZGT_LOG.warning('SIMULATOR : bad frame %s', decoded.hex())
+                continue
+            self.received += 1
+            responses.extend(self.command(cmd, payload))
+        return responses
+
+    def status(self, cmd, status, sequence=None):
+        sequence = self._next_sequence() if sequence is None else sequence
+        return self._frame(0x8000, STATUS.pack(status, sequence, cmd))
+
+    def command(self, cmd, payload):
+        """encoded frames answering a command"""
+        if self.busy_ratio and self.rng.random() < self.busy_ratio:
+            return [self.status(cmd, STATUS_BUSY)]
+        handler = getattr(self, 'command_{:04x}'.format(cmd), None)
+        if handler is None:
+            return [self.status(cmd, STATUS_UNHANDLED)]
+        sequence = self._next_sequence()
+        return [self.status(cmd, STATUS_SUCCESS, sequence)] + handler(sequence, payload)
+
+    def command_0010(self, sequence, payload):
+        """version"""
+        return [self._frame(0x8010, bytes.fromhex('0003030f'))]
+
+    def command_0015(self, sequence, payload):
+        """device list"""
+        entries = [DEVICE_LIST_ENTRY.pack(i & 0xff, device.addr, device.ieee, 0, self.rng.randrange(100, 255))
+                   for i, device in enumerate(self.devices.values())]
+        return [self._frame(0x8015, b''.join(entries[i:i + DEVICE_LIST_MAX]))
+                for i in range(0, len(entries), DEVICE_LIST_MAX)]
+
+    def command_0045(self, sequence, payload):
+        """active endpoints"""
+        addr = int.from_bytes(payload[:2], 'big')
+        if addr not in self.devices:
+            return [self._frame(0x8045, bytes([sequence, 0x80]) + payload[:2] + b'\x00')]
+        return [self._frame(0x8045, bytes([sequence, 0x00]) + payload[:2] + b'\x01\x01')]
+
+    def command_0049(self, sequence, payload):
+        """permit join"""
+        return []
+
+    def command_0100(self, sequence, payload):
+        """read attribute(s)"""
+        (_mode, addr, _src_endpoint, endpoint, cluster, _direction,
+         _manufacturer_specific, _manufacturer, count) = READ_ATTRIBUTE_REQUEST.unpack_from(payload)
+        device = self.devices.get(addr)
+        if device is None:
+            return []
+        start = READ_ATTRIBUTE_REQUEST.size
+        responses = []
+        for i in range(count):
+            attribute = int.from_bytes(payload[start + 2 * i:start + 2 * i + 2], 'big')
+            value = device.attribute(cluster, attribute)
+            if value is None:
+                data = ATTRIBUTE.pack(sequence, addr, endpoint, cluster, attribute, ATTRIBUTE_UNSUPPORTED, 0, 0)
+            else:
+                data_type, value = value
+                data = ATTRIBUTE.pack(sequence, addr, endpoint, cluster, attribute, 0, data_type,
+                                      len(value)) + value
+            responses.append(self._frame(0x8100, data))
+        return responses
+
+    def report(self):
+        """attribute report (8102) of a random device"""
+        device = self.devices[self.rng.choice(self._addrs)]
+        cluster, attribute = device.drift(self.rng)
+        data_type, value = device.attribute(cluster, attribute)
+        return self._frame(0x8102, ATTRIBUTE.pack(self._next_sequence(), device.addr, 0x01, cluster, attribute,
+                                                  0, data_type, len(value)) + value)
+
+
+class BufferedWriter(object):
+    """
+    writes to a non blocking fd (the pty master) : what the fd does not
+    take at once is kept and written when it is writable again, so frames
+    are never cut. Frames are dropped while max_buffer bytes are waiting
+    (nobody reads the other side).
+    """
+    def __init__(self, loop, fd, max_buffer=1 << 20):
+        self.loop = loop
+        self.fd = fd
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer = bytearray()
+
+    def __call__(self, data):
+        if self._buffer:
+            if len(self._buffer) >= self.max_buffer:
+                if not self.dropped:
+                    ZGT_LOG.warning('SIMULATOR : output buffer full, frames dropped')
+                self.dropped += 1
+                return
+            self._buffer += data
+            return
+        try:
+            written = os.write(self.fd, data)
+        except BlockingIOError:
+            written = 0
+        if written < len(data):
+            self._buffer += data[written:]
+            self.loop.add_writer(self.fd, self._writable)
+
+    def __len__(self):
+        """bytes waiting"""
+        return len(self._buffer)
+
+    def _writable(self):
+        try:
+            written = os.write(self.fd, self._buffer)
+        except BlockingIOError:
+            return
+        del self._buffer[:written]
+        if not self._buffer:
+            self.loop.remove_writer(self.fd)
+
+    def close(self):
+        if self._buffer:
+            self.loop.remove_writer(self.fd)
+            self._buffer.clear()
+
+
+class Simulator(object):
+    """Coordinator served on TCP and / or a pty, on an asyncio loop"""
+    def __init__(self, coordinator, loop=None):
+        self.coordinator = coordinator
+        self.loop = loop or asyncio.get_event_loop()
+        self._clients = {}  # write function: framer
+        self._server = None
+        self._pty = None
+
+    def _client_data(self, write, data):
+        for response in self.coordinator.receive(self._clients[write], data):
+            write(response)
+
+    def broadcast(self, frame):
+        for write in list(self._clients):
+            write(frame)
+
+    async def serve_tcp(self, host='127.0.0.1', port=9999):
+        async def client(reader, writer):
+            write = writer.write
+            self._clients[write] = self.coordinator.framer()
+            ZGT_LOG.info('SIMULATOR : TCP client %s', writer.get_extra_info('peername'))
+            try:
+                while True:
+                    data = await reader.read(4096)
+                    if not data:
+                        break
+                    self._client_data(write, data)
+            finally:
+                del self._clients[write]
+                writer.close()
+        self._server = await asyncio.start_server(client, host, port)
+        return self._server
+
+    def serve_pty(self):
+        """open a pseudo-terminal, returns the name of the device to connect to"""
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        write = BufferedWriter(self.loop, master)
+        self._clients[write] = self.coordinator.framer()
+
+        def readable():
+            try:
+                data = os.read(master, 4096)
+            except BlockingIOError:
+                return
+            self._client_data(write, data)
+        self.loop.add_reader(master, readable)
+        self._pty = (master, slave, write)
+        name = os.ttyname(slave)
+        ZGT_LOG.info('SIMULATOR : pty %s', name)
+        return name
+
+    async def storm(self, rate, duration=None):
+        """send rate reports / s to every client (for duration seconds)"""
+        interval = 1 / rate
+        start = self.loop.time()
+        sent = 0
+        while duration is None or self.loop.time() - start < duration:
+            # catch up by batches rather than sleeping for each report
+            due = int((self.loop.time() - start) * rate) + 1
+            while sent < due:
+                self.broadcast(self.coordinator.report())
+                sent += 1
+            await asyncio.sleep(interval)
+        return sent
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if self._pty is not None:
+            master, slave, write = self._pty
+            self.loop.remove_reader(master)
+            write.close()
+            del self._clients[write]
+            os.close(master)
+            os.close(slave)
+            self._pty = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ZiGate coordinator simulator')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--tcp', type=int, metavar='PORT', help='serve on this TCP port')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--pty', action='store_true', help='serve on a pseudo-terminal')
+    parser.add_argument('--storm', type=float, metavar='RATE', help='attribute reports / s')
+    parser.add_argument('--duration', type=float, help='storm duration (s)')
+    parser.add_argument('--busy', type=float, default=0, help='ratio of commands answered Busy')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    loop = asyncio.get_event_loop()
+    simulator = Simulator(Coordinator(args.devices, args.busy, args.seed), loop)
+    if args.pty:
+        print(simulator.serve_pty(), flush=True)
+    if args.tcp:
+        loop.run_until_complete(simulator.serve_tcp(args.host, args.tcp))
+    if args.storm:
+        loop.create_task(simulator.storm(args.storm, args.duration))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+
+
+if __name__ == '__main__':
+    main()
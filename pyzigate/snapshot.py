@@ -0,0 +1,132 @@
+#! /usr/bin/python3
+import logging
+import os
+import threading
+from struct import Struct
+from .devices import Device
+from .files import write_atomic
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# Length prefixed binary layout, little endian
+# header : magic, version, device count
+# device : flags (1 = IEEE known, 2 = short addr known), IEEE, addr, endpoint count
+# endpoint : id (0xffff for None), property count
+# property : name length + utf-8 name, value tag + value
+# (names over 255 bytes and strings over 65535 bytes are not stored)
+SNAPSHOT_MAGIC = b'ZGTS'
+SNAPSHOT_VERSION = 1
+HEADER = Struct('<4sBI')
+DEVICE = Struct('<BQHH')
+ENDPOINT = Struct('<HH')
+LEN8 = Struct('<B')
+LEN16 = Struct('<H')
+INT = Struct('<q')
+FLOAT = Struct('<d')
+
+TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR = range(6)
+NO_ENDPOINT = 0xffff
+
+
+def _pack_value(value):
+    if value is None:
+        return bytes([TAG_NONE])
+    if value is True or value is False:
+        return bytes([TAG_TRUE if value else TAG_FALSE])
+    if type(value) == int and -2 ** 63 <= value < 2 ** 63:
+        return bytes([TAG_INT]) + INT.pack(value)
+    if type(value) == float:
+        return bytes([TAG_FLOAT]) + FLOAT.pack(value)
+    if type(value) == str:
+        data = value.encode()
+        if len(data) > 0xffff:
+            return None
+        return bytes([TAG_STR]) + LEN16.pack(len(data)) + data
+    return None
+
+
+def dump_registry(registry):
+    """serialize the devices and properties of a DeviceRegistry to bytes"""
+    chunks = []
+    # copied under the registry lock, the reader thread may update it
+    devices = registry.state()
+    for ieee, addr, endpoints in devices:
+        flags = (1 if ieee is not None else 0) | (2 if addr is not None else 0)
+        chunks.append(DEVICE.pack(flags, ieee or 0, addr or 0, len(endpoints)))
+        for endpoint, properties in endpoints:
+            props = []
+            for property_id, value in properties.items():
+                name = str(property_id).encode()
+                if len(name) > 0xff:
+                    ZGT_LOG.warning('SNAPSHOT : %.32s... not stored (name too long)', property_id)
+                    continue
+                packed = _pack_value(value)
+                if packed is None:
+                    if type(value) == str:
+                        ZGT_LOG.warning('SNAPSHOT : %s not stored (%s bytes value)', property_id, len(value.encode()))
+                    else:
+                        ZGT_LOG.debug('SNAPSHOT : %s not stored (%s)', property_id, type(value).__name__)
+                    continue
+                props.append(LEN8.pack(len(name)) + name + packed)
+            chunks.append(ENDPOINT.pack(NO_ENDPOINT if endpoint is None else endpoint, len(props)))
+            chunks.extend(props)
+    return HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(devices)) + b''.join(chunks)
+
+
+def load_registry(registry, data):
+    """fill a DeviceRegistry from dump_registry output, returns the devices count"""
+    view = memoryview(data)
+    magic, version, count = HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError('not a ZiGate snapshot (version {})'.format(SNAPSHOT_VERSION))
+    offset = HEADER.size
+    for _ in range(count):
+        flags, ieee, addr, endpoints = DEVICE.unpack_from(view, offset)
+        offset += DEVICE.size
+        device = Device(ieee if flags & 1 else None, addr if flags & 2 else None)
+        for _ in range(endpoints):
+            endpoint, props = ENDPOINT.unpack_from(view, offset)
+            offset += ENDPOINT.size
+            ep = device.endpoint(None if endpoint == NO_ENDPOINT else endpoint)
+            for _ in range(props):
+                length = view[offset]
+                name = bytes(view[offset + 1:offset + 1 + length]).decode()
+                offset += 1 + length
+                tag = view[offset]
+                offset += 1
+                if tag == TAG_INT:
+                    value = INT.unpack_from(view, offset)[0]
+                    offset += INT.size
+                elif tag == TAG_FLOAT:
+                    value = FLOAT.unpack_from(view, offset)[0]
+                    offset += FLOAT.size
+                elif tag == TAG_STR:
+                    length = LEN16.unpack_from(view, offset)[0]
+                    offset += LEN16.size
+                    value = bytes(view[offset:offset + length]).decode()
+                    offset += length
+                else:
+                    value = {TAG_NONE: None, TAG_FALSE: False, TAG_TRUE: True}[tag]
+                ep.set(name, value)
+        registry.restore(device)
+    return count
+
+
+def save_snapshot(registry, path, background=True):
+    """
+    Save the registry to path. The state is serialized right away,
+    the write is done in a thread if background is True (returned)
+    """
+    data = dump_registry(registry)
+    if not background:
+        write_atomic(path, data)
+        return None
+    thread = threading.Thread(target=write_atomic, args=(path, data), daemon=True)
+    thread.start()
+    return thread
+
+
+def load_snapshot(registry, path):
+    """Restore the registry from path, returns the devices count"""
+    with open(path, 'rb') as f:
+        return load_registry(registry, f.read())
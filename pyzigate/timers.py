@@ -0,0 +1,72 @@
+#! /usr/bin/python3
+import heapq
+import logging
+import threading
+from itertools import count
+from time import monotonic
+
+ZGT_LOG = logging.getLogger('zigate')
+
+
+class TimerHandle(object):
+    __slots__ = ('when', 'callback', 'cancelled')
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerThread(object):
+    """
+    Callbacks run after a delay by a single daemon thread (started on
+    first use), instead of one threading.Timer thread per call
+    """
+    def __init__(self, name='zigate-timers', clock=monotonic):
+        self.name = name
+        self.clock = clock
+        self._heap = []  # (when, order, handle)
+        self._order = count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def call_later(self, delay, callback):
+        """run callback in delay seconds, returns a handle with a cancel() method"""
+        handle = TimerHandle(self.clock() + delay, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (handle.when, next(self._order), handle))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def _next(self):
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                when, _order, handle = self._heap[0]
+                if handle.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = when - self.clock()
+                if delay <= 0:
+                    heapq.heappop(self._heap)
+                    return handle
+                self._condition.wait(delay)
+
+    def _run(self):
+        while True:
+            handle = self._next()
+            try:
+                handle.callback()
+            except Exception:
+                ZGT_LOG.exception('TIMER : error in %r', handle.callback)
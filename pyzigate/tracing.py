@@ -0,0 +1,85 @@
+#! /usr/bin/python3
+import logging
+from binascii import hexlify
+from struct import Struct
+from time import strftime, monotonic_ns
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# binary trace directions
+ZGT_TRACE_IN = 0
+ZGT_TRACE_OUT = 1
+# monotonic timestamp (ns), direction, frame length, followed by the frame
+ZGT_TRACE_RECORD = Struct('<QBI')
+
+
+class Hex(object):
+    """hexlify, only done if the log record is emitted"""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return hexlify(self.data).decode()
+
+
+class SpacedHex(Hex):
+    """'01 80 00 ...' form of the data, only done if the log record is emitted"""
+    __slots__ = ()
+
+    def __str__(self):
+        return hexlify(self.data, ' ').decode().upper()
+
+
+class Timestamp(object):
+    """current time, only formatted if the log record is emitted"""
+    __slots__ = ()
+
+    def __str__(self):
+        return strftime('%H:%M:%S')
+
+
+TIMESTAMP = Timestamp()
+
+
+class Tracer(object):
+    """
+    Log levels enabled on a logger, as plain booleans refreshed once
+    per received chunk / sent frame : when a level is disabled the hot
+    paths only test a flag, no string is ever built.
+    binary can be set to a BinaryTrace to record every raw frame.
+    """
+    def __init__(self, logger=ZGT_LOG):
+        self.logger = logger
+        self.binary = None
+        self.refresh()
+
+    def refresh(self):
+        self.debug = self.logger.isEnabledFor(logging.DEBUG)
+        self.info = self.logger.isEnabledFor(logging.INFO)
+        return self
+
+
+class BinaryTrace(object):
+    """
+    Structured trace of raw (encoded, undelimited) frames to a binary file
+    object, each record being ZGT_TRACE_RECORD followed by the frame
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def write(self, direction, frame):
+        self.fileobj.write(ZGT_TRACE_RECORD.pack(monotonic_ns(), direction, len(frame)))
+        self.fileobj.write(frame)
+
+
+def read_binary_trace(fileobj):
+    """iterate over the (timestamp, direction, frame) records of a BinaryTrace"""
+    header_size = ZGT_TRACE_RECORD.size
+    while True:
+        header = fileobj.read(header_size)
+        if len(header) < header_size:
+            return
+        timestamp, direction, length = ZGT_TRACE_RECORD.unpack(header)
+        yield timestamp, direction, fileobj.read(length)
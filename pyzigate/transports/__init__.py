@@ -0,0 +1,3 @@
+#! /usr/bin/python3
+# Transports connecting a ZiGate instance to the stick
+# (set zigate.send_to_transport, feed zigate.read_data)
@@ -0,0 +1,182 @@
+#! /usr/bin/python3
+import asyncio
+import logging
+from collections import deque
+
+ZGT_LOG = logging.getLogger('zigate')
+
+
+class ZiGateProtocol(asyncio.Protocol):
+    """asyncio protocol forwarding everything to its AsyncTransport"""
+    def __init__(self, owner):
+        super().__init__()
+        self.owner = owner
+
+    def connection_made(self, transport):
+        self.owner._connection_made(transport)
+
+    def data_received(self, data):
+        try:
+            self.owner.zigate.read_data(data)
+        except Exception:
+            # a decoding error must not close the connection
+            ZGT_LOG.exception('TRANSPORT : error in read_data')
+
+    def connection_lost(self, exc):
+        self.owner._connection_lost(exc)
+
+    def pause_writing(self):
+        self.owner._writable = False
+
+    def resume_writing(self):
+        self.owner._writable = True
+        self.owner._flush()
+
+
+class AsyncTransport(object):
+    """
+    asyncio connection to a serial (pyserial-asyncio) or WiFi (TCP) ZiGate,
+    reconnected with an exponential backoff (backoff .. max_backoff s)
+    when lost or not reachable. The backoff starts over only once a
+    connection stayed up min_uptime s (a peer closing at once is retried
+    more and more slowly).
+    Frames sent while disconnected, or while the transport buffer is
+    above its high water mark (pause_writing), are kept in order in a
+    queue (at most max_queue, oldest dropped) and written once possible.
+    The partial frame in the ZiGate input is dropped on reconnection.
+
+        transport = AsyncTransport(zigate, host='192.168.1.10')  # or serial_port='/dev/ttyUSB0'
+        await transport.connect()  # or transport.start()
+    """
+    def __init__(self, zigate, loop=None, host=None, port=9999, serial_port=None, baudrate=115200,
+                 backoff=0.5, max_backoff=30, min_uptime=5, connect_timeout=10, max_queue=1000,
+                 high_water=None, low_water=None):
+        if (host is None) == (serial_port is None):
+            raise ValueError('one of host or serial_port is needed')
+        self.zigate = zigate
+        self.loop = loop or asyncio.get_event_loop()
+        self.host = host
+        self.port = port
+        self.serial_port = serial_port
+        self.baudrate = baudrate
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.min_uptime = min_uptime
+        self.connect_timeout = connect_timeout
+        self.high_water = high_water
+        self.low_water = low_water
+        self.transport = None
+        self.connections = 0
+        self.dropped = 0
+        self._queue = deque(maxlen=max_queue)
+        self._writable = False
+        self._closing = False
+        self._task = None
+        self._lost = None
+        self._connected = asyncio.Event()
+        zigate.send_to_transport = self.send
+
+    @property
+    def connected(self):
+        return self.transport is not None
+
+    def start(self):
+        """keep connected from a task (returned)"""
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+        return self._task
+
+    async def connect(self):
+        """
+        start() and wait for the first connection, raises what stopped
+        the task (other than a connection error, i.e. serial_asyncio missing)
+        """
+        task = self.start()
+        connected = self.loop.create_task(self._connected.wait())
+        try:
+            await asyncio.wait((connected, task), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            connected.cancel()
+        if task.done() and not self._connected.is_set():
+            if self._task is task:
+                self._task = None
+            task.result()
+
+    async def _open(self):
+        protocol_factory = lambda: ZiGateProtocol(self)
+        if self.host is not None:
+            return await self.loop.create_connection(protocol_factory, self.host, self.port)
+        import serial_asyncio
+        return await serial_asyncio.create_serial_connection(self.loop, protocol_factory, self.serial_port,
+                                                             baudrate=self.baudrate)
+
+    async def _run(self):
+        delay = self.backoff
+        while not self._closing:
+            self._lost = self.loop.create_future()
+            try:
+                await asyncio.wait_for(self._open(), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                ZGT_LOG.warning('TRANSPORT : connection failed (%s), retry in %.1fs', e, delay)
+            else:
+                connected = self.loop.time()
+                # until the connection is lost
+                await self._lost
+                if self.loop.time() - connected >= self.min_uptime:
+                    delay = self.backoff
+                ZGT_LOG.info('TRANSPORT : reconnection in %.1fs', delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def _connection_made(self, transport):
+        self.transport = transport
+        self.connections += 1
+        if self.high_water is not None:
+            transport.set_write_buffer_limits(self.high_water, self.low_water)
+        # partial frame from the previous connection
+        self.zigate.reset_input()
+        self._writable = True
+        ZGT_LOG.info('TRANSPORT : connected (%s)', self.host or self.serial_port)
+        self._connected.set()
+        self._flush()
+
+    def _connection_lost(self, exc):
+        ZGT_LOG.warning('TRANSPORT : connection lost (%s)', exc)
+        self.transport = None
+        self._writable = False
+        self._connected.clear()
+        if self._lost is not None and not self._lost.done():
+            self._lost.set_result(exc)
+
+    def send(self, data):
+        """zigate.send_to_transport, callable from any thread"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._send(data)
+        else:
+            self.loop.call_soon_threadsafe(self._send, data)
+
+    def _send(self, data):
+        if self._writable and not self._queue:
+            self.transport.write(data)
+            return
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+            ZGT_LOG.warning('TRANSPORT : send queue full, oldest frame dropped')
+        self._queue.append(data)
+        self._flush()
+
+    def _flush(self):
+        while self._queue and self._writable:
+            self.transport.write(self._queue.popleft())
+
+    def close(self):
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.transport is not None:
+            self.transport.close()
@@ -0,0 +1,88 @@
+#! /usr/bin/python3
+import logging
+import queue
+import threading
+
+ZGT_LOG = logging.getLogger('zigate')
+
+
+class ThreadedSerialTransport(object):
+    """
+    Serial connection served by two threads :
+    - reader : blocking read of the first byte (with timeout, so it sleeps
+      while the line is idle), then of what is already buffered (up to
+      read_size), passed to zigate.read_data
+    - writer : frames sent by zigate, from a queue (send is thread safe)
+    close() stops both threads and the serial port, join() waits for it
+    (both are daemon threads, a program only using them must join).
+    serial_instance can be given instead of port (any pyserial like object)
+    """
+    def __init__(self, zigate, port='/dev/ttyUSB0', baudrate=115200, read_size=4096,
+                 timeout=0.5, serial_instance=None):
+        if serial_instance is None:
+            import serial
+            serial_instance = serial.Serial(port, baudrate, timeout=timeout)
+        self.zigate = zigate
+        self.cnx = serial_instance
+        self.read_size = read_size
+        self._writes = queue.Queue()
+        self._stopped = threading.Event()
+        zigate.send_to_transport = self.send
+        self._reader = threading.Thread(target=self._read, name='zigate-reader', daemon=True)
+        self._writer = threading.Thread(target=self._write, name='zigate-writer', daemon=True)
+        self._reader.start()
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, data):
+        self._writes.put(data)
+
+    def _read(self):
+        cnx = self.cnx
+        while not self._stopped.is_set():
+            try:
+                data = cnx.read(1)
+                if not data:
+                    continue
+                waiting = cnx.in_waiting
+                if waiting:
+                    data += cnx.read(min(waiting, self.read_size))
+            except Exception:
+                if not self._stopped.is_set():
+                    ZGT_LOG.exception('SERIAL : read error')
+                    self._stopped.set()
+                    self._writes.put(None)
+                return
+            try:
+                self.zigate.read_data(data)
+            except Exception:
+                # never let a decoding error stop the reader
+                ZGT_LOG.exception('SERIAL : error in read_data')
+
+    def _write(self):
+        while True:
+            data = self._writes.get()
+            if data is None:
+                return
+            try:
+                self.cnx.write(data)
+            except Exception:
+                ZGT_LOG.exception('SERIAL : write error')
+
+    def join(self, timeout=None):
+        """wait until closed or stopped by a read error, False on timeout"""
+        self._reader.join(timeout)
+        return not self._reader.is_alive()
+
+    def close(self, timeout=2):
+        """stop the threads (pending writes are sent first) and close the port"""
+        self._stopped.set()
+        self._writes.put(None)
+        self._writer.join(timeout)
+        self._reader.join(timeout)
+        self.cnx.close()
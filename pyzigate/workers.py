@@ -0,0 +1,365 @@
+#! /usr/bin/python3
+"""
+Process per coordinator : the receive pipeline (read_data, interpret_response,
+attribute decoding) of each ZiGate runs in its own worker process, the
+decoded events come back through a shared memory ring of fixed size
+records (no pickling per event), to a ZiGate like facade in the parent.
+
+    coordinators = ProcessCoordinators()
+    coordinators.add('kitchen', tcp=('192.168.1.10', 9999))
+    coordinators.add('garage', serial='/dev/ttyUSB0')
+    coordinators.events.subscribe(callback, cluster=0x0402)
+    coordinators.start()
+    ... coordinators.poll() in a loop, or await coordinators.serve()
+    coordinators.call(ieee, 'read_attributes', 0x01, 0x0402, [0x0000])
+"""
+import asyncio
+import logging
+import multiprocessing
+import socket
+import threading
+from multiprocessing import shared_memory
+from struct import Struct
+from time import time
+from .devices import DeviceRegistry, PROPERTIES, PROPERTY_SLOTS, DEVICE_ANNOUNCE, DEVICE_LIST_ENTRY
+from .events import Event, EventBus
+
+ZGT_LOG = logging.getLogger('zigate')
+
+# written count, read count, dropped count (ring full), capacity,
+# truncated count (text value or property name cut to fit a record)
+RING_HEADER = Struct('<QQQQQ')
+# timestamp, msg_type, ieee (0 : unknown), addr, endpoint (0xff : none),
+# cluster, attribute, property slot (see devices.PROPERTIES, 0xff : none),
+# value kind, numeric value, text value, property name (without slot)
+TEXT_SIZE = 32
+NAME_SIZE = 24
+RECORD = Struct('<dHQHBHHBBd{}s{}s'.format(TEXT_SIZE, NAME_SIZE))
+COUNTER = Struct('<Q')
+NO_ID = 0xff
+VALUE_NONE, VALUE_INT, VALUE_FLOAT, VALUE_BOOL, VALUE_STR = range(5)
+
+
+class EventRing(object):
+    """
+    Single producer / single consumer ring of RECORDs in shared memory.
+    Only the producer writes the written count and the records, only the
+    consumer writes the read count : no lock is needed. When the ring is
+    full new records are dropped (and counted), never blocking the producer.
+    """
+    def __init__(self, capacity=8192, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=RING_HEADER.size + capacity * RECORD.size)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, 0, 0, capacity, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.capacity = RING_HEADER.unpack_from(self.shm.buf)[3]
+
+    def put(self, *fields):
+        buf = self.shm.buf
+        written, read, dropped, capacity, _truncated = RING_HEADER.unpack_from(buf)
+        if written - read >= capacity:
+            COUNTER.pack_into(buf, 16, dropped + 1)
+            return False
+        RECORD.pack_into(buf, RING_HEADER.size + (written % capacity) * RECORD.size, *fields)
+        # publish the record once written
+        COUNTER.pack_into(buf, 0, written + 1)
+        return True
+
+    def get(self, limit=None):
+        """the records available (up to limit), oldest first"""
+        buf = self.shm.buf
+        written, read, _dropped, capacity, _truncated = RING_HEADER.unpack_from(buf)
+        end = written if limit is None else min(written, read + limit)
+        records = [RECORD.unpack_from(buf, RING_HEADER.size + (index % capacity) * RECORD.size)
+                   for index in range(read, end)]
+        COUNTER.pack_into(buf, 8, end)
+        return records
+
+    def count_truncated(self):
+        """count a record whose text value or property name was cut (producer side)"""
+        COUNTER.pack_into(self.shm.buf, 32, RING_HEADER.unpack_from(self.shm.buf)[4] + 1)
+
+    @property
+    def dropped(self):
+        return RING_HEADER.unpack_from(self.shm.buf)[2]
+
+    @property
+    def truncated(self):
+        return RING_HEADER.unpack_from(self.shm.buf)[4]
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _value_fields(value):
+    if value is None:
+        return VALUE_NONE, 0, b''
+    if value is True or value is False:
+        return VALUE_BOOL, float(value), b''
+    if type(value) == int:
+        return VALUE_INT, float(value), b''
+    if type(value) == float:
+        return VALUE_FLOAT, value, b''
+    return VALUE_STR, 0, str(value).encode()
+
+
+def _truncate(data, size):
+    """utf-8 data cut to size bytes, on a character boundary"""
+    if len(data) <= size:
+        return data
+    while size and data[size] & 0xc0 == 0x80:
+        size -= 1
+    return data[:size]
+
+
+def _record_value(kind, number, text):
+    if kind == VALUE_INT:
+        return int(number)
+    if kind == VALUE_FLOAT:
+        return number
+    if kind == VALUE_BOOL:
+        return bool(number)
+    if kind == VALUE_STR:
+        return text.rstrip(b'\x00').decode(errors='replace')
+    return None
+
+
+def _worker(name, ring_name, commands, tcp, serial, lazy_responses, retry_delay):
+    """
+    worker process : transport + ZiGate, events written to the ring,
+    (re)connecting every retry_delay s until stopped
+    """
+    from .interface import ZiGate
+
+    ring = EventRing(name=ring_name)
+    zigate = ZiGate(lazy_responses=lazy_responses)
+    zigate.name = name
+
+    def attribute_event(event):
+        property_slot = PROPERTY_SLOTS.get(event.property_id, NO_ID)
+        property_name = b''
+        if property_slot == NO_ID and event.property_id is not None:
+            property_name = event.property_id.encode()
+        kind, number, text = _value_fields(event.value)
+        if len(text) > TEXT_SIZE or len(property_name) > NAME_SIZE:
+            ZGT_LOG.debug('WORKER %s : %s truncated', name, event.property_id)
+            ring.count_truncated()
+            text = _truncate(text, TEXT_SIZE)
+            property_name = _truncate(property_name, NAME_SIZE)
+        ring.put(time(), event.msg_type, event.ieee or 0, event.addr,
+                 NO_ID if event.endpoint is None else event.endpoint,
+                 event.cluster, event.attribute, property_slot, kind, number, text, property_name)
+
+    def announce(addr, ieee):
+        ring.put(time(), 0x004d, ieee, addr, NO_ID, 0, 0, NO_ID, VALUE_NONE, 0, b'', b'')
+
+    def announce_event(event):
+        announce(*DEVICE_ANNOUNCE.unpack_from(event.response.msg_data))
+
+    def device_list_event(event):
+        # forwarded as announces
+        msg_data = event.response.msg_data
+        end = len(msg_data) - len(msg_data) % DEVICE_LIST_ENTRY.size
+        for _id, addr, ieee, _power, _link in DEVICE_LIST_ENTRY.iter_unpack(msg_data[:end]):
+            announce(addr, ieee)
+
+    for msg_type in (0x8100, 0x8102, 0x8110):
+        zigate.events.subscribe(attribute_event, msg_type=msg_type)
+    zigate.events.subscribe(announce_event, msg_type=0x004d)
+    zigate.events.subscribe(device_list_event, msg_type=0x8015)
+
+    def connect():
+        """connection, its send and read functions"""
+        if tcp is not None:
+            connection = socket.create_connection(tcp)
+            return connection, connection.sendall, lambda: connection.recv(4096)
+        import serial as pyserial
+        connection = pyserial.Serial(serial, 115200, timeout=1)
+        return connection, connection.write, lambda: connection.read(max(1, connection.in_waiting))
+
+    stopping = threading.Event()
+    connected = threading.Event()
+    current = [None]  # connection in use
+
+    def send_commands():
+        # (cmd, payload, priority) or (method, args, kwargs) from the parent, None to stop,
+        # commands waiting for the (re)connection
+        while True:
+            command = commands.recv()
+            if command is None:
+                stopping.set()
+                connection = current[0]
+                if connection is not None:
+                    if tcp is not None:
+                        # wakes up the blocking recv
+                        try:
+                            connection.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+                    connection.close()
+                return
+            connected.wait()
+            try:
+                if type(command[0]) == str:
+                    method, args, kwargs = command
+                    getattr(zigate, method)(*args, **kwargs)
+                else:
+                    zigate.send_command(*command)
+            except Exception:
+                ZGT_LOG.exception('WORKER %s : error in %s', name, command[0])
+    threading.Thread(target=send_commands, daemon=True).start()
+
+    try:
+        while not stopping.is_set():
+            try:
+                connection, zigate.send_to_transport, read = connect()
+            except OSError as e:
+                ZGT_LOG.error('WORKER %s : connection failed (%s), retry in %ss', name, e, retry_delay)
+                stopping.wait(retry_delay)
+                continue
+            current[0] = connection
+            connected.set()
+            try:
+                while not stopping.is_set():
+                    data = read()
+                    if tcp is not None and not data:
+                        break
+                    if data:
+                        zigate.read_data(data)
+            except OSError as e:
+                if not stopping.is_set():
+                    ZGT_LOG.error('WORKER %s : connection error (%s)', name, e)
+            finally:
+                connected.clear()
+                current[0] = None
+                connection.close()
+            if not stopping.is_set():
+                ZGT_LOG.warning('WORKER %s : connection lost, reconnecting in %ss', name, retry_delay)
+                stopping.wait(retry_delay)
+    finally:
+        ring.close()
+
+
+class WorkerCoordinator(object):
+    """parent side of a worker : its process, ring and command pipe"""
+    def __init__(self, name, tcp=None, serial=None, capacity=8192, lazy_responses=False, retry_delay=5):
+        if (tcp is None) == (serial is None):
+            raise ValueError('one of tcp (host, port) or serial (port) is needed')
+        self.name = name
+        self.ring = EventRing(capacity)
+        self.devices = DeviceRegistry()
+        self._commands, worker_commands = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker, name='zigate-{}'.format(name), daemon=True,
+            args=(name, self.ring.name, worker_commands, tcp, serial, lazy_responses, retry_delay))
+
+    def send_command(self, cmd, payload=b'', priority=None):
+        self._commands.send((cmd, payload) if priority is None else (cmd, payload, priority))
+
+    def send_data(self, cmd, data=''):
+        self.send_command(int(cmd, 16), bytes.fromhex(data))
+
+    def call(self, method, *args, **kwargs):
+        """call a ZiGate method in the worker (its result is not returned)"""
+        self._commands.send((method, args, kwargs))
+
+    def stop(self):
+        try:
+            self._commands.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close(unlink=True)
+
+
+class ProcessCoordinators(object):
+    """
+    ZiGate like facade of the worker processes : one EventBus (Event.source
+    being the coordinator name, Event.response None), a DeviceRegistry
+    per coordinator (fed with the decoded properties) and command routing
+    by device (call). Property names without a devices.PROPERTIES slot are
+    carried in the records, up to 24 bytes (text values up to 32 bytes),
+    longer ones are cut and counted (metrics truncated_events).
+    """
+    def __init__(self):
+        self.events = EventBus()
+        self.coordinators = {}
+
+    def add(self, name, tcp=None, serial=None, capacity=8192, lazy_responses=False, retry_delay=5):
+        coordinator = self.coordinators[name] = WorkerCoordinator(name, tcp, serial, capacity,
+                                                                  lazy_responses, retry_delay)
+        return coordinator
+
+    def start(self):
+        for coordinator in self.coordinators.values():
+            coordinator.process.start()
+
+    def stop(self):
+        for coordinator in self.coordinators.values():
+            coordinator.stop()
+
+    def poll(self, limit=None):
+        """read the ring of every worker, returns the number of events"""
+        count = 0
+        for coordinator in self.coordinators.values():
+            devices = coordinator.devices
+            for (timestamp, msg_type, ieee, addr, endpoint, cluster, attribute,
+                 property_slot, kind, number, text, property_name) in coordinator.ring.get(limit):
+                count += 1
+                if msg_type == 0x004d:
+                    devices.announce(addr, ieee)
+                    continue
+                endpoint = None if endpoint == NO_ID else endpoint
+                if property_slot != NO_ID:
+                    property_id = PROPERTIES[property_slot]
+                else:
+                    property_id = property_name.rstrip(b'\x00').decode(errors='replace') or None
+                value = _record_value(kind, number, text)
+                if property_id is not None:
+                    devices.set_property(addr, endpoint, property_id, value)
+                if self.events:
+                    self.events.publish(Event(msg_type, None, ieee or None, addr, endpoint, cluster,
+                                              attribute, property_id, value, coordinator.name))
+        return count
+
+    async def serve(self, interval=0.01):
+        """poll forever from an asyncio loop"""
+        while True:
+            if not self.poll():
+                await asyncio.sleep(interval)
+            else:
+                await asyncio.sleep(0)
+
+    def device(self, ieee):
+        """(coordinator, Device) for an IEEE address, (None, None) if unknown"""
+        for coordinator in self.coordinators.values():
+            device = coordinator.devices.get_by_ieee(ieee)
+            if device is not None and device.addr is not None:
+                return coordinator, device
+        return None, None
+
+    def call(self, ieee, method, *args, **kwargs):
+        """
+        call a ZiGate method taking a short address as first argument
+        (read_attribute, read_attributes ...) in the worker of a device,
+        the answers come back as events
+
+            coordinators.call(0x00158d0001d6db5a, 'read_attributes', 0x01, 0x0402, [0x0000])
+        """
+        coordinator, device = self.device(ieee)
+        if coordinator is None:
+            raise KeyError('unknown device {:016x}'.format(ieee))
+        coordinator.call(method, device.addr, *args, **kwargs)
+
+    def metrics(self):
+        return {name: {'alive': coordinator.process.is_alive(),
+                       'dropped_events': coordinator.ring.dropped,
+                       'truncated_events': coordinator.ring.truncated,
+                       'devices': len(coordinator.devices)}
+                for name, coordinator in self.coordinators.items()}
@@ -2,7 +2,8 @@ from distutils.core import setup
 
 setup(
     name='pyzigate',
-    packages=['pyzigate'],
+    packages=['pyzigate', 'pyzigate.transports'],
+    package_data={'pyzigate': ['*.json']},
     version='0.1.3.post1',
     description='Interface library for ZiGate (http://zigate./fr)',
     author='Frédéric HARS & Vesa YLIKYLÄ',
@@ -16,5 +17,5 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
-    python_requires='>=3',
+    python_requires='>=3.8',
 )
@@ -0,0 +1,14 @@
+"""frames as sent by the ZiGate, for the tests"""
+# frame builders shared with the benchmark corpora
+from benchmarks.corpora import frame, attribute_report, XIAOMI_HEARTBEAT
+
+
+TEMPERATURE = attribute_report(0x9824, 1, 0x0402, 0x0000, 0x29, bytes.fromhex('0812'))
+HUMIDITY = attribute_report(0x9824, 1, 0x0405, 0x0000, 0x21, bytes.fromhex('179a'))
+BUTTON = attribute_report(0x9824, 1, 0x0006, 0x0000, 0x10, b'\x00')
+DEVICE_TYPE = attribute_report(0x9824, 1, 0x0000, 0x0005, 0x42, b'lumi.weather')
+HEARTBEAT = attribute_report(0x9824, 1, 0x0000, 0xff01, 0x42, XIAOMI_HEARTBEAT)
+ANNOUNCE = frame(0x004d, bytes.fromhex('2400158d0001d6db5a80'), 0xd8)
+STATUS = frame(0x8000, bytes.fromhex('005e0049'), 0)
+DEVICE_LIST = frame(0x8015, bytes.fromhex('019824158d0001d6db5a8001ff02abcd158d00010000000100aa'), 0)
+ALL = (TEMPERATURE, HUMIDITY, BUTTON, DEVICE_TYPE, HEARTBEAT, ANNOUNCE, STATUS, DEVICE_LIST)
@@ -0,0 +1,51 @@
+import asyncio
+
+from pyzigate.aio import AsyncZiGate
+from pyzigate.commands import read_attribute_request, ZGT_READ_ATTRIBUTE
+from pyzigate.scheduler import Scheduler
+from pyzigate.simulator import Coordinator
+
+
+def loopback(zigate, coordinator):
+    """zigate connected to a simulated coordinator, answers on the next loop iteration"""
+    framer = coordinator.framer()
+
+    def answer(data):
+        responses = coordinator.receive(framer, data)
+        if responses:
+            zigate.read_data(b''.join(responses))
+    zigate.send_to_transport = lambda data: zigate.loop.call_soon(answer, data)
+
+
+async def read_temperatures(scheduler, busy_ratio):
+    coordinator = Coordinator(devices=40, busy_ratio=busy_ratio, seed=1)
+    zigate = AsyncZiGate(loop=asyncio.get_running_loop(), max_in_flight=40, scheduler=scheduler)
+    loopback(zigate, coordinator)
+
+    async def read(addr):
+        status, response = await zigate.request(ZGT_READ_ATTRIBUTE, read_attribute_request(addr, 1, 0x0402, [0]),
+                                                response_type=0x8100)
+        return addr, status.status, response
+    return await asyncio.gather(*[read(addr) for addr in coordinator.devices])
+
+
+def check_results(results):
+    for addr, status, response in results:
+        if status == 0:
+            assert response.msg['short_addr'] == '{:04x}'.format(addr).encode()
+        else:
+            assert response is None
+
+
+def test_pipelined_requests():
+    results = asyncio.run(read_temperatures(None, 0.3))
+    check_results(results)
+    assert any(status == 4 for _addr, status, _response in results)
+
+
+def test_pipelined_requests_with_retries():
+    scheduler = Scheduler(rate=None, max_pending=4, backoff=0.001, max_retries=10)
+    results = asyncio.run(read_temperatures(scheduler, 0.3))
+    check_results(results)
+    assert scheduler.retried
+    assert all(status == 0 for _addr, status, _response in results)
@@ -0,0 +1,74 @@
+from pyzigate.attributes import get_attribute_decoder, parse_xiaomi_tlv, decode_xiaomi_info
+from pyzigate.interface import ZiGate
+from pyzigate.parameters import (ZGT_TEMPERATURE, ZGT_HUMIDITY, ZGT_PRESSURE, ZGT_TYPE, ZGT_STATE, ZGT_STATE_ON,
+                                 ZGT_RSSI, ZGT_XIAOMI_BATTERY)
+from samples import attribute_report, TEMPERATURE, HUMIDITY, BUTTON, DEVICE_TYPE, HEARTBEAT, XIAOMI_HEARTBEAT
+
+
+def new_zigate():
+    zigate = ZiGate()
+    zigate.send_to_transport = lambda data: None
+    return zigate
+
+
+def test_decoder_lookup():
+    assert get_attribute_decoder(0x0402, 0x0000) is not None
+    # whole cluster fallback
+    assert get_attribute_decoder(0x0402, 0x0001) is get_attribute_decoder(0x0402, 0x0000)
+    assert get_attribute_decoder(0x0405, 0x0002) is get_attribute_decoder(0x0405, 0x0000)
+    assert get_attribute_decoder(0xfffe, 0x0000) is None
+
+
+def test_reports_set_properties():
+    zigate = new_zigate()
+    zigate.read_data(TEMPERATURE + HUMIDITY + BUTTON + DEVICE_TYPE)
+    properties = zigate.devices.properties()[(0x9824, 1)]
+    assert properties[ZGT_TEMPERATURE] == 20.66
+    assert properties[ZGT_HUMIDITY] == 60.42
+    assert properties[ZGT_STATE] == ZGT_STATE_ON
+    assert properties[ZGT_TYPE] == 'lumi.weather'
+
+
+def test_temperature_any_attribute():
+    zigate = new_zigate()
+    zigate.read_data(attribute_report(0x1234, 1, 0x0402, 0x0001, 0x29, bytes.fromhex('0a28')))
+    assert zigate.devices.properties()[(0x1234, 1)][ZGT_TEMPERATURE] == 26.0
+
+
+def test_xiaomi_battery_key():
+    zigate = new_zigate()
+    zigate.read_data(HEARTBEAT)
+    assert zigate.devices.properties()[(0x9824, 1)]['battery'] == 2.985
+
+
+def test_xiaomi_tlv():
+    assert list(parse_xiaomi_tlv(XIAOMI_HEARTBEAT)) == [
+        (0x01, 0x21, 2985), (0x04, 0x21, 424), (0x05, 0x21, 9), (0x06, 0x24, 1), (0x64, 0x29, 2065),
+        (0x65, 0x21, 6576), (0x66, 0x2b, 99095), (0x0a, 0x21, 0)]
+    # string, then truncated value
+    assert list(parse_xiaomi_tlv(bytes.fromhex('0342026869 0121ab'))) == [(0x03, 0x42, 'hi')]
+    # unknown data type : the rest can not be parsed
+    assert list(parse_xiaomi_tlv(bytes.fromhex('0121a90b 07ff00 0521 0900'))) == [(0x01, 0x21, 2985)]
+
+
+def test_xiaomi_plug_state():
+    # same state as the on/off (0006 / 0000) report of the same value
+    button = get_attribute_decoder(0x0006, 0x0000)
+    for value in (0x00, 0x01):
+        decoded = decode_xiaomi_info(bytes.fromhex('0121a90b 6410') + bytes([value]))
+        assert decoded['value'] == 2.985
+        assert decoded['properties'] == [(ZGT_STATE, button(bytes([value]))['value'])]
+    assert decode_xiaomi_info(bytes.fromhex('641000'))['properties'] == [(ZGT_STATE, ZGT_STATE_ON)]
+
+
+def test_xiaomi_heartbeat_fan_out():
+    zigate = new_zigate()
+    events = []
+    zigate.events.subscribe(events.append, attribute=0xff01)
+    zigate.read_data(HEARTBEAT)
+    properties = zigate.devices.properties()[(0x9824, 1)]
+    assert (properties[ZGT_TEMPERATURE], properties[ZGT_HUMIDITY], properties[ZGT_PRESSURE]) == \
+        (20.65, 65.76, 990.95)
+    assert [(event.property_id, event.value) for event in events] == [
+        (ZGT_XIAOMI_BATTERY, 2.985), (ZGT_RSSI, 9), (ZGT_TEMPERATURE, 20.65), (ZGT_HUMIDITY, 65.76),
+        (ZGT_PRESSURE, 990.95)]
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from pyzigate.batching import ReadBatcher
+from pyzigate.commands import read_attribute_request
+from pyzigate.conversions import zgt_unescape
+from pyzigate.interface import ZiGate
+from pyzigate.timers import TimerHandle, TimerThread
+from samples import attribute_report
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Timers(object):
+    """call_later keeping the timers, run by hand"""
+    def __init__(self, clock):
+        self.clock = clock
+        self.planned = []
+        self.created = 0
+
+    def __call__(self, delay, callback):
+        handle = TimerHandle(self.clock() + delay, callback)
+        self.created += 1
+        self.planned.append(handle)
+        return handle
+
+    def pending(self):
+        return [handle for handle in self.planned if not handle.cancelled]
+
+    def run(self):
+        """fire the timers due"""
+        due = [handle for handle in self.pending() if handle.when <= self.clock()]
+        self.planned = [handle for handle in self.pending() if handle not in due]
+        for handle in due:
+            handle.callback()
+
+
+def batching_zigate():
+    clock = Clock()
+    zigate = ZiGate(read_batcher=ReadBatcher(window=0.05, timeout=5, clock=clock))
+    zigate.timers = Timers(clock)
+    zigate.call_later = zigate.timers
+    zigate.sent = []
+    zigate.send_to_transport = lambda data: zigate.sent.append(zgt_unescape(data[1:-1]))
+    return zigate, clock
+
+
+def test_reads_coalesced_with_one_timer():
+    zigate, clock = batching_zigate()
+    futures = [zigate.read_attribute('9824', '01', '0000', attribute) for attribute in ('0004', '0005')]
+    futures.append(zigate.read_attribute('abcd', '01', '0402', '0000'))
+    assert zigate.sent == [] and zigate.timers.created == 1
+    clock.now += 0.05
+    zigate.timers.run()
+    assert [frame[5:] for frame in zigate.sent] == [read_attribute_request(0x9824, 1, 0x0000, [0x0004, 0x0005]),
+                                                    read_attribute_request(0xabcd, 1, 0x0402, [0x0000])]
+    # a single timer for the timeouts
+    assert len(zigate.timers.pending()) == 1 and zigate.timers.created == 2
+
+    zigate.read_data(attribute_report(0x9824, 1, 0x0000, 0x0005, 0x42, b'lumi.weather', msg_type=0x8100))
+    assert futures[1].result().msg_type == 0x8100
+    assert not futures[0].done()
+
+    clock.now += 5
+    zigate.timers.run()
+    for future in (futures[0], futures[2]):
+        with pytest.raises(TimeoutError):
+            future.result()
+    assert len(zigate.read_batcher) == 0
+    assert zigate.timers.pending() == []
+
+
+def test_full_batch_sent_at_once():
+    zigate, clock = batching_zigate()
+    for attribute in range(zigate.read_batcher.max_attributes):
+        zigate.read_attribute(0x9824, 1, 0x0000, attribute)
+    assert len(zigate.sent) == 1
+    # the window timer is kept, the timeouts are checked when it fires
+    assert len(zigate.timers.pending()) == 1 and zigate.timers.created == 1
+
+
+def test_timer_thread():
+    timers = TimerThread()
+    fired = []
+    done = threading.Event()
+    cancelled = timers.call_later(0.01, lambda: fired.append('cancelled'))
+    timers.call_later(0.02, lambda: (fired.append('second'), done.set()))
+    timers.call_later(0.01, lambda: fired.append('first'))
+    cancelled.cancel()
+    assert done.wait(2)
+    assert fired == ['first', 'second']
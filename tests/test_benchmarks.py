@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from benchmarks import corpora
+from pyzigate.conversions import zgt_unescape
+from pyzigate.framing import Framer
+from pyzigate.interface import ZiGate
+
+
+def build(name, **kwargs):
+    return corpora.CORPORA[name](random.Random(0), **kwargs)
+
+
+@pytest.mark.parametrize('name', ('attributes', 'escaped', 'devlist'))
+def test_corpus_frames(name):
+    corpus = build(name, count=200)
+    framer = Framer()
+    msg_types = [int.from_bytes(zgt_unescape(frame)[:2], 'big')
+                 for frame in framer.feed(b''.join(encoded for _msg_type, encoded in corpus))]
+    assert msg_types == [msg_type for msg_type, _encoded in corpus]
+    assert framer.dropped_frames == 0
+
+
+def test_corpora_decoded():
+    zigate = ZiGate()
+    zigate.send_to_transport = lambda data: None
+    corpus = build('attributes', count=200) + build('corrupt', count=200)
+    zigate.read_data(b''.join(encoded for _msg_type, encoded in corpus))
+    assert zigate._framer.dropped_frames > 0
+    reporting = set(zgt_unescape(encoded[1:-1])[6:8] for msg_type, encoded in corpus if msg_type == 0x8102)
+    assert len(zigate.devices) == len(reporting)
@@ -0,0 +1,100 @@
+import os
+from time import time_ns
+
+import pytest
+
+from pyzigate import capture
+from pyzigate.capture import FrameCapture, CaptureReader, list_segments, replay, ZGT_CAPTURE_MAGIC
+from pyzigate.interface import ZiGate
+from pyzigate.tracing import ZGT_TRACE_IN, ZGT_TRACE_OUT, ZGT_TRACE_RECORD
+from samples import ALL, TEMPERATURE
+
+
+def test_wall_clock_timestamps(tmp_path):
+    before = time_ns()
+    with FrameCapture(str(tmp_path)) as frames:
+        frames.write(ZGT_TRACE_IN, TEMPERATURE[1:-1])
+    with CaptureReader(str(tmp_path)) as reader:
+        timestamp, direction, frame = reader[0]
+        assert before <= timestamp <= time_ns()
+        assert (direction, bytes(frame)) == (ZGT_TRACE_IN, TEMPERATURE[1:-1])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """one second per monotonic clock read, the wall clock following it"""
+    now = [10 ** 9]
+
+    def monotonic_ns():
+        now[0] += 10 ** 9
+        return now[0]
+    monkeypatch.setattr(capture, 'monotonic_ns', monotonic_ns)
+    monkeypatch.setattr(capture, 'time_ns', lambda: 10 ** 18 + now[0])
+
+
+def test_rotation_and_seek(tmp_path, clock):
+    directory = str(tmp_path)
+    frames = [frame[1:-1] for frame in ALL] * 20
+    with FrameCapture(directory, segment_size=512, max_segments=None) as output:
+        for i, frame in enumerate(frames):
+            output.write(ZGT_TRACE_OUT if i % 2 else ZGT_TRACE_IN, frame)
+    segments = list_segments(directory)
+    assert len(segments) > 3
+    assert all(os.path.getsize(path) <= 512 for path in segments)
+    with open(segments[0], 'rb') as f:
+        assert f.read(len(ZGT_CAPTURE_MAGIC)) == ZGT_CAPTURE_MAGIC
+
+    with CaptureReader(directory) as reader:
+        assert len(reader) == len(frames)
+        assert [bytes(frame) for _timestamp, _direction, frame in reader] == frames
+        assert bytes(reader[-1][2]) == frames[-1]
+        timestamps = [timestamp for timestamp, _direction, _frame in reader]
+        assert timestamps == sorted(set(timestamps)) and timestamps[0] > 10 ** 18
+        for index in (0, 1, 37, len(frames) - 1):
+            records = list(reader.seek_time(timestamps[index]))
+            assert len(records) == len(frames) - index
+            assert records[0][0] == timestamps[index]
+        # between two records
+        assert list(reader.seek_time(timestamps[10] - 1))[0][0] == timestamps[10]
+        assert list(reader.seek_time(timestamps[-1] + 1)) == []
+
+        zigate = ZiGate()
+        assert replay(zigate, reader) == len(frames) // 2
+        assert zigate.devices.get(0x9824) is not None
+
+
+def test_segments_kept(tmp_path):
+    directory = str(tmp_path)
+    with FrameCapture(directory, segment_size=256, max_segments=2) as output:
+        for _ in range(50):
+            output.write(ZGT_TRACE_IN, TEMPERATURE[1:-1])
+    segments = list_segments(directory)
+    assert len(segments) == 2
+    # a new capture goes on with the next segment index
+    FrameCapture(directory, max_segments=2).close()
+    assert list_segments(directory) == segments[1:] + [segments[-1][:-10] + '{:06d}.zgc'.format(
+        int(segments[-1][-10:-4]) + 1)]
+
+
+def test_segments_of_several_runs(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    # the monotonic clock starting over (reboot) between the two runs
+    for wall, monotonic in ((10 ** 18, 500 * 10 ** 9), (10 ** 18 + 3600 * 10 ** 9, 10 ** 9)):
+        ticks = iter(range(monotonic, monotonic + 10 ** 12, 10 ** 9))
+        monkeypatch.setattr(capture, 'time_ns', lambda wall=wall: wall)
+        monkeypatch.setattr(capture, 'monotonic_ns', lambda ticks=ticks: next(ticks))
+        with FrameCapture(directory, max_segments=None) as output:
+            for _ in range(3):
+                output.write(ZGT_TRACE_IN, TEMPERATURE[1:-1])
+    with CaptureReader(directory) as reader:
+        timestamps = [timestamp for timestamp, _direction, _frame in reader]
+        assert timestamps == [10 ** 18 + i * 10 ** 9 for i in (1, 2, 3)] + \
+            [10 ** 18 + (3600 + i) * 10 ** 9 for i in (1, 2, 3)]
+        assert [record[0] for record in reader.seek_time(10 ** 18 + 3600 * 10 ** 9)] == timestamps[3:]
+
+
+def test_segment_without_anchor(tmp_path):
+    with open(str(tmp_path / 'zigate-000000.zgc'), 'wb') as f:
+        f.write(b'ZGTCAP1\n' + ZGT_TRACE_RECORD.pack(1, ZGT_TRACE_IN, 1) + b'\x00')
+    with pytest.raises(ValueError):
+        CaptureReader(str(tmp_path))
@@ -0,0 +1,42 @@
+import pytest
+
+from pyzigate.commands import (ZGT_PERMIT_JOIN, read_attribute_request, permit_join_request,
+                               active_endpoints_request)
+from pyzigate.conversions import zgt_encode_frame, zgt_escape, zgt_xor
+from pyzigate.interface import ZiGate
+
+
+def encode_frame(cmd, data):
+    """the encoder before the header templates"""
+    length = len(data).to_bytes(2, 'big')
+    checksum = zgt_xor(data, cmd[0] ^ cmd[1] ^ length[0] ^ length[1])
+    return b'\x01' + zgt_escape(cmd + length + bytes([checksum]) + data) + b'\x03'
+
+
+@pytest.mark.parametrize('cmd', (0x0010, 0x0049, 0x0100, 0x0203, 0x8000))
+def test_frames_identical(cmd):
+    for size in (0, 1, 3, 15, 16, 255, 256):
+        data = bytes(i & 0xff for i in range(size))
+        assert zgt_encode_frame(cmd, data) == zgt_encode_frame(cmd.to_bytes(2, 'big'), data)
+        assert zgt_encode_frame(cmd, data) == encode_frame(cmd.to_bytes(2, 'big'), data)
+
+
+def test_builders_match_hex_payloads():
+    assert read_attribute_request(0xab01, 0x01, 0x0000, [0x0004, 0x0005]) == \
+        bytes.fromhex('02 ab01 01 01 0000 00 00 0000 02 0004 0005')
+    assert read_attribute_request(0xab01, 0x01, 0x0000, [0x0004], manufacturer=0x115f) == \
+        bytes.fromhex('02 ab01 01 01 0000 00 01 115f 01 0004')
+    assert permit_join_request() == bytes.fromhex('fffc1e00')
+    assert active_endpoints_request(0x9824) == bytes.fromhex('9824')
+
+
+def test_send_data_and_helpers():
+    zigate = ZiGate()
+    sent = []
+    zigate.send_to_transport = sent.append
+    zigate.send_data('0049', 'FFFC1E00')
+    zigate.permit_join()
+    zigate.read_attributes('AB01', '01', '0000', ['0004', '0005'])
+    zigate.read_attributes(0xab01, 1, 0, [4, 5])
+    assert sent[0] == sent[1] == zgt_encode_frame(ZGT_PERMIT_JOIN, bytes.fromhex('fffc1e00'))
+    assert sent[2] == sent[3]
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+import pytest
+
+from pyzigate.conversions import (zgt_escape, zgt_unescape, zgt_encode_frame, zgt_checksum, zgt_id, IdDict,
+                                  zgt_interpret_struct, StructPlan)
+from pyzigate.responses import RESPONSES
+
+
+def test_escape_round_trip():
+    data = bytes(range(256))
+    escaped = zgt_escape(data)
+    assert all(byte >= 0x10 for byte in escaped if byte != 0x02)
+    assert zgt_unescape(escaped) == data
+
+
+def test_encode_frame():
+    frame = zgt_encode_frame(0x0049, bytes.fromhex('fffc1e00'))
+    decoded = zgt_unescape(frame[1:-1])
+    assert frame[0] == 0x01 and frame[-1] == 0x03
+    assert decoded[:4] == bytes.fromhex('00490004')
+    assert decoded[4] == zgt_checksum(b'\x00\x49', b'\x00\x04', bytes.fromhex('fffc1e00'))
+    assert decoded[5:] == bytes.fromhex('fffc1e00')
+
+
+def _decode(decoder, struct, msg):
+    try:
+        return decoder(struct, msg)
+    except Exception as e:
+        return type(e)
+
+
+def _plan_decode(struct, msg):
+    return StructPlan(struct).decode(msg)
+
+
+STRUCTS = [response.struct for response in set(RESPONSES.values()) if response.struct]
+STRUCTS += [OrderedDict([('a', 32), ('n', 'recursive')]),
+            OrderedDict([('a', 'int16'), ('b', 8), ('n', 'recursive')]),
+            OrderedDict([('l', 'len8'), ('v', 'raw'), ('c', 'count'), ('e', 16), ('rest', 'end')])]
+
+
+@pytest.mark.parametrize('struct', STRUCTS, ids=lambda struct: ','.join(struct))
+def test_plan_matches_interpreter(struct):
+    msg = bytes(range(0x20, 0x20 + 40))
+    for size in range(len(msg) + 1):
+        assert (_decode(_plan_decode, struct, msg[:size]) ==
+                _decode(zgt_interpret_struct, struct, msg[:size])), size
+
+
+def test_truncated_recursive_keys():
+    struct = OrderedDict([('a', 32), ('n', 'recursive')])
+    msg = bytes(7)
+    assert list(StructPlan(struct).decode(msg)) == list(zgt_interpret_struct(struct, msg)) == ['a[00]', 'a[01]']
+
+
+def test_ids():
+    assert zgt_id(b'0402') == zgt_id('0402') == zgt_id(0x0402) == 0x0402
+    assert zgt_id(None) is None
+    registry = IdDict({(0x0402, 0x0000): 'temperature'})
+    assert registry[(b'0402', '0000')] == 'temperature'
+    assert (b'0402', b'0000') in registry
+    assert registry.get((b'0403', b'0000')) is None
+
+
+def test_id_dict_misses():
+    registry = IdDict({(0x0402, None): 'fallback', 0x0006: 'on/off'})
+    assert registry.get((0x0402, 0x0000)) is None
+    assert registry.get((0x0402, None)) == registry.get(('0402', None)) == 'fallback'
+    assert registry.get(0x0007, 'default') == 'default'
+    assert registry.get('zz', 'default') == registry.get(('zz', 1), 'default') == 'default'
+    assert registry['0006'] == 'on/off'
+    assert 0x0006 in registry and b'0006' in registry
+    assert 'zz' not in registry and (0x0402, 0x0000) not in registry
+    with pytest.raises(KeyError):
+        registry[0x0007]
+    with pytest.raises(KeyError):
+        registry['zz']
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from pyzigate.attributes import ATTRIBUTES
+from pyzigate.definitions import load_definitions, normalize
+from pyzigate.parameters import ZGT_EVENT, ZGT_TBD
+
+
+def entry(**fields):
+    result = {'cluster': '0101', 'attribute': '0055', 'data_type': 'uint16', 'property': 'ZGT_EVENT'}
+    result.update(fields)
+    return result
+
+
+def write(tmp_path, *entries):
+    path = tmp_path / 'definitions.json'
+    path.write_text(json.dumps({'format': 1, 'attributes': list(entries)}))
+    return str(path)
+
+
+@pytest.mark.parametrize('definitions', [
+    {'format': 2, 'attributes': []},
+    {'format': 1},
+    {'format': 1, 'attributes': [entry(cluster='xyz')]},
+    {'format': 1, 'attributes': [entry(data_type='uint12')]},
+    {'format': 1, 'attributes': [entry(property='ZGT_UNKNOWN')]},
+    {'format': 1, 'attributes': [entry(colour='red')]},
+    {'format': 1, 'attributes': [entry(enum={'1': 'a'}, scale=2)]},
+    {'format': 1, 'attributes': [entry(data_type='string', enum={'1': 'a'})]},
+    {'format': 1, 'attributes': [entry(info='{unknown}')]},
+    {'format': 1, 'attributes': [entry(), entry()]},
+])
+def test_invalid(definitions):
+    with pytest.raises(ValueError):
+        normalize(definitions)
+
+
+def test_decoders(tmp_path):
+    path = write(tmp_path,
+                 entry(enum={'1': 'vibration', '2': 'tilt'}),
+                 entry(attribute='0503', property='tilt angle', scale=0.5, offset=-1, info='{value:.1f}'),
+                 entry(attribute='0505', data_type='int24', property=None),
+                 entry(attribute='0506', data_type='string', property='name'))
+    decoders = {(cluster, attribute): decoder for cluster, attribute, decoder in load_definitions(path)}
+    assert decoders[(0x0101, 0x0055)](b'\x00\x02') == {'type': ZGT_EVENT, 'value': 'tilt',
+                                                       'info': '{} : tilt'.format(ZGT_EVENT)}
+    assert decoders[(0x0101, 0x0055)](b'\x00\x07')['value'] == 7
+    assert decoders[(0x0101, 0x0503)](b'\x00\x05') == {'type': 'tilt angle', 'value': 1.5, 'info': '1.5'}
+    assert decoders[(0x0101, 0x0505)](b'\xff\xff\xfe')['value'] == -2
+    assert decoders[(0x0101, 0x0505)](b'\xff\xff\xfe')['type'] == ZGT_TBD
+    assert decoders[(0x0101, 0x0506)](b'lumi')['value'] == 'lumi'
+
+
+def test_cache_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setenv('ZIGATE_CACHE_DIR', str(tmp_path / 'default'))
+    path = write(tmp_path, entry())
+    load_definitions(path)
+    assert not os.path.exists(str(tmp_path / 'default'))
+
+    cache_dir = tmp_path / 'cache'
+    first = load_definitions(path, cache_dir=str(cache_dir))
+    cached, = cache_dir.iterdir()
+    assert json.loads(cached.read_text()) == normalize(json.loads(open(path).read()), path)
+    second = load_definitions(path, cache_dir=str(cache_dir))
+    assert [(cluster, attribute, decoder(b'\x00\x01')) for cluster, attribute, decoder in first] == \
+        [(cluster, attribute, decoder(b'\x00\x01')) for cluster, attribute, decoder in second]
+
+
+def test_builtin_definitions_registered():
+    decoder = ATTRIBUTES[(0x0101, 0x0055)]
+    assert decoder(b'\x00\x03')['value'] == 'drop'
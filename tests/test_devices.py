@@ -0,0 +1,42 @@
+from pyzigate.devices import DeviceRegistry
+from pyzigate.interface import ZiGate
+from pyzigate.parameters import ZGT_TEMPERATURE, ZGT_HUMIDITY
+from samples import TEMPERATURE, ANNOUNCE, DEVICE_LIST
+
+
+def test_properties_by_ieee_across_new_short_address():
+    registry = DeviceRegistry()
+    registry.announce(0x1234, 0x00158d0001d6db5a)
+    registry.set_property(0x1234, 1, ZGT_TEMPERATURE, 20.5)
+    # rejoined with a new short address
+    registry.announce(0x5678, 0x00158d0001d6db5a)
+    registry.set_property(0x5678, 1, ZGT_HUMIDITY, 40.0)
+    device = registry.get_by_ieee(0x00158d0001d6db5a)
+    assert device.addr == 0x5678
+    assert registry.get(0x5678) is device
+    assert registry.properties()[(0x5678, 1)] == {ZGT_TEMPERATURE: 20.5, ZGT_HUMIDITY: 40.0}
+
+
+def test_extra_properties():
+    registry = DeviceRegistry()
+    registry.set_property(0x1234, None, 'custom', 'value')
+    assert registry.properties()[(0x1234, None)] == {'custom': 'value'}
+
+
+def test_announce_and_device_list_messages():
+    zigate = ZiGate()
+    zigate.read_data(ANNOUNCE)
+    assert zigate.devices.get(0x2400).ieee == 0x158d0001d6db5a80
+    # same device, listed with another short address
+    zigate.read_data(DEVICE_LIST)
+    assert zigate.devices.get(0x2400) is None
+    assert zigate.devices.get(0x9824).ieee == 0x158d0001d6db5a80
+    assert zigate.devices.get(0xabcd).ieee == 0x158d000100000001
+
+
+def test_legacy_devices_info_keys():
+    zigate = ZiGate()
+    zigate.read_data(TEMPERATURE)
+    zigate.set_device_property(0x9824, None, 'custom', 1)
+    assert zigate._devices_info['9824_01'][ZGT_TEMPERATURE] == 20.66
+    assert zigate._devices_info['9824_x'] == {'custom': 1}
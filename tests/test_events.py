@@ -0,0 +1,48 @@
+from pyzigate.events import Event, EventBus
+from pyzigate.interface import ZiGate
+from pyzigate.parameters import ZGT_TEMPERATURE
+from samples import DEVICE_LIST, STATUS, TEMPERATURE
+
+
+def test_filters():
+    bus = EventBus()
+    received = []
+    bus.subscribe(lambda event: received.append(('all', event.msg_type)))
+    bus.subscribe(lambda event: received.append(('8000', event.msg_type)), msg_type=0x8000)
+    bus.subscribe(lambda event: received.append(('temperature', event.addr)), addr=0x9824, cluster=0x0402)
+    assert bus.publish(Event(0x8000, None)) == 2
+    assert bus.publish(Event(0x8102, None, addr=0x9824, cluster=0x0402)) == 2
+    assert bus.publish(Event(0x8102, None, addr=0x9824, cluster=0x0405)) == 1
+    assert received == [('all', 0x8000), ('8000', 0x8000), ('all', 0x8102), ('temperature', 0x9824),
+                        ('all', 0x8102)]
+
+
+def test_unsubscribe_and_failing_subscriber():
+    bus = EventBus()
+    received = []
+
+    def failing(event):
+        raise ValueError()
+
+    token = bus.subscribe(received.append, msg_type=0x8000)
+    bus.subscribe(failing, msg_type=0x8000)
+    assert bus.publish(Event(0x8000, None)) == 2
+    assert len(received) == 1
+    bus.unsubscribe(token)
+    assert len(bus) == 1
+    assert bus.publish(Event(0x8000, None)) == 1
+    assert len(received) == 1
+
+
+def test_zigate_events():
+    zigate = ZiGate()
+    events = []
+    zigate.events.subscribe(events.append, cluster=0x0402)
+    zigate.events.subscribe(events.append, msg_type=0x8000)
+    for data in (DEVICE_LIST, STATUS, TEMPERATURE):
+        zigate.read_data(data)
+    status, temperature = events
+    assert status.msg_type == 0x8000 and status.response.status == 0
+    assert (temperature.addr, temperature.endpoint, temperature.attribute) == (0x9824, 1, 0x0000)
+    assert temperature.ieee == 0x158d0001d6db5a80
+    assert temperature.property_id == ZGT_TEMPERATURE and temperature.value == 20.66
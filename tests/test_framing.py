@@ -0,0 +1,41 @@
+from pyzigate.framing import Framer
+
+
+def frames(framer, data):
+    return [bytes(frame) for frame in framer.feed(data)]
+
+
+def test_complete_frames():
+    framer = Framer()
+    assert frames(framer, b'\x01abc\x03\x01def\x03') == [b'abc', b'def']
+    assert framer.dropped_frames == 0
+
+
+def test_split_across_chunks():
+    framer = Framer()
+    stream = b'\x01abc\x03\x01defgh\x03'
+    received = []
+    for i in range(len(stream)):
+        received += frames(framer, stream[i:i + 1])
+    assert received == [b'abc', b'defgh']
+
+
+def test_garbage_and_truncated_frame():
+    framer = Framer()
+    assert frames(framer, b'xx\x01ab\x01cd\x03') == [b'cd']
+    assert framer.dropped_frames == 1
+    assert framer.dropped_bytes == 2 + 3
+
+
+def test_oversized_frame_resync():
+    framer = Framer(max_frame_size=16)
+    assert frames(framer, b'\x01' + b'a' * 32) == []
+    assert framer.dropped_frames == 1
+    assert frames(framer, b'\x01ok\x03') == [b'ok']
+
+
+def test_reset_drops_partial_frame():
+    framer = Framer()
+    assert frames(framer, b'\x01abc') == []
+    framer.reset()
+    assert frames(framer, b'def\x03\x01ghi\x03') == [b'ghi']
@@ -0,0 +1,28 @@
+from pyzigate.history import History
+
+
+def test_wraps_around():
+    history = History(4)
+    for i in range(10):
+        history.append(i, i * 10)
+    assert len(history) == 4
+    timestamps, values = history.last()
+    assert list(timestamps) == [6, 7, 8, 9]
+    assert list(values) == [60, 70, 80, 90]
+    assert list(history.last(2)[1]) == [80, 90]
+
+
+def test_since_and_aggregates():
+    history = History(8)
+    for i in range(6):
+        history.append(i, i)
+    assert list(history.since(3)[0]) == [3, 4, 5]
+    assert history.min(since=3) == 3
+    assert history.max(n=2) == 5
+    assert history.mean() == 2.5
+
+
+def test_empty():
+    history = History(4)
+    assert history.mean() is None
+    assert list(history.since(0)[0]) == []
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from pyzigate.commands import ZGT_GET_DEVICES_LIST
+from pyzigate.manager import CoordinatorManager
+from pyzigate.parameters import ZGT_TEMPERATURE
+from pyzigate.simulator import Coordinator
+
+
+def simulated(manager, name, seed):
+    zigate = manager.add(name)
+    coordinator = Coordinator(devices=5, seed=seed)
+    framer = coordinator.framer()
+    zigate.send_to_transport = lambda data: [zigate.read_data(frame)
+                                             for frame in coordinator.receive(framer, data)]
+    zigate.send_command(ZGT_GET_DEVICES_LIST)
+    return coordinator
+
+
+def test_routing_by_ieee():
+    loop = asyncio.new_event_loop()
+    try:
+        manager = CoordinatorManager(loop)
+        coordinators = {name: simulated(manager, name, seed) for seed, name in enumerate(('first', 'second'))}
+        with pytest.raises(ValueError):
+            manager.add('first')
+        assert len(manager.devices()) == 10
+
+        events = []
+        manager.events.subscribe(events.append, cluster=0x0402)
+        device = next(iter(coordinators['second'].devices.values()))
+        manager.call(device.ieee, 'read_attributes', 0x01, 0x0402, [0x0000])
+        assert [(event.source, event.addr, event.value) for event in events] == \
+            [('second', device.addr, device.temperature / 100)]
+        zigate, known = manager.device(device.ieee)
+        assert zigate.name == 'second' and known.endpoint(1).get(ZGT_TEMPERATURE) == device.temperature / 100
+        with pytest.raises(KeyError):
+            manager.call(0x1234, 'read_attributes', 0x01, 0x0402, [0x0000])
+
+        metrics = manager.metrics()
+        assert metrics['first']['devices'] == metrics['second']['devices'] == 5
+        assert (metrics['first']['sent_frames'], metrics['second']['sent_frames']) == (1, 2)
+        assert metrics['second']['received_frames'] == sum(manager.coordinators['second'].metrics.received.values())
+        assert manager.add('third', metrics=False).metrics is None
+        assert manager.metrics()['third']['sent_frames'] is None
+        assert 'zigate_frames_received_total{coordinator="second",msg_type="8100"} 1' in manager.prometheus_text()
+    finally:
+        loop.close()
@@ -0,0 +1,42 @@
+from pyzigate.conversions import zgt_encode_frame
+from pyzigate.interface import ZiGate
+from pyzigate.metrics import collect, prometheus_text
+from pyzigate.scheduler import Scheduler
+from samples import TEMPERATURE, frame
+
+
+def test_disabled_by_default():
+    zigate = ZiGate()
+    zigate.send_to_transport = lambda data: None
+    zigate.read_data(TEMPERATURE)
+    assert zigate.metrics is None and collect(zigate) is None
+
+
+def test_received_and_errors():
+    zigate = ZiGate(metrics=True)
+    bad_crc = bytearray(TEMPERATURE)
+    bad_crc[-2] ^= 0x40
+    zigate.read_data(TEMPERATURE + bytes(bad_crc) + frame(0x9999, b'') + TEMPERATURE)
+    metrics = collect(zigate)
+    assert metrics['received'] == {0x8102: 2, 0x9999: 1}
+    assert metrics['crc_errors'] == 1
+    assert metrics['unknown_messages'] == {0x9999: 1}
+    assert metrics['latency'][0x8102]['decode']['count'] == 2
+    assert 'zigate_crc_errors_total 1' in prometheus_text(zigate)
+
+
+def test_sent_counted_on_transmission():
+    # 0x0002 is escaped in the frame header
+    zigate = ZiGate(scheduler=Scheduler(rate=None, max_pending=1, max_retries=1, backoff=0), metrics=True)
+    sent = []
+    zigate.send_to_transport = sent.append
+    zigate.call_later = lambda delay, callback: None
+    zigate.send_command(0x0100, b'\x01')
+    zigate.send_command(0x0002, b'\x02')
+    # queued, not sent yet
+    assert zigate.metrics.sent == {0x0100: 1}
+    busy = frame(0x8000, bytes.fromhex('04010100'), 0)
+    zigate.read_data(busy)  # 0100 retried
+    zigate.read_data(busy)  # 0100 dropped after max_retries
+    assert sent == [zgt_encode_frame(0x0100, b'\x01')] * 2 + [zgt_encode_frame(0x0002, b'\x02')]
+    assert zigate.metrics.sent == {0x0100: 2, 0x0002: 1}
@@ -0,0 +1,39 @@
+import pytest
+
+from pyzigate.conversions import zgt_unescape
+from pyzigate.interface import ZiGate
+from pyzigate.parameters import ZGT_TEMPERATURE
+from pyzigate.responses import RESPONSES
+from pyzigate.scheduler import Scheduler
+from samples import ALL, DEVICE_LIST, TEMPERATURE, frame
+
+
+@pytest.mark.parametrize('encoded', ALL)
+def test_lazy_matches_eager(encoded):
+    data = zgt_unescape(encoded[1:-1])
+    response_class = RESPONSES[int.from_bytes(data[:2], 'big')]
+    eager = response_class(data)
+    lazy = response_class(data, lazy=True)
+    for key in eager.msg:
+        assert lazy.msg[key] == eager.msg[key]
+    assert dict(lazy.msg) == dict(eager.msg)
+    assert lazy.get_external_commands() == eager.get_external_commands()
+
+
+def test_filtered_responses_still_tracked():
+    zigate = ZiGate(scheduler=Scheduler(rate=None, max_pending=1))
+    zigate.filter_response = lambda response: False
+    zigate.call_later = lambda delay, callback: None
+    sent = []
+    handled = []
+    zigate.send_to_transport = sent.append
+    zigate.on_response = handled.append
+    zigate.events.subscribe(handled.append)
+    zigate.send_command(0x0049, b'\x00')
+    zigate.send_command(0x0049, b'\x01')
+    # the status of a filtered 8000 frees the scheduler slot
+    zigate.read_data(frame(0x8000, bytes.fromhex('00010049'), 0))
+    assert len(sent) == 2
+    zigate.read_data(DEVICE_LIST + TEMPERATURE)
+    assert zigate.devices.get(0x9824).endpoint(1).get(ZGT_TEMPERATURE) == 20.66
+    assert handled == []
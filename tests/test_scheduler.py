@@ -0,0 +1,71 @@
+from pyzigate.parameters import ZGT_PRIORITY_INTERACTIVE, ZGT_PRIORITY_POLLING
+from pyzigate.scheduler import Scheduler
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_priorities_and_pending_limit():
+    clock = Clock()
+    scheduler = Scheduler(rate=None, max_pending=2, clock=clock)
+    sent = []
+    scheduler.submit(0x0100, b'poll', ZGT_PRIORITY_POLLING)
+    scheduler.submit(0x0100, b'read')
+    scheduler.submit(0x0092, b'switch', ZGT_PRIORITY_INTERACTIVE)
+    scheduler.pump(sent.append)
+    assert sent == [b'switch', b'read']
+    assert scheduler.status_received(0, 0x0092)[1] is False
+    scheduler.pump(sent.append)
+    assert sent[-1] == b'poll'
+
+
+def test_rate_limit():
+    clock = Clock()
+    scheduler = Scheduler(rate=10, burst=2, max_pending=100, clock=clock)
+    sent = []
+    for i in range(5):
+        scheduler.submit(0x0100, bytes([i]))
+    delay = scheduler.pump(sent.append)
+    assert len(sent) == 2
+    assert abs(delay - 0.1) < 1e-9
+    clock.now += 0.1
+    scheduler.pump(sent.append)
+    assert len(sent) == 3
+
+
+def test_busy_retry_with_backoff():
+    clock = Clock()
+    scheduler = Scheduler(rate=None, max_pending=4, backoff=0.5, max_retries=1, clock=clock)
+    sent = []
+    first = scheduler.submit(0x0100, b'a', token='a')
+    scheduler.submit(0x0100, b'b', token='b')
+    scheduler.pump(sent.append)
+    # statuses come in transmission order
+    assert scheduler.status_received(4, 0x0100) == (first, True)
+    command, retried = scheduler.status_received(0, 0x0100)
+    assert command.token == 'b' and not retried
+    assert scheduler.pump(sent.append) == 0.5
+    clock.now += 0.5
+    scheduler.pump(sent.append)
+    assert sent == [b'a', b'b', b'a']
+    # retries exhausted
+    assert scheduler.status_received(4, 0x0100) == (first, False)
+    assert scheduler.retried == 1 and scheduler.failed == 1
+
+
+def test_status_timeout():
+    clock = Clock()
+    scheduler = Scheduler(rate=None, max_pending=1, status_timeout=2, clock=clock)
+    sent = []
+    scheduler.submit(0x0100, b'lost')
+    scheduler.submit(0x0100, b'next')
+    assert scheduler.pump(sent.append) == 2
+    clock.now += 2
+    scheduler.pump(sent.append)
+    assert sent == [b'lost', b'next']
+    assert scheduler.status_received(0, 0x0092) == (None, False)
@@ -0,0 +1,77 @@
+import asyncio
+import os
+
+from pyzigate.commands import ZGT_GET_DEVICES_LIST, ZGT_READ_ATTRIBUTE, read_attribute_request
+from pyzigate.conversions import zgt_encode_frame
+from pyzigate.framing import Framer, ZGT_MAX_FRAME_SIZE
+from pyzigate.interface import ZiGate
+from pyzigate.parameters import ZGT_TEMPERATURE
+from pyzigate.simulator import Coordinator, BufferedWriter, DEVICE_LIST_MAX, DEVICE_LIST_ENTRY
+
+
+def test_device_list_frames_fit():
+    # every byte escaped
+    worst = zgt_encode_frame(0x8015, bytes(DEVICE_LIST_ENTRY.size * DEVICE_LIST_MAX + 1))
+    assert len(worst) < ZGT_MAX_FRAME_SIZE
+
+
+def test_coordinator_answers():
+    coordinator = Coordinator(devices=100)
+    zigate = ZiGate()
+    framer = coordinator.framer()
+    zigate.send_to_transport = lambda data: [zigate.read_data(frame)
+                                             for frame in coordinator.receive(framer, data)]
+    zigate.send_command(ZGT_GET_DEVICES_LIST)
+    assert len(zigate.devices) == 100
+    assert zigate._framer.dropped_frames == 0
+    addr, device = next(iter(coordinator.devices.items()))
+    assert zigate.devices.get(addr).ieee == device.ieee
+    zigate.send_command(ZGT_READ_ATTRIBUTE, read_attribute_request(addr, 1, 0x0402, [0x0000]))
+    assert zigate.devices.get(addr).endpoint(1).get(ZGT_TEMPERATURE) == device.temperature / 100
+
+
+def test_buffered_writer_keeps_frames_whole():
+    coordinator = Coordinator(devices=10)
+    frames = [coordinator.report() for _ in range(5000)]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        write = BufferedWriter(loop, write_fd)
+        for frame in frames:
+            write(frame)
+        # more than the pipe takes at once
+        assert len(write)
+        received = bytearray()
+        size = sum(len(frame) for frame in frames)
+        while len(received) < size:
+            await asyncio.sleep(0)
+            try:
+                received += os.read(read_fd, 65536)
+            except BlockingIOError:
+                pass
+        assert not len(write)
+        os.close(read_fd)
+        os.close(write_fd)
+        return bytes(received)
+
+    received = asyncio.run(run())
+    assert [bytes(frame) for frame in Framer().feed(received)] == [frame[1:-1] for frame in frames]
+
+
+def test_buffered_writer_drops_when_full():
+    async def run():
+        loop = asyncio.get_running_loop()
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        write = BufferedWriter(loop, write_fd, max_buffer=1024)
+        frame = b'\x01' + b'x' * 1022 + b'\x03'
+        while not write.dropped:
+            write(frame)
+        write.close()
+        os.close(read_fd)
+        os.close(write_fd)
+        return write.dropped
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,75 @@
+import os
+import threading
+
+from pyzigate.devices import DeviceRegistry
+from pyzigate.parameters import ZGT_TEMPERATURE, ZGT_TYPE
+from pyzigate.files import write_atomic
+from pyzigate.snapshot import dump_registry, load_registry, save_snapshot, load_snapshot
+
+
+def sample_registry():
+    registry = DeviceRegistry()
+    registry.announce(0x1234, 0x00158d0001d6db5a)
+    registry.set_property(0x1234, 1, ZGT_TEMPERATURE, 20.5)
+    registry.set_property(0x1234, 1, ZGT_TYPE, 'lumi.weather')
+    registry.set_property(0x1234, None, 'flag', True)
+    registry.set_property(0x5678, 2, 'count', 3)
+    return registry
+
+
+def test_round_trip():
+    registry = sample_registry()
+    restored = DeviceRegistry()
+    assert load_registry(restored, dump_registry(registry)) == 2
+    assert restored.properties() == registry.properties()
+    assert restored.get_by_ieee(0x00158d0001d6db5a).addr == 0x1234
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'state.zgs')
+    save_snapshot(sample_registry(), path).join()
+    restored = DeviceRegistry()
+    assert load_snapshot(restored, path) == 2
+    assert restored.properties() == sample_registry().properties()
+
+
+def test_concurrent_atomic_writes(tmp_path):
+    path = str(tmp_path / 'state.bin')
+    payloads = [bytes([i]) * 100000 for i in range(8)]
+    threads = [threading.Thread(target=write_atomic, args=(path, data)) for data in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path, 'rb') as f:
+        assert f.read() in payloads
+    assert os.listdir(str(tmp_path)) == ['state.bin']
+
+
+def test_long_names_and_values_skipped():
+    registry = sample_registry()
+    registry.set_property(0x1234, 1, 'n' * 300, 1)
+    registry.set_property(0x1234, 1, 'label', 'v' * 70000)
+    restored = DeviceRegistry()
+    assert load_registry(restored, dump_registry(registry)) == 2
+    assert restored.properties() == sample_registry().properties()
+
+
+def test_dump_while_updated():
+    registry = sample_registry()
+    done = threading.Event()
+
+    def update():
+        i = 0
+        while not done.is_set():
+            registry.set_property(0x1000 + i % 500, i % 7, 'p%d' % (i % 50), i)
+            i += 1
+
+    thread = threading.Thread(target=update)
+    thread.start()
+    try:
+        for _ in range(20):
+            load_registry(DeviceRegistry(), dump_registry(registry))
+    finally:
+        done.set()
+        thread.join()
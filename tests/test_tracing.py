@@ -0,0 +1,30 @@
+import io
+import logging
+
+from pyzigate.conversions import zgt_encode_frame
+from pyzigate.interface import ZiGate
+from pyzigate.tracing import BinaryTrace, read_binary_trace, Tracer, ZGT_TRACE_IN, ZGT_TRACE_OUT
+from samples import TEMPERATURE
+
+
+def test_tracer_levels():
+    logger = logging.getLogger('zigate.test')
+    logger.setLevel(logging.WARNING)
+    tracer = Tracer(logger)
+    assert not tracer.debug and not tracer.info
+    logger.setLevel(logging.DEBUG)
+    assert tracer.refresh().debug
+
+
+def test_binary_trace_round_trip():
+    zigate = ZiGate()
+    zigate.send_to_transport = lambda data: None
+    output = io.BytesIO()
+    zigate.trace.binary = BinaryTrace(output)
+    zigate.read_data(TEMPERATURE)
+    zigate.send_data('0010')
+    output.seek(0)
+    records = list(read_binary_trace(output))
+    assert [(direction, frame) for _timestamp, direction, frame in records] == [
+        (ZGT_TRACE_IN, TEMPERATURE[1:-1]), (ZGT_TRACE_OUT, zgt_encode_frame(0x0010)[1:-1])]
+
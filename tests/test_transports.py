@@ -0,0 +1,143 @@
+import asyncio
+import threading
+
+import pytest
+
+from pyzigate.commands import ZGT_GET_DEVICES_LIST
+from pyzigate.interface import ZiGate
+from pyzigate.simulator import Coordinator
+from pyzigate.transports.aio import AsyncTransport, ZiGateProtocol
+from pyzigate.transports.threaded import ThreadedSerialTransport
+
+
+class FakeSerial(object):
+    """pyserial like line to a simulated coordinator"""
+    def __init__(self, coordinator, timeout=0.05):
+        self.coordinator = coordinator
+        self.framer = coordinator.framer()
+        self.timeout = timeout
+        self.closed = False
+        self._input = bytearray()
+        self._condition = threading.Condition()
+
+    @property
+    def in_waiting(self):
+        return len(self._input)
+
+    def read(self, size=1):
+        with self._condition:
+            if not self._input:
+                self._condition.wait(self.timeout)
+            data = bytes(self._input[:size])
+            del self._input[:size]
+        return data
+
+    def write(self, data):
+        responses = self.coordinator.receive(self.framer, data)
+        with self._condition:
+            for response in responses:
+                self._input += response
+            self._condition.notify()
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+
+def test_threaded_serial_transport():
+    coordinator = Coordinator(devices=20)
+    zigate = ZiGate()
+    known = threading.Event()
+    zigate.events.subscribe(lambda event: known.set(), msg_type=0x8015)
+    line = FakeSerial(coordinator)
+    with ThreadedSerialTransport(zigate, serial_instance=line):
+        zigate.send_command(ZGT_GET_DEVICES_LIST)
+        # the registry is updated before the 8015 event (a single frame for 20 devices)
+        assert known.wait(5)
+        assert len(zigate.devices) == 20
+    assert line.closed
+
+
+def test_reconnect_backoff_peer_closing_at_once():
+    async def run():
+        async def close_at_once(reader, writer):
+            writer.close()
+        server = await asyncio.start_server(close_at_once, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        zigate = ZiGate()
+        transport = AsyncTransport(zigate, asyncio.get_running_loop(), host='127.0.0.1', port=port,
+                                   backoff=0.01, max_backoff=0.1, min_uptime=1)
+        transport.start()
+        await asyncio.sleep(0.5)
+        transport.close()
+        server.close()
+        await server.wait_closed()
+        return transport.connections
+
+    # 0.01 + 0.02 + 0.04 + 0.08 then every 0.1 s
+    assert 2 <= asyncio.run(run()) <= 8
+
+
+def test_threaded_serial_transport_join():
+    class BrokenSerial(FakeSerial):
+        def read(self, size=1):
+            if self.closed:
+                raise OSError('unplugged')
+            return super().read(size)
+
+    line = BrokenSerial(Coordinator(devices=1))
+    transport = ThreadedSerialTransport(ZiGate(), serial_instance=line)
+    assert not transport.join(0.1)
+    line.closed = True
+    assert transport.join(1)
+    transport.close()
+
+
+class FakeTransport(object):
+    """asyncio transport keeping what is written"""
+    def __init__(self):
+        self.written = []
+        self.limits = None
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        self.limits = (high, low)
+
+    def write(self, data):
+        self.written.append(data)
+
+    def close(self):
+        pass
+
+
+def test_write_paused_above_high_water():
+    async def run():
+        transport = AsyncTransport(ZiGate(), asyncio.get_running_loop(), host='127.0.0.1',
+                                   high_water=64, low_water=16)
+        protocol = ZiGateProtocol(transport)
+        line = FakeTransport()
+        protocol.connection_made(line)
+        assert line.limits == (64, 16)
+        transport.send(b'1')
+        protocol.pause_writing()
+        transport.send(b'2')
+        transport.send(b'3')
+        assert line.written == [b'1'] and list(transport._queue) == [b'2', b'3']
+        protocol.resume_writing()
+        transport.send(b'4')
+        assert line.written == [b'1', b'2', b'3', b'4'] and not transport._queue
+
+    asyncio.run(run())
+
+
+def test_connect_raises_task_error():
+    class Unavailable(AsyncTransport):
+        async def _open(self):
+            raise ImportError('no serial_asyncio')
+
+    async def run():
+        transport = Unavailable(ZiGate(), asyncio.get_running_loop(), serial_port='/dev/ttyUSB0')
+        with pytest.raises(ImportError):
+            await asyncio.wait_for(transport.connect(), 1)
+        assert transport._task is None
+
+    asyncio.run(run())
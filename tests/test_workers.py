@@ -0,0 +1,121 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from pyzigate.simulator import Coordinator, Simulator, VirtualDevice
+from pyzigate.workers import EventRing, ProcessCoordinators, VALUE_FLOAT, _truncate
+
+
+class TiltDevice(VirtualDevice):
+    __slots__ = ()
+
+    def attribute(self, cluster, attribute):
+        if cluster == 0x0101 and attribute == 0x0503:
+            return 0x21, (45).to_bytes(2, 'big')
+        return super().attribute(cluster, attribute)
+
+
+def test_ring():
+    ring = EventRing(capacity=2)
+    try:
+        record = (1.5, 0x8102, 0, 0x9824, 1, 0x0402, 0, 3, VALUE_FLOAT, 20.5, b'', b'')
+        assert ring.put(*record) and ring.put(*record)
+        assert not ring.put(*record)
+        assert ring.dropped == 1
+        assert [fields[:-2] for fields in ring.get(limit=1)] == [record[:-2]]
+        assert len(ring.get()) == 1 and ring.get() == []
+    finally:
+        ring.close(unlink=True)
+
+
+@pytest.fixture
+def simulator():
+    coordinator = Coordinator(devices=3)
+    for addr, device in list(coordinator.devices.items()):
+        coordinator.devices[addr] = TiltDevice(addr, device.ieee, coordinator.rng)
+    loop = asyncio.new_event_loop()
+    simulator = Simulator(coordinator, loop)
+    server = loop.run_until_complete(simulator.serve_tcp(port=0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield coordinator, server.sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(1)
+    simulator.close()
+    loop.close()
+
+
+def poll_until(coordinators, condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        coordinators.poll()
+        time.sleep(0.01)
+
+
+def test_worker_routing_and_extra_properties(simulator):
+    coordinator, port = simulator
+    coordinators = ProcessCoordinators()
+    worker = coordinators.add('sim', tcp=('127.0.0.1', port))
+    events = []
+    coordinators.events.subscribe(events.append, cluster=0x0101)
+    coordinators.start()
+    try:
+        worker.send_data('0015')
+        poll_until(coordinators, lambda: len(worker.devices) == 3)
+        device = next(iter(coordinator.devices.values()))
+        coordinators.call(device.ieee, 'read_attribute', 0x01, 0x0101, 0x0503)
+        poll_until(coordinators, lambda: events)
+        event, = events
+        assert (event.source, event.addr, event.property_id, event.value) == ('sim', device.addr, 'tilt angle', 45)
+        assert worker.devices.get(device.addr).endpoint(1).get('tilt angle') == 45
+        with pytest.raises(KeyError):
+            coordinators.call(0x1234, 'read_attribute', 0x01, 0x0101, 0x0503)
+    finally:
+        coordinators.stop()
+
+
+def test_truncated_on_character_boundary():
+    assert _truncate('é'.encode() * 20, 32) == 'é'.encode() * 16
+    assert _truncate(b'a' + 'é'.encode() * 20, 32) == b'a' + 'é'.encode() * 15
+    assert _truncate(b'short', 32) == b'short'
+    ring = EventRing(capacity=2)
+    try:
+        ring.count_truncated()
+        assert (ring.truncated, ring.dropped) == (1, 0)
+    finally:
+        ring.close(unlink=True)
+
+
+def test_worker_reconnects():
+    with socket.socket() as free:
+        free.bind(('127.0.0.1', 0))
+        port = free.getsockname()[1]
+    coordinators = ProcessCoordinators()
+    worker = coordinators.add('late', tcp=('127.0.0.1', port), retry_delay=0.1)
+    coordinators.start()
+    loop = asyncio.new_event_loop()
+    simulator = Simulator(Coordinator(devices=2), loop)
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    try:
+        time.sleep(0.3)
+        assert worker.process.is_alive()
+        loop.run_until_complete(simulator.serve_tcp(port=port))
+        thread.start()
+        deadline = time.monotonic() + 10
+        while not len(worker.devices):
+            assert time.monotonic() < deadline
+            worker.send_data('0015')
+            coordinators.poll()
+            time.sleep(0.05)
+    finally:
+        coordinators.stop()
+        if thread.is_alive():
+            time.sleep(0.1)  # the simulator sees the worker leave
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(1)
+        simulator.close()
+        loop.close()